@@ -1,5 +1,6 @@
 import sys
 import json
+import time
 import numpy as np
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QPushButton, QLabel, QVBoxLayout,
@@ -7,31 +8,70 @@ from PyQt5.QtWidgets import (
     QLineEdit, QSpinBox, QHBoxLayout, QDoubleSpinBox, QMessageBox
 )
 from PyQt5.QtGui import QFont, QColor
-from PyQt5.QAxContainer import QAxWidget
+try:
+    from PyQt5.QAxContainer import QAxWidget
+except ImportError:  # 리눅스 등 OCX가 없는 환경에서는 재생/시뮬레이터 컨트롤을 넘겨서 실행
+    QAxWidget = None
 from PyQt5.QtCore import QTimer
-import pandas as pd
+
+from kiwoom_accounts import AccountState, AccountWarmer
+from kiwoom_allocator import allocate, entry_strengths
+from kiwoom_execution import ExecutionScheduler
+from kiwoom_exit_engine import ExitEngine
+from kiwoom_filter_stock import filter_candidates as run_filter, ui_rule
+from kiwoom_intraday import IntradayScreener
+from kiwoom_master import InstrumentMaster
+from kiwoom_order_log import OrderLog, ORDER_LOG_PATH, SIDE_BUY, SIDE_SELL
+from kiwoom_price_store import PriceStore
+from kiwoom_rate_limiter import RateLimiter
+from kiwoom_snapshot import save_snapshot, load_snapshot, is_same_trading_day, to_plain, SNAPSHOT_PATH
+from kiwoom_tr_cache import AccountTRCache, make_rqname, split_rqname
+from kiwoom_tr_schema import parse_tr
+from kiwoom_watchdog import ConnectionWatchdog
 
 
 class AutoTrader:
     """자동 매매 기능을 담당하는 클래스"""
-    def __init__(self, kiwoom, ui):
+    SLICE_MIN_AMOUNT = 1_000_000  # 이 금액 이상 매수는 자식 주문으로 나눠 실행
+    SLICE_STYLE = "VWAP"  # "TWAP" / "VWAP"
+    SLICE_DURATION = 600  # 분할 실행 시간 창 (초)
+    SLICE_PARTICIPATION = 0.1  # 시장 거래량 대비 최대 참여율
+    SLICE_INTERVAL = 30  # 자식 주문 간격 (초)
+
+    def __init__(self, kiwoom, ui, order_log_path=ORDER_LOG_PATH):
         self.kiwoom = kiwoom  # 키움 API 객체
         self.ui = ui  # UI 객체 참조
         self.auto_trade_timer = QTimer()  # ✅ 타이머를 미리 생성해둠
         self.auto_trade_timer.timeout.connect(self.execute_limited_buy_orders)
-        self.pending_orders = {}  # 주문 대기 목록
+        self.account = None  # 자동 매수 중인 계좌 (AccountState, 화면에서 계좌를 바꿔도 유지)
         self.scheduled_orders = []  # 매수할 종목 리스트
         self.order_index = 0  # 현재 주문 진행 인덱스
+        self.order_limiter = RateLimiter(max_calls=5, period=1.0)  # ✅ SendOrder 초당 5회 제한 (전 계좌 공용)
+        self.order_timer = QTimer()
+        self.order_timer.setSingleShot(True)
+        self.order_timer.timeout.connect(self.drain_orders)
+        self.exit_enabled = False  # ✅ 손절/익절/트레일링 자동 청산 (전 계좌)
+        self.exit_levels = (3.0, 5.0, 3.0)  # 손절 %, 익절 %, 트레일링 %
+        self.order_log = OrderLog(order_log_path)  # ✅ 주문 → 체결 지연 / 슬리피지 기록 (order_lifecycle.bin)
+        self.executor = ExecutionScheduler(self.send_child_order, self.cancel_child_order, self.on_parent_finished)
+        self.execution_timer = QTimer()  # ✅ 분할 매수 진행 중에만 1초마다 자식 주문 일정 확인
+        self.execution_timer.timeout.connect(self.executor.tick)
+
+    @property
+    def pending_orders(self):
+        """자동 매수 계좌의 체결 대기 주문"""
+        return self.account.pending_orders if self.account is not None else {}
 
     def start_auto_trade(self):
-        """자동 매수 시작"""
+        """자동 매수 시작 (현재 선택된 계좌로 매수)"""
         if self.auto_trade_timer.isActive():
             print("⚠️ 자동 매수가 이미 실행 중입니다.")
             return
 
+        self.account = self.ui.account_manager.state()
         self.ui.auto_trade_button.setEnabled(False)  # 시작 버튼 비활성화
         self.ui.stop_trade_button.setEnabled(True)   # 중지 버튼 활성화
-        print("✅ 자동 매수 시작")
+        print(f"✅ 자동 매수 시작 (계좌번호: {self.account.account_number})")
 
         self.check_and_buy_stocks()  # ✅ 종목 선정 후 주문 리스트 업데이트
         self.auto_trade_timer.start(1000)  # ✅ 1초마다 주문 실행
@@ -45,17 +85,13 @@ class AutoTrader:
         self.ui.stop_trade_button.setEnabled(False)  # 중지 버튼 비활성화
 
     def check_and_buy_stocks(self):
-        """자동 매수 실행 (1초에 1개씩 실행)"""
+        """진입 기준 안의 종목 전체에 자금을 한 번에 배분해 주문 리스트 생성 (주문은 1초에 1개씩 실행)"""
         threshold = float(self.ui.threshold_input.text()) / 100
-        buy_amount = int(self.ui.buy_amount_input.text())
+        max_per_stock = int(self.ui.buy_amount_input.text())  # 종목당 최대 매수 금액
 
-        if not self.ui.account_manager.current_balance:
+        if not self.account.balance:
             print("🔄 잔고 정보가 없습니다. 잔고 조회 후 매수 실행")
-            self.ui.account_manager.request_account_balance()
-            return
-
-        if self.ui.account_manager.current_balance < buy_amount:
-            print(f"❌ 잔고 부족: {self.ui.account_manager.current_balance}원, 필요한 금액: {buy_amount}원")
+            self.ui.account_manager.request_account_balance(account_number=self.account.account_number)
             return
 
         stocks_to_buy = []
@@ -76,13 +112,22 @@ class AutoTrader:
             price_diff = abs((current_price - ma20_price) / ma20_price)
 
             if price_diff <= threshold:
-                stocks_to_buy.append((stock_code, current_price, price_diff))
+                stocks_to_buy.append((stock_code, current_price, price_diff, stock.get("price_time", 0.0)))
 
         # ✅ 절대값 차이가 작은 순으로 정렬
         stocks_to_buy.sort(key=lambda x: x[2])
 
+        # ✅ 잔고를 신호 강도(이평과 가까울수록 강함) 비례로 종목당 상한 안에서 배분
+        quantities = allocate(
+            [s[1] for s in stocks_to_buy], entry_strengths([s[2] for s in stocks_to_buy], threshold),
+            self.account.balance, max_per_stock,
+        )
+        if stocks_to_buy:
+            deployed = sum(s[1] * int(q) for s, q in zip(stocks_to_buy, quantities))
+            print(f"💰 {len(stocks_to_buy)}개 종목 중 {int((quantities > 0).sum())}개에 {deployed:,}원 배분 (잔고 {self.account.balance:,}원)")
+
         # ✅ 주문할 종목 리스트 업데이트
-        self.scheduled_orders = stocks_to_buy
+        self.scheduled_orders = [s + (int(q),) for s, q in zip(stocks_to_buy, quantities) if q > 0]
         self.order_index = 0
 
         if not self.scheduled_orders:
@@ -96,246 +141,503 @@ class AutoTrader:
             self.stop_auto_trade()
             return
         
-        current_balance = self.ui.account_manager.current_balance
-        buy_amount = int(self.ui.buy_amount_input.text())
+        current_balance = self.account.balance
+        stock_code, price, _, price_time, quantity = self.scheduled_orders[self.order_index]
 
         print(f"🔍 현재 잔고: {current_balance:,}원")
 
         # ✅ 잔고 부족 시 주문 실행하지 않음
-        if current_balance is None or current_balance - buy_amount <= 0:
-            print(f"❌ 잔고 부족으로 매수 중지 (현재 잔액: {current_balance:,}원, 주문 금액: {buy_amount:,}원)")
+        if current_balance is None or current_balance < price * quantity:
+            print(f"❌ 잔고 부족으로 매수 중지 (현재 잔액: {current_balance:,}원, 주문 금액: {price * quantity:,}원)")
             self.stop_auto_trade()
             return
 
-        stock_code, price, _ = self.scheduled_orders[self.order_index]
-        buy_amount = int(self.ui.buy_amount_input.text())
-
-        order_id = self.place_buy_order(stock_code, price, buy_amount)
-
-        if order_id == 0:
-            print(f"📌 {stock_code} 매수 주문 완료. 주문 ID: {order_id}")
-            self.pending_orders[stock_code] = order_id
-
-            
+        if self.place_buy_order(stock_code, price, quantity, price_time):
+            print(f"📌 {stock_code} 매수 주문 제출 완료")
 
         self.order_index += 1  # ✅ 다음 주문 대기
 
-    def place_buy_order(self, stock_code, price, amount):
-        """키움 OpenAPI를 통해 매수 주문 실행"""
-        account_number = self.ui.account_combo.currentText()
-        quantity = amount // price  # 구매 가능한 수량 계산
+    def place_buy_order(self, stock_code, price, quantity, price_time=0.0):
+        """키움 OpenAPI를 통해 매수 주문 실행 (자동 매수 계좌, quantity: 배분된 수량, price_time: 판단가를 받은 시각)"""
+        account = self.account
 
         if quantity < 1:
-            print(f"❌ {stock_code}: 구매금액({amount})보다 주식의 가격({price})이 높습니다. 구매 실패 (수량: {quantity})")
+            print(f"❌ {stock_code}: 배분된 수량이 없습니다. 구매 실패 (현재가: {price}, 수량: {quantity})")
             return None
         
         total_order_price = price * quantity
 
         # ✅ 주문 가능 금액 확인
-        available_balance = self.ui.account_manager.current_balance
+        available_balance = account.balance
         if available_balance is None or available_balance < total_order_price:
             print(f"❌ 주문 불가: 현재 잔액 {available_balance:,}원, 주문 금액 {total_order_price:,}원")
             return None
 
+        volume_ma5 = self.ui.stock_data_manager.volume_ma5(stock_code)
+        if total_order_price >= self.SLICE_MIN_AMOUNT and volume_ma5 > 0:
+            return self.place_sliced_buy_order(account, stock_code, price, quantity, volume_ma5)
+
         print(f"📌 {stock_code} 매수 주문 실행 ({quantity}주, 시장가) 총 매수 금액 : {price * quantity:,} 원")
 
-        order_id = self.kiwoom.dynamicCall(
-            "SendOrder(QString, QString, QString, int, QString, int, int, QString, QString)",
-            ["자동매수", "0101", account_number, 1, stock_code, quantity, 0, "03", ""]
-        )
+        # ✅ 주문 후 잔고 즉시 차감 (주문 실패 시 되돌림)
+        account.balance -= total_order_price
+        print(f"💰 주문 후 예상 잔액: {account.balance:,}원")
+        self.ui.account_manager.show_balance(account)
 
-        if order_id == 0:
-            print(f"✅ {stock_code} 주문 접수 성공 (주문 ID: {order_id})")
-            self.pending_orders[stock_code] = order_id
-            # ✅ 주문 후 잔고 즉시 차감
-            self.ui.account_manager.current_balance -= total_order_price
-            print(f"💰 주문 후 예상 잔액: {self.ui.account_manager.current_balance:,}원")
-            self.ui.balance_label.setText(f"계좌 잔액: {self.ui.account_manager.current_balance:,}원")
-            # ✅ 실제 잔고 반영을 위해 다시 요청
-            # self.ui.account_manager.request_account_balance()
+        def on_sent(ret):
+            if ret == 0:
+                print(f"✅ {stock_code} 주문 접수 성공 (주문 ID: {ret})")
+                account.pending_orders[stock_code] = ret
+            else:
+                print(f"❌ {stock_code} 주문 실패 (반환값: {ret})")
+                account.balance += total_order_price
+                self.ui.account_manager.show_balance(account)
             QApplication.processEvents()
 
-            
-            
-            
+        order_id = self.order_log.decide(account.account_number, SIDE_BUY, stock_code, price, quantity, price_time)
+        self.send_order("자동매수", account.account_number, 1, stock_code, quantity, 0, "03", on_sent, order_id)
+        return True
+
+    def place_sliced_buy_order(self, account, stock_code, price, quantity, volume_ma5):
+        """큰 매수 주문을 TWAP/VWAP 자식 주문으로 나눠 실행 (주문 금액은 먼저 차감, 못 산 만큼 끝날 때 되돌림)"""
+        stock = next((s for s in self.ui.stock_data_manager.candidates_stocks if s["stock_code"] == stock_code), {})
+        band = float(self.ui.threshold_input.text()) / 100  # 진입 기준과 같은 20이평 대비 괴리율
+        parent = self.executor.submit(
+            account.account_number, stock_code, quantity, price, stock.get("price", price), band, volume_ma5,
+            self.SLICE_STYLE, self.SLICE_DURATION, self.SLICE_PARTICIPATION, self.SLICE_INTERVAL,
+        )
+        if parent is None:
+            print(f"⚠️ {stock_code} 이미 분할 매수 진행 중")
+            return None
+
+        account.balance -= price * quantity
+        account.pending_orders[stock_code] = "분할"
+        self.ui.account_manager.show_balance(account)
+        print(
+            f"🧩 {stock_code} 분할 매수 시작 ({self.SLICE_STYLE}, {quantity:,}주, {self.SLICE_DURATION // 60}분, "
+            f"참여율 ≤{self.SLICE_PARTICIPATION * 100:.0f}%, 5일 평균 거래량 {volume_ma5:,.0f}주)"
+        )
+        if not self.execution_timer.isActive():
+            self.execution_timer.start(1000)
+        return True
+
+    def send_child_order(self, parent, quantity, key):
+        """분할 매수 자식 주문 (공용 주문 경로 → 초당 주문 제한 공유)"""
+        order_id = self.order_log.decide(parent.account_number, SIDE_BUY, parent.stock_code, parent.price, quantity, time.time())
+        self.send_order(
+            "자동매수_분할", parent.account_number, 1, parent.stock_code, quantity, 0, "03",
+            lambda ret: self.executor.on_sent(parent, key, ret), order_id,
+        )
+
+    def cancel_child_order(self, parent, order_no):
+        """미체결 자식 주문 전량 취소"""
+        self.send_order("자동매수_분할취소", parent.account_number, 3, parent.stock_code, 0, 0, "00", org_order_no=order_no)
+
+    def on_parent_finished(self, parent):
+        """분할 매수 정리 완료 (모든 자식 주문 체결/취소 확인) → 못 산 금액 되돌리고 보유 종목/잔고 갱신"""
+        account = self.ui.account_manager.state(parent.account_number)
+        unfilled = parent.quantity - parent.filled
+        if unfilled > 0:
+            account.balance += unfilled * parent.decision_price
+            self.ui.account_manager.show_balance(account)
+        account.pending_orders.pop(parent.stock_code, None)
+        # 체결 통보를 놓쳤을 수도 있으므로 체결 수량과 상관없이 서버 값으로 다시 맞춤
+        self.ui.account_manager.on_chejan(parent.account_number)
+        if not self.executor.parents and not self.executor.closing:
+            self.execution_timer.stop()
+
+    def on_execution_tick(self, stock_code, price, volume, trade_time):
+        """분할 매수 중인 종목에 실시간 체결가 / 20이평 / 오늘 누적 거래량 전달"""
+        if not self.executor.parents:
+            return
+        intraday = self.ui.stock_data_manager.intraday
+        if intraday is not None and stock_code in intraday.index:
+            self.executor.on_price(stock_code, price, intraday.live_ma(stock_code)[1], intraday.volume[intraday.index[stock_code]])
         else:
-            print(f"❌ {stock_code} 주문 실패 (반환값: {order_id})")
+            self.executor.on_price(stock_code, price)
+
+    def place_sell_order(self, stock_code, quantity, reason, price, account_number):
+        """청산 엔진 발동 시 시장가 매도 (체결은 Chejan으로 확인)"""
+        account = self.ui.account_manager.state(account_number)
+        print(f"📌 {stock_code} {reason} 매도 주문 실행 ({quantity}주, 시장가, 발동가 {price:,}, 계좌번호: {account_number})")
+
+        def on_sent(ret):
+            if ret == 0:
+                print(f"✅ {stock_code} 매도 주문 접수 성공")
+            else:
+                print(f"❌ {stock_code} 매도 주문 실패 (반환값: {ret})")
+                account.exit_engine.on_exit_failed(stock_code)
+
+        order_id = self.order_log.decide(account_number, SIDE_SELL, stock_code, price, quantity, time.time())
+        self.send_order(f"자동매도_{reason}", account_number, 2, stock_code, quantity, 0, "03", on_sent, order_id)
+
+    def send_order(self, rqname, account_number, order_type, stock_code, quantity, price, hoga, callback=None, order_id=None,
+                   org_order_no=""):
+        """매수/매도 공용 주문 경로 (계좌별 대기열에 넣고 초당 주문 제한 안에서 전송)
+
+        order_type: 1 신규매수, 2 신규매도, 3 매수취소 / hoga: "00" 지정가, "03" 시장가
+        callback: SendOrder 반환값을 받을 함수
+        order_id: order_log.decide()로 받은 주문 번호 (전송 시각 기록용)
+        org_order_no: 취소할 원주문번호
+        """
+        account = self.ui.account_manager.state(account_number)
+        account.order_queue.append((rqname, order_type, stock_code, quantity, price, hoga, callback, order_id, org_order_no))
+        account.record("주문", stock_code, quantity, price, rqname)
+        self.drain_orders()
+
+    def drain_orders(self):
+        """제한 안에서 계좌별 대기 주문을 번갈아 전송, 남으면 자리가 날 때 다시 실행"""
+        if not self.ui.watchdog.online:
+            return  # 끊긴 동안은 대기열에 두었다가 재접속 후 전송
+        accounts = [a for a in self.ui.account_manager.accounts.values() if a.order_queue]
+        while accounts and self.order_limiter.try_acquire():
+            account = accounts.pop(0)
+            rqname, order_type, stock_code, quantity, price, hoga, callback, order_id, org_order_no = account.order_queue.popleft()
+            ret = self.kiwoom.dynamicCall(
+                "SendOrder(QString, QString, QString, int, QString, int, int, QString, QString)",
+                [rqname, "0101", account.account_number, order_type, stock_code, quantity, price, hoga, org_order_no]
+            )
+            if order_id is not None:
+                self.order_log.sent(order_id, account.account_number, order_type, stock_code, ret)
+            account.record("접수" if ret == 0 else "거부", stock_code, quantity, price, f"{rqname} ({ret})")
+            if callback is not None:
+                callback(ret)
+            if account.order_queue:
+                accounts.append(account)
+
+        if accounts and not self.order_timer.isActive():
+            self.order_timer.start(int(self.order_limiter.wait_time() * 1000) + 1)
+
+    def make_exit_engine(self, account_number):
+        """계좌별 청산 엔진 (현재 자동 청산 설정 적용)"""
+        engine = ExitEngine(
+            lambda stock_code, quantity, reason, price: self.place_sell_order(stock_code, quantity, reason, price, account_number)
+        )
+        engine.set_levels(*self.exit_levels)
+        engine.enabled = self.exit_enabled
+        return engine
+
+    def on_exit_tick(self, stock_code, price, volume, trade_time):
+        """체결 틱을 모든 계좌 청산 엔진에 전달"""
+        for account in self.ui.account_manager.accounts.values():
+            account.exit_engine.on_tick(stock_code, price)
+
+    def toggle_exit_engine(self):
+        """자동 청산 시작/중지 (전 계좌)"""
+        self.exit_enabled = not self.exit_enabled
+        self.exit_levels = (
+            self.ui.stop_loss_input.value(), self.ui.take_profit_input.value(), self.ui.trailing_input.value()
+        )
+        watched = 0
+        for account in self.ui.account_manager.accounts.values():
+            account.exit_engine.enabled = self.exit_enabled
+            account.exit_engine.set_levels(*self.exit_levels)
+            watched += len(account.exit_engine)
+        self.ui.exit_engine_button.setText("자동 청산 중지" if self.exit_enabled else "자동 청산 시작")
+        print(f"{'✅ 자동 청산 시작' if self.exit_enabled else '🛑 자동 청산 중지'} ({watched}개 종목 감시)")
 
-        return order_id
-    
 class AccountManager:
-    """계좌 정보를 관리하는 클래스"""
+    """계좌 정보를 관리하는 클래스 (로그인한 모든 계좌를 동시에 관리)"""
+    TR_BALANCE = "OPW00001"
+    TR_HOLDINGS = "OPW00018"
+    TR_EVALUATION = "OPW00004"
+    REFRESH_INTERVALS = {TR_BALANCE: 30.0, TR_HOLDINGS: 30.0, TR_EVALUATION: 60.0}  # 백그라운드 갱신 주기(초)
+
     def __init__(self, kiwoom, ui):
         self.kiwoom = kiwoom  # 키움 API 객체
         self.ui = ui  # UI 객체 참조
-        self.current_balance = None  # 현재 잔고
-        self.owned_stocks = set()
-        
+        self.accounts = {}  # 계좌번호 → AccountState
+        self.tr_cache = AccountTRCache(ttl=3.0)  # ✅ 계좌 TR 요청 합치기 + 캐시
+        self.applied_results = {}  # (TR 코드, 계좌번호) → 마지막으로 반영한 응답 (중복 반영 방지)
+        self.warmer = AccountWarmer(self.accounts, self.warm_request, ui.tr_limiter, self.REFRESH_INTERVALS)
+        self.warm_timer = QTimer()
+        self.warm_timer.timeout.connect(self.warmer.tick)
+        # 재접속/재시작 후 보유 종목으로 체결 대기 주문을 맞출 계좌번호 → 보유하지 않은 대기 주문도 지울지
+        # (재시작 후에는 Chejan을 이어 받을 수 없으므로 True, 같은 세션의 재접속이면 주문이 살아 있을 수 있어 False)
+        self.reconciling = {}
+
+    def state(self, account_number=None):
+        """계좌 스냅샷 (None이면 화면에서 선택된 계좌)"""
+        if account_number is None:
+            account_number = self.ui.account_combo.currentText()
+        state = self.accounts.get(account_number)
+        if state is None:
+            state = AccountState(account_number, self.ui.trader.make_exit_engine(account_number))
+            if account_number:
+                self.accounts[account_number] = state
+        return state
+
+    def is_current(self, account_number):
+        return account_number == self.ui.account_combo.currentText()
+
+    @property
+    def current_balance(self):
+        return self.state().balance
+
+    @property
+    def owned_stocks(self):
+        return self.state().owned_stocks
+
+    def holds(self, stock_code):
+        """어느 계좌든 보유 중인 종목인지"""
+        return any(stock_code in account.book for account in self.accounts.values())
+
+    def holdings_codes(self):
+        """전 계좌 보유 종목코드 (실시간 등록용)"""
+        codes = []
+        for account in self.accounts.values():
+            codes.extend(code for code in account.book.codes if code not in codes)
+        return codes
+
     def on_account_changed(self):
-        """사용자가 계좌를 변경하면 해당 계좌의 보유 종목 조회"""
+        """사용자가 계좌를 변경하면 그 계좌 스냅샷을 TR 없이 바로 표시"""
         selected_account = self.ui.account_combo.currentText()
         self.ui.account_label.setText(f"선택된 계좌: {selected_account}")
-        
-        # ✅ 선택된 계좌로 보유 종목 조회 실행
-        self.get_holdings()
-        
+        if not selected_account:
+            return
+        self.show_account(self.state(selected_account))
+
+    def show_account(self, account):
+        """계좌 스냅샷을 화면에 표시 (아직 받지 못한 데이터는 백그라운드 갱신이 채움)"""
+        self.show_balance(account)
+        if account.loaded(self.TR_HOLDINGS):
+            self.ui.show_holdings(account.holdings)
+        if account.evaluation is not None:
+            self.ui.show_account_evaluation(account.evaluation)
+        account.book.invalidate_display()
         self.ui.stock_data_manager.load_holdings_list()
-        
-    
-    def get_holdings_from_tr(self, trcode, rqname):
-        """TR 데이터를 이용해 보유 종목 정보를 가져옴"""
-        try:
-            stock_count = self.kiwoom.dynamicCall("GetRepeatCnt(QString, QString)", trcode, rqname)
-            print(f"📥 보유 종목 조회 응답 수신: {stock_count}개 종목")
+        if not account.loaded(self.TR_HOLDINGS):
+            self.warmer.tick()
 
-            holdings = []
-            self.owned_stocks.clear()
-
-            for i in range(stock_count):
-                stock_code = self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, i, "종목코드").strip()
-                stock_name = self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, i, "종목명").strip()
-                quantity = self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, i, "보유수량").strip()
-                buy_price = self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, i, "매입가").strip()
-
-                holdings.append({"stock_name": stock_name, "quantity": quantity, "buy_price": buy_price, "stock_code": stock_code})
+    def show_balance(self, account):
+        if not self.is_current(account.account_number):
+            return
+        if account.balance is not None:
+            self.ui.balance_label.setText(f"계좌 잔액: {account.balance:,}원")
+        else:
+            self.ui.balance_label.setText("계좌 잔액: -")
+
+    def warm_request(self, trcode, account_number):
+        """백그라운드 갱신 요청 → TR을 실제로 보냈으면 True"""
+        if trcode == self.TR_BALANCE:
+            return self.request_account_balance(account_number=account_number)
+        if trcode == self.TR_HOLDINGS:
+            return self.get_holdings(account_number=account_number)
+        return self.request_opw00004(account_number=account_number)
+
+    def _request(self, trcode, account_number, send, apply, callback, force):
+        """캐시를 거쳐 계좌 TR 요청, 응답은 해당 계좌 스냅샷에 반영 (화면은 선택된 계좌일 때만)"""
+        def on_result(result):
+            key = (trcode, account_number)
+            if self.applied_results.get(key) is not result:
+                self.applied_results[key] = result
+                apply(result, account_number)
+            if callback is not None:
+                callback(result)
+
+        def send_counted():
+            self.ui.tr_limiter.record()  # ✅ 공용 조회 제한에 기록
+            return send()
+
+        return self.tr_cache.request(trcode, account_number, send_counted, on_result, force)
+
+    def _set_account_inputs(self, account_number):
+        self.kiwoom.dynamicCall("SetInputValue(QString, QString)", "계좌번호", account_number)
+        self.kiwoom.dynamicCall("SetInputValue(QString, QString)", "비밀번호", "")
+        self.kiwoom.dynamicCall("SetInputValue(QString, QString)", "비밀번호입력매체구분", "00")
 
-                self.owned_stocks.add(stock_code)
-            return holdings  # 데이터 반환
-        except Exception as e:
-            print(f"❌ 보유 종목 조회 중 오류 발생: {e}")
-            return []
-        
-    
-    def get_holdings(self):
-        """현재 보유 종목을 가져와서 owned_stocks에 저장"""
-        account_number = self.ui.account_combo.currentText()
+    def on_holdings_tr(self, result):
+        """OPW00018 응답을 캐시에 저장하고 기다리던 요청에 전달"""
+        _, account_number = split_rqname(result.rqname)
+        print(f"📥 보유 종목 조회 응답 수신: {len(result.rows)}개 종목 (계좌번호: {account_number})")
+        self.tr_cache.resolve(self.TR_HOLDINGS, account_number, result)
+
+    def apply_holdings(self, result, account_number):
+        """보유 종목 응답을 계좌 스냅샷(손익 엔진 / 청산 엔진)에 반영, 선택된 계좌면 화면 갱신"""
+        account = self.state(account_number)
+        account.set_holdings(self.TR_HOLDINGS, result.rows)  # 이후 현재가는 실시간 체결로 갱신
+        if account_number in self.reconciling:
+            self.reconcile_pending_orders(account, drop_unheld=self.reconciling.pop(account_number))
+        self.ui.realtime_data_manager.register_holdings_realtime()
+        if self.is_current(account_number):
+            self.ui.show_holdings(account.holdings)
+
+    def get_holdings(self, callback=None, force=False, account_number=None):
+        """보유 종목 조회 (account_number: None이면 선택된 계좌, callback: 응답을 받을 함수)"""
+        account_number = account_number or self.ui.account_combo.currentText()
         if not account_number:
             print("❌ 계좌번호를 선택하세요.")
-            return
+            return False
 
-        print(f"🔍 보유 종목 조회 요청 보냄... (계좌번호: {account_number})")
-
-        try:
-            self.kiwoom.dynamicCall("SetInputValue(QString, QString)", "계좌번호", account_number)
-            self.kiwoom.dynamicCall("SetInputValue(QString, QString)", "비밀번호", "")
-            self.kiwoom.dynamicCall("SetInputValue(QString, QString)", "비밀번호입력매체구분", "00")
+        def send():
+            print(f"🔍 보유 종목 조회 요청 보냄... (계좌번호: {account_number})")
+            self._set_account_inputs(account_number)
             self.kiwoom.dynamicCall("SetInputValue(QString, QString)", "조회구분", "1")  # 1: 보유 종목 조회
+            return self.kiwoom.dynamicCall(
+                "CommRqData(QString, QString, int, QString)", make_rqname("보유종목조회", account_number), self.TR_HOLDINGS, 0, "4000"
+            )
 
-            self.kiwoom.dynamicCall("CommRqData(QString, QString, int, QString)", "보유종목조회", "OPW00018", 0, "4000")
+        try:
+            return self._request(self.TR_HOLDINGS, account_number, send, self.apply_holdings, callback, force)
         except Exception as e:
             print(f"❌ 보유 종목 조회 중 오류 발생: {e}")
+            return False
 
     def get_account_info(self):
-        """로그인 후 계좌번호 가져오기"""
+        """로그인 후 계좌번호 가져오기 (모든 계좌 스냅샷을 만들고 백그라운드 갱신 시작)"""
         account_list = self.kiwoom.dynamicCall("GetLoginInfo(QString)", "ACCNO")
         accounts = account_list.strip().split(';')[:-1]  # 마지막 빈 요소 제거
 
         if accounts:
+            for account_number in accounts:
+                self.state(account_number)
             self.ui.account_combo.clear()
-            self.ui.account_combo.addItems(accounts)  # 계좌 목록을 드롭다운에 추가
+            self.ui.account_combo.addItems(accounts)  # 계좌 목록을 드롭다운에 추가 (→ on_account_changed)
             self.ui.account_combo.setCurrentIndex(0)  # 첫 번째 계좌 선택
             self.ui.account_label.setText(f"선택된 계좌: {accounts[0]}")
-            self.request_account_balance()  # 계좌 선택 후 잔고 조회
-            self.get_holdings()
-            self.ui.stock_data_manager.load_holdings_list()
+            self.request_account_balance()  # 선택된 계좌는 바로 조회
+            self.get_holdings()  # 이미 요청 중이면 합쳐짐
+            self.warm_timer.start(1000)  # ✅ 나머지 계좌는 조회 제한 여유가 있을 때 채움
+            print(f"✅ 계좌 {len(accounts)}개 관리 시작: {', '.join(accounts)}")
         else:
             self.ui.account_label.setText("계좌번호를 가져오지 못했습니다.")
 
     def select_account(self):
-        """사용자가 계좌를 선택하면 레이블 업데이트"""
+        """사용자가 계좌를 선택하면 레이블 업데이트 후 강제 새로고침"""
         selected_account = self.ui.account_combo.currentText()
         self.ui.account_label.setText(f"선택된 계좌: {selected_account}")
-        self.request_account_balance()
-        self.get_holdings()
+        self.request_account_balance(force=True)
+        self.get_holdings(force=True)
 
-    def request_account_balance(self):
-        """잔고 조회 요청"""
-        account_number = self.ui.account_combo.currentText()
+    def request_account_balance(self, callback=None, force=False, account_number=None):
+        """잔고 조회 요청 (account_number: None이면 선택된 계좌)"""
+        account_number = account_number or self.ui.account_combo.currentText()
         
         if not account_number:
             print("❌ 계좌번호를 선택하세요.")
-            return
-
-        self.kiwoom.dynamicCall("SetInputValue(QString, QString)", "계좌번호", account_number)
-        self.kiwoom.dynamicCall("SetInputValue(QString, QString)", "비밀번호", "")
-        self.kiwoom.dynamicCall("SetInputValue(QString, QString)", "비밀번호입력매체구분", "00")
-        self.kiwoom.dynamicCall("SetInputValue(QString, QString)", "조회구분", "2")  # 2: 전체 잔고 조회
-
-        self.kiwoom.dynamicCall("CommRqData(QString, QString, int, QString)", "잔고조회", "OPW00001", 0, "2000")
-        print(f"🔄 잔고 조회 요청 보냄... account number: {account_number}")
+            return False
+
+        def send():
+            self._set_account_inputs(account_number)
+            self.kiwoom.dynamicCall("SetInputValue(QString, QString)", "조회구분", "2")  # 2: 전체 잔고 조회
+            ret = self.kiwoom.dynamicCall(
+                "CommRqData(QString, QString, int, QString)", make_rqname("잔고조회", account_number), self.TR_BALANCE, 0, "2000"
+            )
+            print(f"🔄 잔고 조회 요청 보냄... account number: {account_number}")
+            return ret
+
+        return self._request(self.TR_BALANCE, account_number, send, self.apply_balance, callback, force)
         
-    def request_opw00004(self):
-        """OPW00004 요청"""
-        account_number = self.ui.account_combo.currentText()
-        print(f"🔄 OPW00004 요청 보냄... account number: {account_number}")
+    def request_opw00004(self, callback=None, force=False, account_number=None):
+        """OPW00004 요청 (account_number: None이면 선택된 계좌)"""
+        account_number = account_number or self.ui.account_combo.currentText()
         if not account_number:
             print("❌ 계좌번호를 선택하세요.")
-            return
-        
-        self.kiwoom.dynamicCall("SetInputValue(QString, QString)", "계좌번호", account_number)
-        self.kiwoom.dynamicCall("SetInputValue(QString, QString)", "비밀번호", "")
-        self.kiwoom.dynamicCall("SetInputValue(QString, QString)", "비밀번호입력매체구분", "00")
-        self.kiwoom.dynamicCall("SetInputValue(QString, QString)", "상장폐지조회구분", "0")
-        self.kiwoom.dynamicCall("SetInputValue(QString, QString)", "거래소구분", "KRX") 
-        
-        self.kiwoom.dynamicCall("CommRqData(QString, QString, int, QString)", "계좌평가현황요청", "OPW00004", 0, "6001")
-
-    def on_receive_tr_data(self, rqname, trcode):
-        """TR 데이터 수신 이벤트 처리 (잔고 조회)"""
-        if rqname == "잔고조회":
-            balance_raw = self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, 0, "주문가능금액").strip()
-
-            print(f"📥 잔고 조회 응답 수신: {balance_raw}")  # ✅ 응답 로그 추가
-
-            if balance_raw:
-                try:
-                    balance = int(balance_raw.replace(",", ""))  # 쉼표 제거 후 정수 변환
-                    self.ui.balance_label.setText(f"계좌 잔액: {balance:,}원")
-                    self.current_balance = balance
-                    print(f"✅ 계좌 잔액 업데이트: {balance:,}원")
-                except ValueError:
-                    print(f"❌ 잔고 데이터 변환 실패: {balance_raw}")
-                    self.ui.balance_label.setText("계좌 잔액: 변환 오류")
-            else:
-                print("❌ 계좌 잔액 조회 실패 (데이터 없음)")
+            return False
+
+        def send():
+            print(f"🔄 OPW00004 요청 보냄... account number: {account_number}")
+            self._set_account_inputs(account_number)
+            self.kiwoom.dynamicCall("SetInputValue(QString, QString)", "상장폐지조회구분", "0")
+            self.kiwoom.dynamicCall("SetInputValue(QString, QString)", "거래소구분", "KRX") 
+            return self.kiwoom.dynamicCall(
+                "CommRqData(QString, QString, int, QString)", make_rqname("계좌평가현황요청", account_number), self.TR_EVALUATION, 0, "6001"
+            )
+
+        return self._request(self.TR_EVALUATION, account_number, send, self.apply_evaluation, callback, force)
+
+    def on_balance_tr(self, result):
+        """OPW00001 응답을 캐시에 저장하고 기다리던 요청에 전달"""
+        _, account_number = split_rqname(result.rqname)
+        self.tr_cache.resolve(self.TR_BALANCE, account_number, result)
+
+    def on_account_evaluation_tr(self, result):
+        """OPW00004 응답을 캐시에 저장하고 기다리던 요청에 전달"""
+        _, account_number = split_rqname(result.rqname)
+        self.tr_cache.resolve(self.TR_EVALUATION, account_number, result)
+
+    def on_chejan(self, account_number=None):
+        """체결/잔고 변경 시 그 계좌 캐시만 버리고 잔고·보유 종목을 한 번씩만 다시 조회"""
+        account_number = account_number or self.ui.account_combo.currentText()
+        self.tr_cache.invalidate(account_number)
+        self.get_holdings(account_number=account_number)
+        self.request_account_balance(account_number=account_number)
+
+    def resync(self):
+        """재접속 후: 응답을 못 받은 요청은 다시 보내고, 끊긴 동안의 체결이 반영되도록 모든 계좌를 다시 조회
+
+        선택된 계좌는 바로, 나머지는 백그라운드 갱신이 조회 제한 안에서 채운다.
+        """
+        self.tr_cache.expire_inflight()
+        self.tr_cache.invalidate()
+        for account in self.accounts.values():
+            account.mark_stale()
+            if account.pending_orders:
+                self.reconciling.setdefault(account.account_number, False)
+        self.warmer.requested.clear()
+        self.on_chejan()
+        self.warm_timer.start(1000)
+
+    def reconcile_pending_orders(self, account, drop_unheld=False):
+        """끊긴 동안 Chejan을 놓친 매수 주문: 보유 종목에 들어와 있으면 체결된 것으로 처리
+
+        drop_unheld: 보유 종목에 없는 대기 주문도 지움 (재시작 후에는 체결 통보를 받을 수 없어 영원히 남으므로)
+        """
+        for stock_code in list(account.pending_orders):
+            if stock_code in account.owned_stocks:
+                print(f"✅ {stock_code} 끊긴 동안 체결 확인 (계좌번호: {account.account_number})")
+                del account.pending_orders[stock_code]
+                account.record("체결", stock_code, note="재접속 후 보유 종목으로 확인")
+                self.ui.remove_from_filtered_candidates(stock_code)
+                self.ui.stock_data_manager.remove_candidate(stock_code)
+            elif drop_unheld:
+                print(f"🧹 {stock_code} 체결 대기 해제: 보유 종목에 없음 (계좌번호: {account.account_number})")
+                del account.pending_orders[stock_code]
+
+    def apply_balance(self, result, account_number):
+        """OPW00001 응답으로 주문가능금액 갱신"""
+        balance = result.single.orderable
+
+        print(f"📥 잔고 조회 응답 수신: {balance} (계좌번호: {account_number})")  # ✅ 응답 로그 추가
+
+        account = self.state(account_number)
+        if balance is not None:
+            account.set_balance(self.TR_BALANCE, balance)
+            self.show_balance(account)
+            print(f"✅ 계좌 잔액 업데이트: {balance:,}원")
+        else:
+            print("❌ 계좌 잔액 조회 실패 (데이터 없음)")
+            if self.is_current(account_number):
                 self.ui.balance_label.setText("계좌 잔액: 조회 실패")
-                
-        if rqname == "계좌평가현황요청":
-            print(f"📥 계좌평가현황요청 응답 수신: {trcode}")
-            
-            cash = self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, 0, "예수금").strip()
-            d2_deposit = self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, 0, "D+2추정예수금").strip()
-            total_buy_amount = self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, 0, "총매입금액").strip()
-        
-            today_profit = self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, 0, "당일투자손익").strip()
-            monthly_profit = self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, 0, "당월투자손익").strip()
-            accumulated_profit = self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, 0, "누적투자손익").strip()
-            
-            today_profit_rate = self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, 0, "당일손익율").strip()
-            monthly_profit_rate = self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, 0, "당월손익율").strip()
-            accumulated_profit_rate = self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, 0, "누적손익율").strip()
-            
-            stock_count = self.kiwoom.dynamicCall("GetRepeatCnt(QString, QString)", trcode, rqname)
-            
-            for i in range(stock_count):
-                stock_code = self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, i, "종목코드").strip()
-                stock_name = self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, i, "종목명").strip()
-                quantity = self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, i, "보유수량").strip()
-                buy_price = self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, i, "매입가").strip()
-                current_price = self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, i, "현재가").strip()
-                evaluation_amount = self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, i, "평가금액").strip()
-                profit = self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, i, "손익금액").strip()
-                profit_rate = self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, i, "손익율").strip()
-                
-                
-                
-                
+
+    def apply_evaluation(self, result, account_number):
+        """OPW00004 응답을 계좌 스냅샷에 반영, 선택된 계좌면 화면 갱신"""
+        account = self.state(account_number)
+        account.set_evaluation(self.TR_EVALUATION, result)
+        self.ui.realtime_data_manager.register_holdings_realtime()
+        if self.is_current(account_number):
+            self.ui.show_account_evaluation(result)
 
 class StockDataManager:
     """종목 데이터 로딩 및 관리"""
+    INTRADAY_SCREEN_BASE = 7100  # 장중 재판정 감시 종목 실시간 등록 화면번호 (화면당 100종목)
+
     def __init__(self, ui):
         self.ui = ui
         self.candidates_stocks = []  # 종목 리스트 저장
+        self.pending_holdings_prices = {}  # 아직 반영하지 않은 보유 종목 체결가
+        self.intraday = None  # 장중 후보군 재판정 (IntradayScreener, 처음 후보군을 표시할 때 생성)
+        self.intraday_screens = []  # 감시 종목을 등록한 화면번호
+
+        # ✅ 틱마다 테이블을 그리지 않고 200ms마다 모아서 반영
+        self.holdings_flush_timer = QTimer()
+        self.holdings_flush_timer.timeout.connect(self.flush_holdings_prices)
+        self.holdings_flush_timer.start(200)
+
+        # ✅ 장중 후보 추가/제외, 20이평 목표가 갱신은 1초마다 모아서 반영
+        self.intraday_timer = QTimer()
+        self.intraday_timer.timeout.connect(self.apply_intraday)
+        self.intraday_timer.start(1000)
         
     def remove_candidate(self, stock_code):
         """체결된 종목을 후보군 리스트와 UI에서 제거"""
@@ -350,125 +652,300 @@ class StockDataManager:
                 data = json.load(file)
                 all_stocks = data.get("stocks", [])
 
-            # 보유 종목 조회
-            self.ui.account_manager.get_holdings()
-
-            # 보유 종목 제외
-            self.candidates_stocks = [s for s in all_stocks if s["stock_code"] not in self.ui.account_manager.owned_stocks]
+        except FileNotFoundError:
+            self.candidates_stocks = []
+            print("❌ filtered_candidates.json 파일을 찾을 수 없습니다.")
+            return
 
-            # 테이블에 추가
-            self.ui.candidates_table.setRowCount(len(self.candidates_stocks))
-            for row, stock in enumerate(self.candidates_stocks):
-                self.ui.candidates_table.setItem(row, 0, QTableWidgetItem(stock["stock_code"]))
+        # 보유 종목 조회 (캐시/진행 중 요청 재사용) 후 보유 종목 제외하고 표시
+        if self.ui.account_combo.currentText():
+            self.ui.account_manager.get_holdings(callback=lambda _: self.show_candidates(all_stocks))
+        else:
+            self.show_candidates(all_stocks)
+
+    def show_candidates(self, all_stocks):
+        """보유 종목을 제외한 후보군을 테이블에 표시 (이미 받은 현재가는 유지)"""
+        known = {s["stock_code"]: s for s in self.candidates_stocks if "current_price" in s}
+
+        # 보유 종목 제외
+        self.candidates_stocks = [s for s in all_stocks if s["stock_code"] not in self.ui.account_manager.owned_stocks]
+
+        # 테이블에 추가
+        self.ui.candidates_table.setRowCount(len(self.candidates_stocks))
+        for row, stock in enumerate(self.candidates_stocks):
+            previous = known.get(stock["stock_code"])
+            if previous is not None and "current_price" not in stock:
+                stock["current_price"] = previous["current_price"]
+                stock["price_time"] = previous.get("price_time", 0.0)
+
+            self.ui.candidates_table.setItem(row, 0, QTableWidgetItem(stock["stock_code"]))
+            self.ui.candidates_table.setItem(row, 2, QTableWidgetItem(str(round(stock["price"], 2))))  # 20이평
+            if "current_price" in stock:
+                self.show_candidate_price(row, stock)
+            else:
                 self.ui.candidates_table.setItem(row, 1, QTableWidgetItem("-"))  # 현재가 (실시간 업데이트 예정)
-                self.ui.candidates_table.setItem(row, 2, QTableWidgetItem(str(round(stock["price"], 2))))  # 20이평
                 self.ui.candidates_table.setItem(row, 3, QTableWidgetItem("-"))  # 차이 (금액)
                 self.ui.candidates_table.setItem(row, 4, QTableWidgetItem("-"))  # 차이 (%)
 
-        except FileNotFoundError:
-            self.candidates_stocks = []
-            print("❌ filtered_candidates.json 파일을 찾을 수 없습니다.")
+        self.sync_intraday()
+
+    def show_candidate_price(self, row, stock):
+        """후보군 테이블 한 행의 현재가 / 20이평 대비 차이 표시"""
+        current_price = stock["current_price"]
+        ma20_price = stock["price"]
+        diff_amount = current_price - ma20_price
+        diff_percent = (diff_amount / ma20_price) * 100 if ma20_price > 0 else 0
+
+        self.ui.candidates_table.setItem(row, 1, QTableWidgetItem(str(current_price)))  # 현재가
+        self.ui.candidates_table.setItem(row, 3, QTableWidgetItem(str(diff_amount)))  # 차이 금액
+
+        diff_item = QTableWidgetItem(f"{diff_percent:.2f}%")
+        if diff_percent > 0:
+            diff_item.setBackground(QColor(255, 200, 200))  # 빨간색 계열
+        elif diff_percent < 0:
+            diff_item.setBackground(QColor(200, 200, 255))  # 파란색 계열
+
+        self.ui.candidates_table.setItem(row, 4, diff_item)
+
+    def sync_intraday(self):
+        """장중 재판정 기준을 화면 후보군으로 맞추고 감시 종목(후보 + 곧 통과할 종목)을 실시간 등록"""
+        if self.intraday is None:
+            started = time.perf_counter()
+            self.intraday = IntradayScreener.from_store(before=time.strftime("%Y%m%d"))
+            print(f"📊 장중 재판정 준비: {len(self.intraday.codes)}개 종목 ({time.perf_counter() - started:.1f}초)")
+        self.intraday.set_candidates(s["stock_code"] for s in self.candidates_stocks)
+
+        if self.ui.kiwoom.dynamicCall("GetConnectState()") != 1:
+            return  # 로그인 후 후보군을 다시 표시할 때 등록
+        watch = self.intraday.watch_list()
+        screens = []
+        for start in range(0, len(watch), 100):
+            screen_no = str(self.INTRADAY_SCREEN_BASE + start // 100)
+            self.ui.realtime_data_manager.register_real(screen_no, watch[start:start + 100])
+            screens.append(screen_no)
+        for screen_no in self.intraday_screens[len(screens):]:
+            self.ui.realtime_data_manager.unregister_real(screen_no)
+        self.intraday_screens = screens
+
+    def volume_ma5(self, stock_code):
+        """전일까지 5일 평균 거래량 (분할 매수 참여율 기준, 없으면 0)"""
+        if self.intraday is not None and stock_code in self.intraday.index:
+            value = self.intraday.volume_ma5[self.intraday.index[stock_code]]
+            if not np.isnan(value):
+                return float(value)
+        rows = PriceStore().load(stock_code) or []
+        volumes = [row["volume"] for row in rows[:5]]  # 최신 날짜가 앞
+        return sum(volumes) / len(volumes) if volumes else 0.0
+
+    def on_intraday_tick(self, stock_code, price, volume, trade_time):
+        if self.intraday is not None:
+            self.intraday.on_tick(stock_code, price, volume, trade_time)
+
+    def apply_intraday(self):
+        """잠정 일봉 기준으로 후보 추가/제외, 남은 후보의 20이평 목표가와 현재가 갱신 (TR 없음)"""
+        if self.intraday is None:
+            return
+        added, dropped, updated = self.intraday.changes()
+        if not (added or dropped or updated):
+            return
+
+        now = time.time()
+        rows = {s["stock_code"]: row for row, s in enumerate(self.candidates_stocks)}
+        for stock_code, ma20, price in updated:
+            row = rows.get(stock_code)
+            if row is None:
+                continue
+            stock = self.candidates_stocks[row]
+            stock.update(price=ma20, current_price=price, price_time=now)
+            if not (added or dropped):
+                self.ui.candidates_table.setItem(row, 2, QTableWidgetItem(str(round(ma20, 2))))
+                self.show_candidate_price(row, stock)
+
+        if added or dropped:
+            gone = set(dropped)
+            stocks = [s for s in self.candidates_stocks if s["stock_code"] not in gone]
+            stocks += [
+                {"stock_code": stock_code, "price": ma20, "current_price": price, "price_time": now}
+                for stock_code, ma20, price in added if stock_code not in rows
+            ]
+            print(f"🔁 장중 재판정: 후보 추가 {len(added)}개 {[a[0] for a in added]}, 제외 {len(dropped)}개 {dropped}")
+            self.show_candidates(stocks)
+            self.ui.realtime_data_manager.update_request_queues()
 
     def refresh_candidate_stocks(self):
-        """후보군 데이터 갱신"""
-        filter_candidates()
+        """후보군 데이터 갱신 (사전 필터로 조건을 통과할 수 없는 종목은 제외)"""
+        stock_list = json.load(open("all_stock_codes.json", "r", encoding="utf-8"))
+        master = InstrumentMaster().load_or_refresh(self.ui.kiwoom)
+        filter_candidates(master.prefilter(stock_list))
         self.load_candidates_list()
         
     def load_holdings_list(self):
-        """보유 종목 리스트를 가져와서 UI 테이블 업데이트"""
-        self.ui.account_manager.get_holdings()  # ✅ 보유 종목 정보 요청
-
-        holdings = self.ui.account_manager.owned_stocks  # 보유 종목 데이터
+        """손익 엔진(HoldingsBook)의 보유 종목 전체를 UI 테이블에 표시 (TR 요청 없음)"""
+        book = self.ui.holdings_book
+        self.ui.holdings_table.setRowCount(len(book))
+        self.refresh_holdings_rows(book.changed_rows())
+        print(f"✅ 보유 종목 {len(book)}개 UI 업데이트 완료")
+
+    def refresh_holdings_rows(self, rows):
+        """값이 바뀐 보유 종목 행만 다시 그림"""
+        book = self.ui.holdings_book
+        for row in rows:
+            stock_code, stock_name, quantity, avg_cost, current_price, evaluation, profit, profit_rate = book.row(row)
+
+            self.ui.holdings_table.setItem(row, 0, QTableWidgetItem(stock_code))
+            self.ui.holdings_table.setItem(row, 1, QTableWidgetItem(stock_name))
+            self.ui.holdings_table.setItem(row, 2, QTableWidgetItem(f"{quantity:,}"))
+            self.ui.holdings_table.setItem(row, 3, QTableWidgetItem(f"{avg_cost:,.0f}"))
+            self.ui.holdings_table.setItem(row, 4, QTableWidgetItem(f"{current_price:,}"))
+            self.ui.holdings_table.setItem(row, 5, QTableWidgetItem(f"{evaluation:,}"))
+            self.ui.holdings_table.setItem(row, 6, QTableWidgetItem(f"{profit:,}"))
+            rate_item = QTableWidgetItem(f"{profit_rate:.2f}%")
+
+            # ✅ 손익률 색상 설정 (양수=빨강, 음수=파랑)
+            if profit_rate > 0:
+                rate_item.setBackground(QColor(255, 200, 200))  # 빨간색 계열
+            elif profit_rate < 0:
+                rate_item.setBackground(QColor(200, 200, 255))  # 파란색 계열
+
+            self.ui.holdings_table.setItem(row, 7, rate_item)
+
+        totals = book.totals()
+        self.ui.live_profit_label.setText(
+            f"실시간 평가손익: {totals['profit']:,.0f}원 ({totals['profit_rate']:.2f}%) / 평가금액: {totals['evaluation']:,.0f}원"
+        )
 
-        self.ui.holdings_table.setRowCount(len(holdings))
+    def on_holdings_tick(self, stock_code, price, volume, trade_time):
+        """보유 종목 체결가를 모아 두었다가 flush_holdings_prices에서 한 번에 반영"""
+        if self.ui.account_manager.holds(stock_code):
+            self.pending_holdings_prices[stock_code] = price
 
-        if not holdings or holdings == {''}:
-            self.ui.holdings_table.setRowCount(0)
+    def flush_holdings_prices(self):
+        """모인 체결가를 모든 계좌 손익 엔진에 일괄 반영하고 선택된 계좌의 바뀐 행만 갱신"""
+        if not self.pending_holdings_prices:
             return
+        prices, self.pending_holdings_prices = self.pending_holdings_prices, {}
+        current = self.ui.holdings_book
+        for account in self.ui.account_manager.accounts.values():
+            if account.book is current:
+                continue
+            account.book.update_prices(prices)
+        changed = current.update_prices(prices)
+        if len(changed):
+            self.refresh_holdings_rows(changed)
 
 
-        for row, stock in enumerate(holdings):
-            stock_code = stock["stock_code"]
-            stock_name = stock["stock_name"]
-            buy_price = int(stock["buy_price"].replace(",", ""))  # 매입평단가
-            quantity = int(stock["quantity"].replace(",", ""))
-
-            # ✅ 현재가 조회
-            current_price = self.ui.kiwoom.dynamicCall("GetMasterLastPrice(QString)", stock_code).strip()
-            if not current_price:
-                current_price = 0
-            else:
-                current_price = int(current_price.replace(",", ""))
-
-            # ✅ 차이(%) 계산
-            price_diff = ((current_price - buy_price) / buy_price) * 100 if buy_price > 0 else 0
-
-            # ✅ 테이블에 값 추가
-            self.ui.holdings_table.setItem(row, 0, QTableWidgetItem(stock_name))
-            self.ui.holdings_table.setItem(row, 1, QTableWidgetItem(str(current_price)))
-            self.ui.holdings_table.setItem(row, 2, QTableWidgetItem(str(buy_price)))
-            diff_item = QTableWidgetItem(f"{price_diff:.2f}%")
-
-            # ✅ 차이(%) 색상 설정 (양수=빨강, 음수=파랑)
-            if price_diff > 0:
-                diff_item.setBackground(QColor(255, 200, 200))  # 빨간색 계열
-            elif price_diff < 0:
-                diff_item.setBackground(QColor(200, 200, 255))  # 파란색 계열
-
-            self.ui.holdings_table.setItem(row, 3, diff_item)
-
-        print(f"✅ 보유 종목 {len(holdings)}개 UI 업데이트 완료")
-            
-
 class RealtimeDataManager:
     """실시간 데이터 업데이트 관리"""
+    HOLDINGS_SCREEN = "7000"  # 보유 종목 실시간 등록 화면번호
+    REAL_FIDS = "10;15;20"  # 현재가, 거래량, 체결시간
+
     def __init__(self, kiwoom, ui):
         self.kiwoom = kiwoom
         self.ui = ui
 
         self.stock_request_index = 0  # ✅ 후보군 리스트 요청 인덱스
-        self.holdings_request_index = 0  # ✅ 보유 종목 요청 인덱스
         self.stock_request_queue = []  # ✅ 후보군 종목 요청 대기열
-        self.holdings_request_queue = []  # ✅ 보유 종목 요청 대기열
+        self.price_requests_paused = False  # 세션이 끊겨 현재가 요청을 멈춘 상태
+        self.resume_stock_timer = False
+        self.real_registrations = {}  # 화면번호 → (종목코드 리스트, FID 목록)
+        self.tick_listeners = []  # 체결 틱을 받을 콜백 (stock_code, price, volume, trade_time)
 
         self.stock_timer = QTimer()
         self.stock_timer.timeout.connect(self.request_stock_prices)
 
-        self.holdings_timer = QTimer()
-        self.holdings_timer.timeout.connect(self.request_holdings_prices)
-
     def start_realtime_updates(self):
         """실시간 데이터 업데이트 시작"""
         print("📡 실시간 주가 업데이트 시작")
 
         self.stock_request_index = 0
-        self.holdings_request_index = 0
 
-        # ✅ 후보군 & 보유 종목 큐 초기화
+        # ✅ 후보군 큐 초기화
         self.update_request_queues()
 
         # ✅ 처음 요청 시작
         self.request_stock_prices()
-        self.request_holdings_prices()
+        self.register_holdings_realtime()
 
         # ✅ 일정 주기마다 반복 요청 실행
         self.stock_timer.start(300000)  # 5분마다 후보군 현재가 업데이트
-        self.holdings_timer.start(300000)  # 5분마다 보유 종목 현재가 업데이트
 
     def stop_realtime_updates(self):
         """실시간 데이터 업데이트 중지"""
         self.stock_timer.stop()
-        self.holdings_timer.stop()
+        for screen_no in list(self.real_registrations):
+            self.unregister_real(screen_no)
         print("🛑 실시간 주가 업데이트 중지")
 
+    def pause(self):
+        """세션이 끊기면 현재가 요청을 멈춤 (요청 위치와 실시간 등록 기록은 메모리에 유지)"""
+        self.resume_stock_timer = self.resume_stock_timer or self.stock_timer.isActive()
+        self.stock_timer.stop()
+
+    def resume(self):
+        """재접속 후 서버에서 사라진 실시간 등록을 다시 등록하고, 멈춘 위치부터 현재가 요청 재개"""
+        for screen_no, (stock_codes, fids) in list(self.real_registrations.items()):
+            self.kiwoom.dynamicCall(
+                "SetRealReg(QString, QString, QString, QString)", screen_no, ";".join(stock_codes), fids, "0"
+            )
+        print(f"📡 실시간 등록 복구: 화면 {len(self.real_registrations)}개")
+        if self.resume_stock_timer:
+            self.resume_stock_timer = False
+            self.stock_timer.start(300000)
+        if self.price_requests_paused:
+            self.price_requests_paused = False
+            self.request_stock_prices()
+
     def update_request_queues(self):
-        """후보군 & 보유 종목 요청 대기열을 갱신"""
+        """후보군 요청 대기열을 갱신"""
         self.stock_request_queue = [stock["stock_code"] for stock in self.ui.stock_data_manager.candidates_stocks]
-        self.holdings_request_queue = list(self.ui.account_manager.owned_stocks)
+
+    def add_tick_listener(self, listener):
+        """체결 틱 콜백 등록"""
+        self.tick_listeners.append(listener)
+
+    def register_real(self, screen_no, stock_codes, fids=REAL_FIDS):
+        """화면번호 단위로 실시간 시세 등록 (기존 등록은 교체)"""
+        if not stock_codes:
+            self.unregister_real(screen_no)
+            return
+        self.kiwoom.dynamicCall(
+            "SetRealReg(QString, QString, QString, QString)", screen_no, ";".join(stock_codes), fids, "0"
+        )
+        self.real_registrations[screen_no] = (list(stock_codes), fids)
+
+    def unregister_real(self, screen_no):
+        """화면번호의 실시간 등록 해제"""
+        if self.real_registrations.pop(screen_no, None) is not None:
+            self.kiwoom.dynamicCall("SetRealRemove(QString, QString)", screen_no, "ALL")
+
+    def register_holdings_realtime(self):
+        """모든 계좌의 보유 종목을 실시간 체결로 등록 (현재가 조회 TR 없이 손익 갱신)"""
+        codes = self.ui.account_manager.holdings_codes()
+        self.register_real(self.HOLDINGS_SCREEN, codes)
+        print(f"📡 보유 종목 {len(codes)}개 실시간 등록")
+
+    def on_receive_real_data(self, stock_code, real_type, real_data):
+        """실시간 체결 데이터 수신 이벤트"""
+        if real_type != "주식체결":
+            return
+
+        price_raw = self.kiwoom.dynamicCall("GetCommRealData(QString, int)", stock_code, 10).strip()
+        if not price_raw:
+            return
+        price = abs(int(price_raw))
+        volume = abs(int(self.kiwoom.dynamicCall("GetCommRealData(QString, int)", stock_code, 15).strip() or 0))
+        trade_time = self.kiwoom.dynamicCall("GetCommRealData(QString, int)", stock_code, 20).strip()
+
+        for listener in self.tick_listeners:
+            listener(stock_code, price, volume, trade_time)
 
     # ✅ 후보군 리스트의 종목들 현재가 요청
     def request_stock_prices(self):
         """후보군 종목별 현재가를 opt10001로 요청"""
+        if not self.ui.watchdog.online:
+            self.price_requests_paused = True  # 재접속 후 resume()에서 이어서 요청
+            return
+
         if not self.stock_request_queue:
             print("⚠️ 후보군 리스트가 비어 있습니다.")
             return
@@ -485,60 +962,75 @@ class RealtimeDataManager:
 
         self.kiwoom.dynamicCall("SetInputValue(QString, QString)", "종목코드", stock_code)
         self.kiwoom.dynamicCall("CommRqData(QString, QString, int, QString)", "현재가조회", "opt10001", 0, "5000")
+        self.ui.tr_limiter.record()
 
         # ✅ 500ms 후에 다음 종목 요청
         QTimer.singleShot(500, self.request_stock_prices)
-
-    # ✅ 보유 종목의 현재가 요청
-    def request_holdings_prices(self):
-        """보유 종목별 현재가를 opt10001로 요청"""
-        if not self.holdings_request_queue:
-            print("⚠️ 보유 종목 리스트가 비어 있습니다.")
-            return
-
-        if self.holdings_request_index >= len(self.holdings_request_queue):
-            print("✅ 보유 종목 현재가 업데이트 완료")
-            self.holdings_request_index = 0  # ✅ 다시 처음부터 요청하도록 설정
-            return
-
-        stock_code = self.holdings_request_queue[self.holdings_request_index]
-        self.holdings_request_index += 1
-
-        print(f"📡 현재가 요청: {stock_code} (보유 종목)")
-
-        self.kiwoom.dynamicCall("SetInputValue(QString, QString)", "종목코드", stock_code)
-        self.kiwoom.dynamicCall("CommRqData(QString, QString, int, QString)", "보유종목현재가조회", "opt10001", 0, "6000")
-
-        # ✅ 500ms 후에 다음 종목 요청
-        QTimer.singleShot(500, self.request_holdings_prices)
     
 
 class KiwoomUI(QMainWindow):
     RQNAME_DAILY_CHART = "주식일봉차트조회"
     
-    def __init__(self):
+    def __init__(self, kiwoom=None, snapshot_path=SNAPSHOT_PATH, order_log_path=ORDER_LOG_PATH):
+        """kiwoom을 넘기면 OCX 대신 해당 컨트롤(이벤트 재생/기록용 등)을 사용
+
+        snapshot_path / order_log_path: 웜 스타트 스냅샷과 주문 기록 파일 (재생 등 실거래가 아닌 실행은
+        다른 경로를 넘겨 실제 상태 파일을 덮어쓰지 않게 함)
+        """
         super().__init__()
+        self.snapshot_path = snapshot_path
 
         self.setWindowTitle("Kiwoom 자동매매 프로그램")
         self.setGeometry(100, 100, 800, 500)
 
         # Kiwoom API 객체 생성
-        self.kiwoom = QAxWidget("KHOPENAPI.KHOpenAPICtrl.1")
+        if kiwoom is None:
+            if QAxWidget is None:
+                raise RuntimeError("키움 OpenAPI 컨트롤(QAxContainer)을 사용할 수 없는 환경입니다.")
+            kiwoom = QAxWidget("KHOPENAPI.KHOpenAPICtrl.1")
+        self.kiwoom = kiwoom
         self.kiwoom.OnEventConnect.connect(self.on_event_connect)
         self.kiwoom.OnReceiveChejanData.connect(self.on_receive_chejan_data)
         self.kiwoom.OnReceiveTrData.connect(self.on_receive_tr_data)
-        
+
+        # ✅ 조회(CommRqData) 초당 5회 제한 (사용자 조회 / 현재가 / 계좌 백그라운드 갱신 공용)
+        self.tr_limiter = RateLimiter(max_calls=5, period=1.0)
+
+        # 자동매매 객체 생성 (계좌별 청산 엔진을 만들므로 계좌 관리보다 먼저)
+        self.trader = AutoTrader(self.kiwoom, self, order_log_path)
+
         # 계좌 관리 객체 생성
         self.account_manager = AccountManager(self.kiwoom, self)
 
-        # 자동매매 객체 생성
-        self.trader = AutoTrader(self.kiwoom, self)
-
         # 종목 데이터 관리 객체 생성
         self.stock_data_manager = StockDataManager(self)
         
         # 실시간 데이터 관리 객체 생성
         self.realtime_data_manager = RealtimeDataManager(self.kiwoom, self)
+        self.kiwoom.OnReceiveRealData.connect(self.realtime_data_manager.on_receive_real_data)
+        self.realtime_data_manager.add_tick_listener(self.stock_data_manager.on_holdings_tick)
+        self.realtime_data_manager.add_tick_listener(self.trader.on_exit_tick)
+        self.realtime_data_manager.add_tick_listener(self.stock_data_manager.on_intraday_tick)
+        self.realtime_data_manager.add_tick_listener(self.trader.on_execution_tick)
+
+        # ✅ 세션 끊김 / 콜백 멈춤 감시 → 자동 재접속 후 메모리 상태로 복구
+        self.watchdog = ConnectionWatchdog(
+            self.kiwoom, self.on_connection_lost, self.on_connection_restored,
+            expect_events=lambda: bool(self.realtime_data_manager.real_registrations) and is_market_open(),
+            stall_timeout=60.0,
+        )
+        for signal in (self.kiwoom.OnReceiveTrData, self.kiwoom.OnReceiveRealData, self.kiwoom.OnReceiveChejanData):
+            signal.connect(self.watchdog.touch)
+        self.watchdog_timer = QTimer()
+        self.watchdog_timer.timeout.connect(self.watchdog.check)
+
+        # TR 응답 핸들러 (rqname → 핸들러, 필드 정의는 kiwoom_tr_schema)
+        self.tr_handlers = {
+            "보유종목조회": self.on_holdings_tr,
+            "잔고조회": self.on_balance_tr,
+            "현재가조회": self.on_current_price_tr,
+            "계좌평가현황요청": self.on_account_evaluation_tr,
+        }
 
         # 데이터 로드
         self.auto_buy_amount = 100000
@@ -546,6 +1038,17 @@ class KiwoomUI(QMainWindow):
         
 
         self.setup_ui()
+
+        # ✅ 웜 스타트: 마지막 스냅샷으로 바로 복구, 이후 주기적으로/종료 시 저장
+        self.snapshot_fresh = self.restore_snapshot()
+        self.snapshot_timer = QTimer()
+        self.snapshot_timer.timeout.connect(self.save_snapshot)
+        self.snapshot_timer.start(60000)
+
+    @property
+    def holdings_book(self):
+        """선택된 계좌의 손익 엔진"""
+        return self.account_manager.state().book
         
     def setup_ui(self):
         """전체 UI 초기화"""
@@ -575,7 +1078,7 @@ class KiwoomUI(QMainWindow):
 
         # ✅ 조회 버튼 추가
         self.fetch_holdings_button = QPushButton("조회")
-        self.fetch_holdings_button.clicked.connect(self.account_manager.request_opw00004)
+        self.fetch_holdings_button.clicked.connect(lambda: self.account_manager.request_opw00004())
         layout.addWidget(self.fetch_holdings_button)
 
         # ✅ 보유 종목 리스트 테이블 생성
@@ -584,6 +1087,31 @@ class KiwoomUI(QMainWindow):
         self.holdings_table.setHorizontalHeaderLabels(["종목코드", "종목명", "보유수량", "평균단가", "현재가", "평가금액", "손익금액", "손익률"])
         layout.addWidget(self.holdings_table)
 
+        # ✅ 실시간 손익 (체결 틱으로 갱신)
+        self.live_profit_label = QLabel("실시간 평가손익: -")
+        layout.addWidget(self.live_profit_label)
+
+        # ✅ 자동 청산 설정 (손절/익절/트레일링 %)
+        exit_layout = QHBoxLayout()
+        self.stop_loss_input = QDoubleSpinBox()
+        self.take_profit_input = QDoubleSpinBox()
+        self.trailing_input = QDoubleSpinBox()
+        for label, spin_box, value in zip(
+            ("손절 %", "익절 %", "트레일링 %"),
+            (self.stop_loss_input, self.take_profit_input, self.trailing_input),
+            self.trader.exit_levels,
+        ):
+            spin_box.setRange(0.0, 30.0)  # 0이면 사용 안 함
+            spin_box.setSingleStep(0.5)
+            spin_box.setValue(value)
+            exit_layout.addWidget(QLabel(label))
+            exit_layout.addWidget(spin_box)
+
+        self.exit_engine_button = QPushButton("자동 청산 시작")
+        self.exit_engine_button.clicked.connect(self.trader.toggle_exit_engine)
+        exit_layout.addWidget(self.exit_engine_button)
+        layout.addLayout(exit_layout)
+
         # ✅ 계좌 정보 패널
         account_info_layout = QVBoxLayout()
 
@@ -627,7 +1155,7 @@ class KiwoomUI(QMainWindow):
         self.balance_label = QLabel("계좌 잔액: -")
         self.auto_trade_layout.addWidget(self.balance_label)
 
-        self.buy_amount_label = QLabel("매수 금액:")
+        self.buy_amount_label = QLabel("종목당 최대 매수 금액:")
         self.buy_amount_input = QLineEdit(str(self.auto_buy_amount))
         self.auto_trade_layout.addWidget(self.buy_amount_label)
         self.auto_trade_layout.addWidget(self.buy_amount_input)
@@ -657,36 +1185,75 @@ class KiwoomUI(QMainWindow):
     def on_receive_chejan_data(self, gubun, item_cnt, fid_list):
         """체결 데이터 수신 이벤트"""
         print("on_receive_chejan_data called",gubun)
+        account_number = self.kiwoom.dynamicCall("GetChejanData(int)", 9201).strip()  # 계좌번호
+        account = self.account_manager.state(account_number or None)
+
         if gubun == "0":  # 주문체결
-            stock_code = self.kiwoom.dynamicCall("GetChejanData(int)", 9001).strip()  # 종목코드
+            stock_code = self.kiwoom.dynamicCall("GetChejanData(int)", 9001).strip().replace("A", "")  # 종목코드
             order_status = self.kiwoom.dynamicCall("GetChejanData(int)", 913).strip()  # 체결 상태
-            order_price = self.kiwoom.dynamicCall("GetChejanData(int)", 910).strip()  # 주문 가격
-            executed_qty = self.kiwoom.dynamicCall("GetChejanData(int)", 911).strip()  # 체결 수량
+            order_price = self.kiwoom.dynamicCall("GetChejanData(int)", 910).strip()  # 체결가
+            executed_qty = self.kiwoom.dynamicCall("GetChejanData(int)", 911).strip()  # 체결 수량 (누적)
             remaining_qty = self.kiwoom.dynamicCall("GetChejanData(int)", 902).strip()  # 미체결 수량
+            sell_buy = self.kiwoom.dynamicCall("GetChejanData(int)", 907).strip()  # 매도수구분 (1: 매도, 2: 매수)
+            order_no = self.kiwoom.dynamicCall("GetChejanData(int)", 9203).strip()  # 주문번호
+            order_kind = self.kiwoom.dynamicCall("GetChejanData(int)", 905).strip()  # 주문구분 (+매수, 매수취소 등)
+
+            print(f"📥 체결 이벤트 수신: {stock_code} | 상태: {order_status} | 주문가: {order_price} | 체결량: {executed_qty} | 미체결량: {remaining_qty} | 계좌: {account.account_number}")
+
+            cancel = "취소" in order_kind  # 취소 주문 통보 (9203은 취소 주문번호, 904가 원주문번호)
+            original = self.kiwoom.dynamicCall("GetChejanData(int)", 904).strip() if cancel else ""
+            side = SIDE_SELL if sell_buy == "1" else SIDE_BUY
+            if cancel:
+                if order_status == "확인":  # 원주문은 취소가 확인될 때 닫음 (913에는 "취소"가 오지 않음)
+                    self.trader.order_log.on_cancel_confirmed(account.account_number, side, stock_code, original)
+            else:
+                self.trader.order_log.on_chejan(
+                    account.account_number, side, stock_code, order_status,
+                    abs(int(order_price or 0)), int(executed_qty or 0), int(remaining_qty or 0), order_no
+                )
+
+            if order_status == "체결":
+                account.record("체결", stock_code, int(executed_qty or 0), int(order_price or 0), "매도" if sell_buy == "1" else "매수")
+
+            parent = None
+            if sell_buy == "2":  # 분할 매수 자식 주문이면 원주문 체결 현황에 반영
+                if cancel:
+                    parent = self.trader.executor.on_cancelled(account.account_number, stock_code, original, order_status)
+                else:
+                    parent = self.trader.executor.on_chejan(
+                        account.account_number, stock_code, order_no, order_status,
+                        abs(int(order_price or 0)), int(executed_qty or 0), int(remaining_qty or 0)
+                    )
+
+            if parent is not None:
+                # 첫 체결에 후보군에서만 제거 (대기 주문 해제와 보유 종목 갱신은 원주문이 끝날 때)
+                if order_status == "체결" and any(s["stock_code"] == stock_code for s in self.stock_data_manager.candidates_stocks):
+                    self.remove_from_filtered_candidates(stock_code)
+                    self.stock_data_manager.remove_candidate(stock_code)
 
-            print(f"📥 체결 이벤트 수신: {stock_code} | 상태: {order_status} | 주문가: {order_price} | 체결량: {executed_qty} | 미체결량: {remaining_qty}")
-
-            if stock_code in self.trader.pending_orders:
+            elif stock_code in account.pending_orders:
                 if order_status == "체결":
                     print(f"✅ {stock_code} 체결 완료!")
 
-                    # ✅ StockDataManager에서 종목 리스트 갱신 처리
-                    self.stock_data_manager.remove_candidate(stock_code)
+                    # ✅ 그 계좌 캐시만 무효화 후 보유 종목/잔고를 한 번씩만 다시 조회
+                    self.account_manager.on_chejan(account.account_number)
 
                     # ✅ 체결된 종목 삭제
-                    del self.trader.pending_orders[stock_code]
-                    
-                    # ✅ 보유 종목 목록 업데이트
-                    self.account_manager.get_holdings()
+                    del account.pending_orders[stock_code]
 
                     # ✅ 후보군 리스트에서 완전히 제거
-                    self.stock_data_manager.remove_from_filtered_candidates(stock_code)
-                    
-                    # ✅ UI 업데이트
-                    self.stock_data_manager.load_candidates_list()
-                    
-                    # ✅ 계좌 잔고 갱신
-                    self.account_manager.request_account_balance()
+                    self.remove_from_filtered_candidates(stock_code)
+
+                    # ✅ StockDataManager에서 종목 리스트 갱신 처리 (보유 종목 조회는 위 요청과 합쳐짐)
+                    self.stock_data_manager.remove_candidate(stock_code)
+
+            elif sell_buy == "1" and order_status == "체결":
+                # ✅ 자동 청산 매도 체결 확인 (전량 체결되면 보유 종목/잔고 갱신)
+                if account.exit_engine.on_exit_filled(stock_code, int(remaining_qty or 0)):
+                    self.account_manager.on_chejan(account.account_number)
+
+        elif gubun == "1":  # 잔고 변경 → 다음 조회는 서버에서 새로 받도록 그 계좌 캐시만 무효화
+            self.account_manager.tr_cache.invalidate(account.account_number)
                     
     def remove_from_filtered_candidates(self, stock_code):
         """filtered_candidates.json에서 특정 종목을 제거"""
@@ -756,7 +1323,7 @@ class KiwoomUI(QMainWindow):
         # 보유 종목 조회 버튼
         self.get_stocks_button = QPushButton("보유 종목 조회")
         self.get_stocks_button.setFont(QFont("Arial", 12))
-        self.get_stocks_button.clicked.connect(self.account_manager.get_holdings)
+        self.get_stocks_button.clicked.connect(lambda: self.account_manager.get_holdings())
         layout.addWidget(self.get_stocks_button)
 
         # 보유 종목 리스트 출력
@@ -777,218 +1344,208 @@ class KiwoomUI(QMainWindow):
 
     def on_event_connect(self, err_code):
         """로그인 이벤트 처리"""
+        if self.watchdog.on_event_connect(err_code):
+            return  # 재접속 응답 (복구는 on_connection_restored)
+
         if err_code == 0:
             self.status_label.setText("로그인 상태: 성공")
             self.login_button.setEnabled(False)
             self.logout_button.setEnabled(True)
             self.account_manager.get_account_info()
-            self.stock_data_manager.refresh_candidate_stocks()
+            if self.snapshot_fresh:
+                print("♻️ 오늘 저장된 후보군 사용 (전종목 재선정 생략, 현재가는 백그라운드로 갱신)")
+                self.stock_data_manager.load_candidates_list()
+            else:
+                self.stock_data_manager.refresh_candidate_stocks()
             self.realtime_data_manager.start_realtime_updates()
+            self.watchdog_timer.start(1000)
         else:
             self.status_label.setText(f"로그인 상태: 실패 (에러코드 {err_code})")
 
+    def snapshot_state(self):
+        """웜 스타트용 메모리 상태 (후보군 + 마지막 현재가, 계좌별 스냅샷, 자동 청산 설정)
+
+        후보군/최고가 등에 섞인 numpy 값은 기본 타입으로 바꿔 JSON 저장이 실패하지 않게 한다.
+        """
+        return to_plain({
+            "candidates": self.stock_data_manager.candidates_stocks,
+            "accounts": {
+                account_number: account.snapshot()
+                for account_number, account in self.account_manager.accounts.items()
+            },
+            "exit": {"enabled": self.trader.exit_enabled, "levels": list(self.trader.exit_levels)},
+        })
+
+    def save_snapshot(self):
+        try:
+            return save_snapshot(self.snapshot_state(), self.snapshot_path)
+        except (OSError, TypeError, ValueError) as e:  # 디스크 오류 / JSON으로 쓸 수 없는 값
+            print(f"❌ 스냅샷 저장 실패: {e}")
+            return 0
+
+    def restore_snapshot(self):
+        """마지막 스냅샷을 화면에 바로 복구 → 오늘 저장된 후보군이면 True (로그인 후 재선정 생략)
+
+        계좌 데이터는 모두 갱신 대상으로 표시해 두므로 로그인 후 서버 값으로 백그라운드에서 맞춰진다.
+        """
+        state, saved_at = load_snapshot(self.snapshot_path)
+        if state is None:
+            return False
+
+        exit_state = state.get("exit", {})
+        self.trader.exit_levels = tuple(exit_state.get("levels", self.trader.exit_levels))
+        self.trader.exit_enabled = bool(exit_state.get("enabled", False))
+        for spin_box, value in zip((self.stop_loss_input, self.take_profit_input, self.trailing_input), self.trader.exit_levels):
+            spin_box.setValue(value)
+        self.exit_engine_button.setText("자동 청산 중지" if self.trader.exit_enabled else "자동 청산 시작")
+
+        fresh = is_same_trading_day(saved_at)
+        for account_number, data in state.get("accounts", {}).items():
+            account = self.account_manager.state(account_number)
+            account.restore(data, pending_orders=fresh)  # 지난 거래일 주문은 이미 끝났으므로 복구하지 않음
+            if account.pending_orders:
+                self.account_manager.reconciling[account_number] = True  # 끊긴 동안의 체결은 보유 종목으로 확인
+
+        if fresh:
+            self.stock_data_manager.show_candidates(state.get("candidates", []))
+        saved = time.strftime("%m-%d %H:%M:%S", time.localtime(saved_at))
+        print(
+            f"♻️ 스냅샷 복구 ({saved} 저장): 계좌 {len(state.get('accounts', {}))}개, "
+            f"후보군 {len(self.stock_data_manager.candidates_stocks) if fresh else 0}개"
+            f"{'' if fresh else ' (지난 거래일 후보군은 다시 선정)'}"
+        )
+        return fresh
 
-    def on_receive_tr_data(self, screen_no, rqname, trcode, recordname, prev_next, data_len, err_code, msg1, msg2):
-        """TR 데이터 수신 이벤트"""
-        print(f"📩 TR 데이터 수신: {rqname} (TR 코드: {trcode})")
-        if rqname == "보유종목조회":
-            holdings = self.account_manager.get_holdings_from_tr(trcode, rqname)  # ✅ AccountManager에서 데이터 가져옴
-            
-            if holdings:
-                stock_info = "\n".join([f"종목명: {h['stock_name']}, 수량: {h['quantity']}, 매입가: {h['buy_price']}" for h in holdings])
-            else:
-                stock_info = "보유 종목 없음"
-
-            self.stock_text.setText(stock_info)  # ✅ UI 업데이트만 수행
-        
-        if rqname == "잔고조회":
-            self.account_manager.on_receive_tr_data(rqname, trcode)
-            QApplication.processEvents()
-            
-        if rqname == "현재가조회":  # ✅ opt10001 응답 처리
-            stock_code = self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, 0, "종목코드").strip()
-            current_price = self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, 0, "현재가").strip()
-
-            # ✅ 데이터가 정상적으로 들어왔는지 확인
-            if not stock_code or not current_price:
-                print(f"⚠️ 현재가 데이터 없음, stock_code={stock_code}, current_price={current_price}")
-                return  # ✅ 잘못된 응답은 무시
-
-            # ✅ 데이터 정리
-            stock_code = stock_code.replace("A", "").strip()  # "A" 접두사 제거
-            current_price = abs(int(current_price.replace(",", "")))
-            
+    def closeEvent(self, event):
+        """종료 시 스냅샷 저장"""
+        size = self.save_snapshot()
+        print(f"💾 스냅샷 저장 ({size:,} bytes)")
+        self.trader.order_log.close()
+        super().closeEvent(event)
 
-            print(f"📥 {stock_code} 현재가 수신: {current_price}")
+    def on_connection_lost(self, reason):
+        """세션 이상 감지 → 끊긴 세션으로 요청을 보내지 않도록 타이머 정지 (주문은 계좌 대기열에 쌓임)"""
+        self.status_label.setText(f"로그인 상태: 재접속 중 ({reason})")
+        self.realtime_data_manager.pause()
+        self.account_manager.warm_timer.stop()
 
-            # ✅ 후보군 리스트에서 해당 종목 찾기
-            for stock in self.stock_data_manager.candidates_stocks:
-                if stock["stock_code"] == stock_code:
-                    stock["current_price"] = current_price  # ✅ 현재가 업데이트
+    def on_connection_restored(self):
+        """재접속 후 재선정 없이 메모리 상태 복구 (실시간 등록, 계좌 스냅샷, 대기 주문, 현재가 요청)
 
-                    # ✅ 20이평 가격 가져오기
-                    ma20_price = stock["price"]
-                    diff_amount = current_price - ma20_price
-                    diff_percent = (diff_amount / ma20_price) * 100 if ma20_price > 0 else 0
+        조회/주문 제한기는 그대로 이어 쓰므로 끊기기 직전에 보낸 요청도 제한에 계속 반영된다.
+        """
+        self.realtime_data_manager.resume()
+        self.account_manager.resync()
+        self.trader.drain_orders()
+        self.status_label.setText(f"로그인 상태: 재접속 완료 (사유: {self.watchdog.reason})")
 
-                    # ✅ UI 테이블 업데이트
-                    for row in range(self.candidates_table.rowCount()):
-                        if self.candidates_table.item(row, 0).text() == stock_code:
-                            self.candidates_table.setItem(row, 1, QTableWidgetItem(str(current_price)))  # 현재가
-                            self.candidates_table.setItem(row, 3, QTableWidgetItem(str(diff_amount)))  # 차이 금액
 
-                            diff_item = QTableWidgetItem(f"{diff_percent:.2f}%")
-                            if diff_percent > 0:
-                                diff_item.setBackground(QColor(255, 200, 200))  # 빨간색 계열
-                            elif diff_percent < 0:
-                                diff_item.setBackground(QColor(200, 200, 255))  # 파란색 계열
+    def on_receive_tr_data(self, screen_no, rqname, trcode, recordname, prev_next, data_len, err_code, msg1, msg2):
+        """TR 데이터 수신 이벤트 (rqname → 핸들러 테이블 조회, 파싱은 TR 스키마로)"""
+        print(f"📩 TR 데이터 수신: {rqname} (TR 코드: {trcode})")
+        base_rqname, _ = split_rqname(rqname)
+        handler = self.tr_handlers.get(base_rqname)
+        if handler is None:
+            return
+        handler(parse_tr(self.kiwoom, trcode, rqname, prev_next))
 
-                            self.candidates_table.setItem(row, 4, diff_item)
-                            break  # ✅ 찾으면 종료
+    def on_holdings_tr(self, result):
+        """보유종목조회(OPW00018) 응답"""
+        self.account_manager.on_holdings_tr(result)  # ✅ 캐시에 저장 후 기다리던 요청에 전달
 
-            # ✅ Qt UI 강제 갱신
-            QApplication.processEvents()
-            
-        if rqname == "계좌평가현황요청":
-            print(f"📥 계좌평가현황요청 응답 수신: {trcode}")
-
-            # ✅ 계좌 정보 가져오기
-            def clean_number(value):
-                """문자열로 된 숫자를 정리 (앞 0 제거, 쉼표 추가)"""
-                stripped_vaule = value.strip()
-                if not stripped_vaule:
-                    return "0"
-                
-                try:
-                    return f"{int(stripped_vaule):,}"
-                except ValueError:
-                    return value
-                
-
-            cash = clean_number(self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, 0, "예수금"))
-            d2_deposit = clean_number(self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, 0, "D+2추정예수금"))
-            total_buy_amount = clean_number(self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, 0, "총매입금액"))
-            today_profit = clean_number(self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, 0, "당일투자손익"))
-            monthly_profit = clean_number(self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, 0, "당월투자손익"))
-            accumulated_profit = clean_number(self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, 0, "누적투자손익"))
-
-            today_profit_rate = clean_number(self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, 0, "당일손익율").strip())
-            monthly_profit_rate = clean_number(self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, 0, "당월손익율").strip())
-            accumulated_profit_rate = clean_number(self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, 0, "누적손익율").strip())
-
-            print(f"📥 계좌평가현황요청 응답 수신: {trcode}")
-            print(f"📥 예수금: {cash}원")
-            print(f"📥 D+2 추정 예수금: {d2_deposit}원")
-            print(f"📥 총 매입 금액: {total_buy_amount}원")
-            print(f"📥 당일 손익: {today_profit}원")
-            print(f"📥 당월 손익: {monthly_profit}원")
-            print(f"📥 누적 손익: {accumulated_profit}원")
-            print(f"📥 당일 손익률: {today_profit_rate}%")
-            print(f"📥 당월 손익률: {monthly_profit_rate}%")
-            print(f"📥 누적 손익률: {accumulated_profit_rate}%")
-
-            # ✅ UI 업데이트
-            self.cash_label.setText(f"예수금: {cash}원")
-            self.d2_deposit_label.setText(f"D+2 추정 예수금: {d2_deposit}원")
-            self.total_buy_amount_label.setText(f"총 매입 금액: {total_buy_amount}원")
-            self.today_profit_label.setText(f"당일 손익: {today_profit}원")
-            self.monthly_profit_label.setText(f"당월 손익: {monthly_profit}원")
-            self.accumulated_profit_label.setText(f"누적 손익: {accumulated_profit}원")
-            self.today_profit_rate_label.setText(f"당일 손익률: {today_profit_rate}%")
-            self.monthly_profit_rate_label.setText(f"당월 손익률: {monthly_profit_rate}%")
-            self.accumulated_profit_rate_label.setText(f"누적 손익률: {accumulated_profit_rate}%")
-
-            # ✅ 보유 종목 정보 가져오기
-            stock_count = self.kiwoom.dynamicCall("GetRepeatCnt(QString, QString)", trcode, rqname)
-            self.holdings_table.setRowCount(stock_count)
-
-            for i in range(stock_count):
-                stock_code = self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, i, "종목코드").strip()
-                stock_name = self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, i, "종목명").strip()
-                quantity = clean_number(self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, i, "보유수량"))
-                buy_price = clean_number(self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, i, "매입금액"))
-                current_price = clean_number(self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, i, "현재가"))
-                evaluation_amount = clean_number(self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, i, "평가금액"))
-                profit = clean_number(self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, i, "손익금액"))
-                profit_rate = clean_number(self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, i, "손익율").strip())
-
-                self.holdings_table.setItem(i, 0, QTableWidgetItem(stock_code))
-                self.holdings_table.setItem(i, 1, QTableWidgetItem(stock_name))
-                self.holdings_table.setItem(i, 2, QTableWidgetItem(quantity))
-                self.holdings_table.setItem(i, 3, QTableWidgetItem(buy_price))
-                self.holdings_table.setItem(i, 4, QTableWidgetItem(current_price))
-                self.holdings_table.setItem(i, 5, QTableWidgetItem(evaluation_amount))
-                self.holdings_table.setItem(i, 6, QTableWidgetItem(profit))
-                self.holdings_table.setItem(i, 7, QTableWidgetItem(profit_rate))
-
-            print(f"✅ {stock_count}개의 보유 종목 정보 업데이트 완료")
+    def show_holdings(self, holdings):
+        """보유 종목 텍스트/테이블 갱신 및 실시간 등록"""
+        if holdings:
+            stock_info = "\n".join([f"종목명: {h.stock_name}, 수량: {h.quantity:,}, 매입가: {h.buy_price:,}" for h in holdings])
+        else:
+            stock_info = "보유 종목 없음"
+
+        self.stock_text.setText(stock_info)  # ✅ UI 업데이트만 수행
+
+        # ✅ 보유 종목 테이블 갱신 (계좌 스냅샷의 손익 엔진)
+        self.stock_data_manager.load_holdings_list()
+
+    def on_balance_tr(self, result):
+        """잔고조회(OPW00001) 응답"""
+        self.account_manager.on_balance_tr(result)
+        QApplication.processEvents()
+
+    def on_current_price_tr(self, result):
+        """현재가조회(opt10001) 응답"""
+        stock_code = result.single.stock_code
+        current_price = result.single.current_price
+
+        # ✅ 데이터가 정상적으로 들어왔는지 확인
+        if not stock_code or not current_price:
+            print(f"⚠️ 현재가 데이터 없음, stock_code={stock_code}, current_price={current_price}")
+            return  # ✅ 잘못된 응답은 무시
+
+        print(f"📥 {stock_code} 현재가 수신: {current_price}")
+
+        # ✅ 후보군 리스트에서 해당 종목 찾기
+        for stock in self.stock_data_manager.candidates_stocks:
+            if stock["stock_code"] == stock_code:
+                stock["current_price"] = current_price  # ✅ 현재가 업데이트
+                stock["price_time"] = time.time()  # 판단가 경과 시간 측정용
+
+                # ✅ UI 테이블 업데이트 (현재가 / 20이평 대비 차이)
+                for row in range(self.candidates_table.rowCount()):
+                    if self.candidates_table.item(row, 0).text() == stock_code:
+                        self.stock_data_manager.show_candidate_price(row, stock)
+                        break  # ✅ 찾으면 종료
+
+        # ✅ Qt UI 강제 갱신
+        QApplication.processEvents()
+
+    def on_account_evaluation_tr(self, result):
+        """계좌평가현황요청(OPW00004) 응답"""
+        self.account_manager.on_account_evaluation_tr(result)
+
+    def show_account_evaluation(self, result):
+        """계좌평가현황 라벨과 보유 종목 테이블 갱신 (손익 엔진 반영은 계좌 스냅샷에서)"""
+        summary = result.single
+        print(f"📥 계좌평가현황요청 응답 수신: {result.trcode}")
+        print(f"📥 예수금: {summary.cash:,}원")
+        print(f"📥 D+2 추정 예수금: {summary.d2_deposit:,}원")
+        print(f"📥 총 매입 금액: {summary.total_buy_amount:,}원")
+        print(f"📥 당일 손익: {summary.today_profit:,}원")
+        print(f"📥 당월 손익: {summary.monthly_profit:,}원")
+        print(f"📥 누적 손익: {summary.accumulated_profit:,}원")
+        print(f"📥 당일 손익률: {summary.today_profit_rate:,}%")
+        print(f"📥 당월 손익률: {summary.monthly_profit_rate:,}%")
+        print(f"📥 누적 손익률: {summary.accumulated_profit_rate:,}%")
+
+        # ✅ UI 업데이트
+        self.cash_label.setText(f"예수금: {summary.cash:,}원")
+        self.d2_deposit_label.setText(f"D+2 추정 예수금: {summary.d2_deposit:,}원")
+        self.total_buy_amount_label.setText(f"총 매입 금액: {summary.total_buy_amount:,}원")
+        self.today_profit_label.setText(f"당일 손익: {summary.today_profit:,}원")
+        self.monthly_profit_label.setText(f"당월 손익: {summary.monthly_profit:,}원")
+        self.accumulated_profit_label.setText(f"누적 손익: {summary.accumulated_profit:,}원")
+        self.today_profit_rate_label.setText(f"당일 손익률: {summary.today_profit_rate:,}%")
+        self.monthly_profit_rate_label.setText(f"당월 손익률: {summary.monthly_profit_rate:,}%")
+        self.accumulated_profit_rate_label.setText(f"누적 손익률: {summary.accumulated_profit_rate:,}%")
+
+        # ✅ 보유 종목 테이블 표시
+        self.stock_data_manager.load_holdings_list()
+
+        print(f"✅ {len(result.rows)}개의 보유 종목 정보 업데이트 완료")
         
       
             
         
-def filter_candidates():
-    """매수 후보군 필터링"""
-    filtered_candidates = []
-    
-    stock_list = json.load(open("all_stock_codes.json", "r", encoding="utf-8"))
-    
-    for stock_code in stock_list:
-        try:
-            
-            with open(f"stock_data/{stock_code}.json", "r", encoding="utf-8") as f:
-                stock_data = json.load(f)
-
-            df = pd.DataFrame(stock_data).sort_values("date")
-            df["5_MA"] = df["close"].rolling(window=5).mean()
-            df["20_MA"] = df["close"].rolling(window=20).mean()
-            df["Volume_MA5"] = df["volume"].rolling(window=5).mean()
-
-            # 최근 15일 내에서 5이평이 20이평보다 계속 작다가 골든크로스 발생 후 항상 위에 있어야 함
-            golden_cross = False
-            cross_index = -1  # 골든크로스 발생 인덱스 저장
-
-            for i in range(15, 0, -1):  # 최근 15일을 역순 탐색
-                if df["5_MA"].iloc[-i] < df["20_MA"].iloc[-i]:  
-                    continue  # 아직 5이평이 20이평보다 작음
-
-                if df["5_MA"].iloc[-i - 1] < df["20_MA"].iloc[-i - 1] and df["5_MA"].iloc[-i] > df["20_MA"].iloc[-i]:
-                    golden_cross = True
-                    cross_index = -i  # 골든크로스 발생 인덱스 저장
-                    break
-
-            # 골든크로스가 없거나, 이후 5이평이 20이평보다 작아지는 경우 제외
-            if not golden_cross or any(df["5_MA"].iloc[cross_index:] < df["20_MA"].iloc[cross_index:]):
-                continue
+def is_market_open():
+    """정규장(평일 09:00~15:30) 여부 (장 밖에서는 실시간 체결이 없어 콜백 멈춤으로 보지 않음)"""
+    now = time.localtime()
+    return now.tm_wday < 5 and "0900" <= time.strftime("%H%M", now) < "1530"
 
-            ma20_last_15 = df["20_MA"].iloc[-15:].values  # NumPy 배열로 변환
-            # 최근 3일간 연속 상승하는지 확인
-            is_recent_3days_upward = all(ma20_last_15[i] < ma20_last_15[i + 1] for i in range(len(ma20_last_15) - 3, len(ma20_last_15) - 1))
-
-            if not is_recent_3days_upward:
-                continue
-
-            # 종가 기준 필터링
-            last_close = df["close"].iloc[-1]
-            avg_volume_5 = df["Volume_MA5"].iloc[-1]
-
-            if last_close < 2000:
-                continue
-
-            if 2000 <= last_close < 10000 and avg_volume_5 < 500000:
-                continue
-            if last_close >= 10000 and avg_volume_5 < 100000:
-                continue
-
-            filtered_candidates.append({"stock_code": stock_code, "price": df["20_MA"].iloc[-1]})
-
-        except FileNotFoundError:
-            continue
 
-    # ✅ JSON 파일로 저장
-    with open("filtered_candidates.json", "w", encoding="utf-8") as f:
-        json.dump({"stocks": filtered_candidates}, f, indent=4, ensure_ascii=False)
+def filter_candidates(stock_list=None):
+    """매수 후보군 필터링 (stock_list를 넘기지 않으면 all_stock_codes.json 전체)
 
-    print(f"✅ {len(filtered_candidates)}개 종목이 조건을 만족했습니다. (filtered_candidates.json 저장 완료)")
+    화면 규칙(ui_rule)은 kiwoom_filter_stock의 일괄 필터 규칙과 다르다 (kiwoom_benchmark.py에서 비교).
+    """
+    return run_filter(stock_list, rule=ui_rule)
 
 if __name__ == "__main__":
     app = QApplication(sys.argv)
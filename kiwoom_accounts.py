@@ -0,0 +1,148 @@
+import time
+from collections import deque
+
+from kiwoom_exit_engine import ExitEngine
+from kiwoom_portfolio import HoldingsBook
+from kiwoom_tr_schema import TR_SCHEMAS, TRResult
+
+
+class AccountState:
+    """계좌 하나의 스냅샷 (잔고 / 보유 종목 / 계좌평가 / 원장 / 주문 대기열)
+
+    모든 계좌의 상태를 각각 들고 있으므로, 화면에서 계좌를 바꿔도 TR 없이
+    이 스냅샷을 그대로 그리면 된다. 실시간 체결가는 계좌마다 손익 엔진에
+    반영되고, 자동 청산도 계좌마다 따로 돈다.
+    """
+    LEDGER_SIZE = 1000
+
+    def __init__(self, account_number, exit_engine=None, clock=time.monotonic):
+        self.account_number = account_number
+        self.clock = clock
+        self.balance = None  # 주문가능금액 (OPW00001)
+        self.holdings = []  # 보유 종목 레코드 (OPW00018)
+        self.evaluation = None  # 계좌평가현황 응답 (OPW00004)
+        self.book = HoldingsBook()
+        self.exit_engine = exit_engine or ExitEngine(lambda *args: None)  # 계좌별 자동 청산
+        self.ledger = deque(maxlen=self.LEDGER_SIZE)  # (시각, 구분, 종목코드, 수량, 가격, 내용)
+        self.order_queue = deque()  # 주문 제한에 걸려 대기 중인 주문
+        self.pending_orders = {}  # 체결 대기 중인 매수 주문 (종목코드 → 주문 반환값)
+        self.updated_at = {}  # TR 코드 → 마지막 응답 시각
+
+    @property
+    def owned_stocks(self):
+        return {h.stock_code for h in self.holdings}
+
+    def loaded(self, trcode):
+        return trcode in self.updated_at
+
+    def age(self, trcode):
+        """마지막 응답 후 지난 초 (한 번도 받지 않았으면 inf)"""
+        updated_at = self.updated_at.get(trcode)
+        return float("inf") if updated_at is None else self.clock() - updated_at
+
+    def mark_stale(self):
+        """받아 둔 데이터를 모두 갱신 대상으로 (재접속 후 등, 화면에는 그대로 표시)"""
+        for trcode in self.updated_at:
+            self.updated_at[trcode] = float("-inf")
+
+    def set_balance(self, trcode, balance):
+        self.balance = balance
+        self.updated_at[trcode] = self.clock()
+
+    def set_holdings(self, trcode, holdings):
+        self.holdings = list(holdings)
+        self.book.set_positions(self.holdings)
+        self.exit_engine.sync(self.book)
+        self.updated_at[trcode] = self.clock()
+
+    def set_evaluation(self, trcode, result):
+        self.evaluation = result
+        self.book.set_positions(result.rows)
+        self.exit_engine.sync(self.book)
+        self.updated_at[trcode] = self.clock()
+
+    def record(self, kind, stock_code, quantity=0, price=0, note=""):
+        """원장에 주문/체결 기록"""
+        self.ledger.append((time.strftime("%H:%M:%S"), kind, stock_code, quantity, price, note))
+
+    def snapshot(self):
+        """웜 스타트용 상태 (아직 보내지 않은 주문 대기열은 재시작 후 다시 판단하도록 제외)"""
+        book = self.book
+        return {
+            "balance": self.balance,
+            "holdings": [[getattr(h, attr) for attr in h.__slots__] for h in self.holdings],
+            "evaluation": self.evaluation.to_dict() if self.evaluation is not None else None,
+            "last_prices": {code: float(book.last_price[i]) for i, code in enumerate(book.codes)},
+            "high_water": self.exit_engine.high_water_marks(),
+            "ledger": list(self.ledger),
+            "pending_orders": self.pending_orders,
+        }
+
+    def restore(self, data, pending_orders=True):
+        """snapshot()의 역 → 화면은 바로 그릴 수 있고, 모든 TR은 갱신 대상(stale)으로 남김
+
+        pending_orders: 체결 대기 주문도 복구할지 (분할 주문은 스케줄러 상태가 없으므로 항상 제외)
+        """
+        row_type = TR_SCHEMAS["OPW00018"].row_type
+        if data.get("evaluation"):
+            self.evaluation = TRResult.from_dict(data["evaluation"])
+            self.book.set_positions(self.evaluation.rows)
+        self.holdings = [row_type(*values) for values in data.get("holdings", [])]
+        if self.holdings:
+            self.book.set_positions(self.holdings)
+        self.book.update_prices(data.get("last_prices", {}))
+        self.exit_engine.sync(self.book)
+        self.exit_engine.restore_high_water(data.get("high_water", {}))
+        self.balance = data.get("balance")
+        self.ledger.extend(tuple(entry) for entry in data.get("ledger", []))
+        if pending_orders:
+            self.pending_orders.update(
+                (code, ret) for code, ret in data.get("pending_orders", {}).items() if ret != "분할"
+            )
+        for trcode, loaded in (("OPW00001", self.balance is not None), ("OPW00018", bool(data.get("holdings"))),
+                               ("OPW00004", self.evaluation is not None)):
+            if loaded:
+                self.updated_at[trcode] = float("-inf")
+
+
+class AccountWarmer:
+    """모든 계좌 스냅샷을 공용 조회 제한 안에서 백그라운드로 갱신
+
+    tick()이 불릴 때마다 가장 오래된 (계좌, TR) 하나를 골라 요청한다.
+    조회 제한(RateLimiter)에 reserve개 이상 여유가 있을 때만 보내므로
+    사용자 조작이나 후보군 현재가 조회 같은 요청이 밀리지 않는다.
+    """
+    def __init__(self, accounts, request, tr_limiter, refresh, reserve=2, inflight_timeout=10.0, clock=time.monotonic):
+        self.accounts = accounts  # 계좌번호 → AccountState
+        self.request = request  # request(trcode, account_number) → TR을 실제로 보냈으면 True
+        self.tr_limiter = tr_limiter
+        self.refresh = refresh  # TR 코드 → 갱신 주기(초)
+        self.reserve = reserve
+        self.inflight_timeout = inflight_timeout
+        self.clock = clock
+        self.requested = {}  # (TR 코드, 계좌번호) → 마지막 요청 시각 (응답 대기 중 중복 요청 방지)
+        self.sent = 0
+
+    def next_request(self):
+        """갱신 주기를 가장 많이 넘긴 (TR 코드, 계좌번호), 없으면 None"""
+        best, best_overdue = None, 0.0
+        now = self.clock()
+        for account_number, state in self.accounts.items():
+            for trcode, interval in self.refresh.items():
+                if now - self.requested.get((trcode, account_number), float("-inf")) < min(interval, self.inflight_timeout):
+                    continue
+                overdue = state.age(trcode) / interval
+                if overdue >= 1.0 and overdue > best_overdue:
+                    best, best_overdue = (trcode, account_number), overdue
+        return best
+
+    def tick(self):
+        if self.tr_limiter.available() <= self.reserve:
+            return None
+        target = self.next_request()
+        if target is None:
+            return None
+        self.requested[target] = self.clock()
+        if self.request(*target):
+            self.sent += 1
+        return target
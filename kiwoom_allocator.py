@@ -0,0 +1,107 @@
+import time
+import argparse
+import numpy as np
+
+
+def allocate(prices, strengths, cash, caps, lot=1, price_buffer=0.003):
+    """동시에 진입 신호가 난 종목들의 매수 수량을 한 번에 계산
+
+    prices: 종목별 현재가 / strengths: 신호 강도(클수록 우선, 0 이하면 제외)
+    cash: 쓸 수 있는 금액 / caps: 종목당 최대 매수 금액 (스칼라 또는 배열)
+    lot: 주문 단위 주식 수 / price_buffer: 시장가 체결가 상승 여유 (주문 단가 = 현재가 × (1 + buffer))
+
+    1) 신호 강도 비례로 현금을 나누되 상한에 걸린 종목 몫은 나머지 종목에 다시 나눈다 (water-filling)
+    2) 각 종목 몫을 주문 단위로 내림
+    3) 내림으로 남은 현금은 신호가 강한 종목부터 상한 안에서 단위 단위로 채운다
+    반환: 종목별 매수 수량 (int64 배열)
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    strengths = np.asarray(strengths, dtype=np.float64)
+    n = len(prices)
+    quantities = np.zeros(n, dtype=np.int64)
+    if n == 0 or cash <= 0:
+        return quantities
+
+    unit_cost = np.ceil(prices * (1 + price_buffer)) * lot  # 한 단위 주문에 필요한 금액
+    caps = np.broadcast_to(np.asarray(caps, dtype=np.float64), (n,))
+    caps = np.minimum(caps, cash)
+    eligible = (prices > 0) & (strengths > 0) & (unit_cost <= caps)
+    if not eligible.any():
+        return quantities
+
+    # 1) 신호 강도 비례 배분 + 상한 초과분 재배분
+    budget = np.zeros(n)
+    active = eligible.copy()
+    remaining = float(cash)
+    while active.any() and remaining > 0:
+        weights = np.where(active, strengths, 0.0)
+        share = remaining * weights / weights.sum()
+        capped = active & (budget + share >= caps)
+        if not capped.any():
+            budget += share
+            break
+        budget[capped] = caps[capped]
+        active &= ~capped
+        remaining = cash - budget.sum()
+
+    # 2) 주문 단위로 내림
+    units = np.floor(budget / np.where(eligible, unit_cost, np.inf)).astype(np.int64)
+    spent = float((units * unit_cost).sum())
+
+    # 3) 남은 현금을 강한 신호 순으로 채움 (남은 금액이 가장 싼 단위보다 작아지면 중단)
+    leftover = cash - spent
+    cheapest = unit_cost[eligible].min()
+    for i in np.argsort(-strengths):
+        if leftover < cheapest:
+            break
+        if not eligible[i]:
+            continue
+        room = min(leftover, caps[i] - units[i] * unit_cost[i])
+        extra = int(room // unit_cost[i])
+        if extra > 0:
+            units[i] += extra
+            leftover -= extra * unit_cost[i]
+
+    quantities[:] = units * lot
+    return quantities
+
+
+def entry_strengths(price_diffs, threshold):
+    """20이평과의 괴리율 → 신호 강도 (이평에 가까울수록 1, 진입 기준 끝에서 0에 가까움)"""
+    price_diffs = np.abs(np.asarray(price_diffs, dtype=np.float64))
+    if threshold <= 0:
+        return np.ones(len(price_diffs))
+    return np.clip(1.0 - price_diffs / threshold, 0.0, 1.0) + 1e-3
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="동시 진입 종목 자금 배분 (고정 금액 방식과 비교)")
+    parser.add_argument("--names", type=int, default=50, help="진입 신호 종목 수")
+    parser.add_argument("--cash", type=int, default=5_000_000)
+    parser.add_argument("--cap", type=int, default=300_000, help="종목당 최대 매수 금액")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    prices = np.round(np.exp(rng.uniform(np.log(1500), np.log(400000), args.names)), -1)
+    diffs = rng.uniform(0, 0.008, args.names)
+    strengths = entry_strengths(diffs, 0.008)
+
+    # 기존 방식: 괴리율 순으로 종목당 cap원씩, 수량 = cap // 현재가, 잔고가 떨어질 때까지
+    fixed = np.zeros(args.names, dtype=np.int64)
+    balance = args.cash
+    for i in np.argsort(diffs):
+        quantity = args.cap // int(prices[i])
+        if quantity < 1 or balance < quantity * prices[i]:
+            continue
+        fixed[i] = quantity
+        balance -= quantity * prices[i]
+
+    started = time.perf_counter()
+    for _ in range(100):
+        quantities = allocate(prices, strengths, args.cash, args.cap)
+    elapsed = (time.perf_counter() - started) / 100
+
+    for name, q in (("고정 금액", fixed), ("배분 엔진", quantities)):
+        deployed = float((q * prices).sum())
+        print(f"💰 {name}: {int((q > 0).sum())}개 종목, 투입 {deployed:,.0f}원 ({deployed / args.cash * 100:.1f}%)")
+    print(f"⏱ 배분 계산 {elapsed * 1000:.3f}ms ({args.names}개 종목)")
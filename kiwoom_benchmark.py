@@ -0,0 +1,254 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import tracemalloc
+import numpy as np
+
+from kiwoom_price_store import PriceStore
+from kiwoom_filter_stock import filter_candidates, RULES, PHASES
+
+
+BENCH_DIR = "bench_data"
+GOLDEN_PATH = "benchmark_golden.json"  # 구현별 기대 결과 (환경과 무관, 저장소에 포함)
+BASELINE_PATH = "benchmark_baseline.json"  # 구현별 처리량/메모리 기준 (실행 환경마다 따로)
+UNIVERSE_SIZES = (2760, 10000, 100000)
+
+
+def generate_universe(n_symbols, days=60, seed=0, plant_every=10):
+    """합성 일봉 유니버스 생성 (같은 인자면 항상 같은 데이터)
+
+    - 일반 종목: 가격 1,000~300,000원 로그 균등, 일간 수익률 정규분포(2%) 랜덤워크
+    - plant_every번째 종목마다 골든크로스 패턴 심기: 하락하다 최근 12일 급반등,
+      3,000원 이상 / 5일 평균 거래량 80만 주 이상 → 두 필터 규칙(batch, ui) 모두 통과해야 함
+    반환: (종목코드 리스트, 심은 종목코드 리스트, 날짜 리스트(오래된 순), {컬럼: 종목 × 날짜 int64 배열})
+    """
+    rng = np.random.default_rng(seed)
+    codes = [f"{i:06d}" for i in range(n_symbols)]
+    end = np.datetime64("2025-01-03")
+    dates = np.busday_offset(end, -np.arange(days)[::-1], roll="backward")
+    date_strs = [str(d).replace("-", "") for d in dates]
+
+    base = np.exp(rng.uniform(np.log(1000), np.log(300000), n_symbols))
+    log_returns = rng.normal(0.0, 0.02, (n_symbols, days))
+    volume = np.exp(rng.normal(np.log(200000), 1.0, (n_symbols, days)))
+
+    planted = np.arange(0, n_symbols, plant_every)
+    rise = 12
+    trend = np.r_[np.full(days - rise, -0.004), np.full(rise, 0.02)]
+    log_returns[planted] = trend + rng.normal(0.0, 0.002, (len(planted), days))
+    base[planted] = np.maximum(base[planted], 3000)
+    volume[planted] = rng.uniform(800000, 2000000, (len(planted), days))
+
+    close = base[:, None] * np.exp(np.cumsum(log_returns, axis=1))
+    prev_close = np.c_[close[:, :1], close[:, :-1]]
+    open_ = prev_close * (1 + rng.normal(0.0, 0.005, close.shape))
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0.0, 0.01, close.shape)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0.0, 0.01, close.shape)))
+    bars = {
+        "open": np.round(open_).astype(np.int64),
+        "high": np.round(high).astype(np.int64),
+        "low": np.round(low).astype(np.int64),
+        "close": np.round(close).astype(np.int64),
+        "volume": np.round(volume).astype(np.int64),
+    }
+    return codes, [codes[i] for i in planted], date_strs, bars
+
+
+def prepare_universe(n_symbols, days=60, seed=0, root=BENCH_DIR):
+    """합성 유니버스를 stock_data와 같은 형식(PriceStore)으로 저장 (이미 있으면 재사용)
+
+    반환: (데이터 디렉터리, 종목코드 리스트, 심은 종목코드 리스트)
+    """
+    data_dir = os.path.join(root, f"u{n_symbols}_s{seed}_d{days}")
+    manifest_path = os.path.join(data_dir, "universe.manifest")
+    if os.path.exists(manifest_path):
+        with open(manifest_path, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+        return data_dir, manifest["codes"], manifest["planted"]
+
+    started = time.perf_counter()
+    codes, planted, dates, bars = generate_universe(n_symbols, days, seed)
+    store = PriceStore(data_dir)
+    columns = {c: bars[c].tolist() for c in bars}
+    for i, stock_code in enumerate(codes):
+        # 키움 응답과 같이 최신 날짜가 앞
+        rows = [
+            {"date": dates[t], **{c: columns[c][i][t] for c in columns}}
+            for t in range(days - 1, -1, -1)
+        ]
+        store.save(stock_code, rows)
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump({"codes": codes, "planted": planted}, f)
+    print(f"🧪 합성 유니버스 생성: {n_symbols:,}개 종목 × {days}일 → {data_dir} ({time.perf_counter() - started:.1f}초)")
+    return data_dir, codes, planted
+
+
+def digest(candidates):
+    """후보 목록 요약 (종목코드 + 20이평 소수 둘째 자리까지, 순서 무관)"""
+    lines = sorted(f"{c['stock_code']}:{float(c['price']):.2f}" for c in candidates)
+    return {"count": len(lines), "sha256": hashlib.sha256("\n".join(lines).encode("utf-8")).hexdigest()}
+
+
+def run_screen(rule_name, data_dir, codes, trace_memory=False):
+    """필터 구현 1회 실행 → (후보 목록, 단계별 시간(초), 최대 메모리(bytes) 또는 None)"""
+    timings = {}
+    output = f"{data_dir}.candidates_{rule_name}.json"  # 저장소 디렉터리 밖 (종목 파일로 읽히지 않게)
+    if trace_memory:
+        tracemalloc.start()
+    try:
+        candidates = filter_candidates(codes, rule=RULES[rule_name], data_dir=data_dir, output=output, timings=timings)
+        peak = tracemalloc.get_traced_memory()[1] if trace_memory else None
+    finally:
+        if trace_memory:
+            tracemalloc.stop()
+    return candidates, timings, peak
+
+
+def load_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def save_json(path, data):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=4, ensure_ascii=False)
+
+
+def benchmark(n_symbols, days=60, seed=0, rules=tuple(RULES), repeat=1, trace_memory=True,
+              golden=None, baseline=None, max_regression=0.2, max_memory_growth=0.2):
+    """한 유니버스 크기에서 필터 구현별 성능 측정 + 회귀 검사
+
+    golden/baseline: {키: {규칙: ...}} (GOLDEN_PATH / BASELINE_PATH 내용, 없으면 해당 검사 생략)
+    - 처리량(종목/초)이 기준보다 max_regression 이상 떨어지면 실패
+    - 최대 메모리가 기준보다 max_memory_growth 이상 늘면 실패
+    - 결과가 golden과 다르거나 심은 골든크로스 종목을 하나라도 놓치면 실패
+    반환: (키, {규칙: 측정 결과}, 실패 사유 리스트)
+    """
+    key = f"{n_symbols}:{seed}:{days}"
+    data_dir, codes, planted = prepare_universe(n_symbols, days, seed)
+    golden = (golden or {}).get(key, {})
+    baseline = (baseline or {}).get(key, {})
+    results, failures = {}, []
+
+    for rule_name in rules:
+        best = None
+        for _ in range(repeat):
+            candidates, timings, _ = run_screen(rule_name, data_dir, codes)
+            if best is None or sum(timings.values()) < sum(best[1].values()):
+                best = (candidates, timings)
+        candidates, timings = best
+        peak = run_screen(rule_name, data_dir, codes, trace_memory=True)[2] if trace_memory else None
+
+        total = sum(timings.values())
+        selected = {c["stock_code"] for c in candidates}
+        result = {
+            "phases": timings,
+            "throughput": n_symbols / total if total > 0 else float("inf"),
+            "peak_bytes": peak,
+            "output": digest(candidates),
+            "planted_found": len(selected.intersection(planted)),
+            "selected": selected,
+        }
+        results[rule_name] = result
+
+        label = f"[{key} {rule_name}]"
+        if result["planted_found"] < len(planted):
+            failures.append(f"{label} 심은 골든크로스 {len(planted)}개 중 {result['planted_found']}개만 선택")
+        expected = golden.get(rule_name)
+        if expected is not None and expected != result["output"]:
+            failures.append(f"{label} 결과가 golden과 다름 ({expected['count']}개 기대, {result['output']['count']}개)")
+        reference = baseline.get(rule_name)
+        if reference is not None:
+            floor = reference["throughput"] * (1 - max_regression)
+            if result["throughput"] < floor:
+                failures.append(
+                    f"{label} 처리량 회귀 {result['throughput']:,.0f}종목/초 < 기준 {reference['throughput']:,.0f}의 "
+                    f"{(1 - max_regression) * 100:.0f}%"
+                )
+            if peak is not None and reference.get("peak_bytes"):
+                ceiling = reference["peak_bytes"] * (1 + max_memory_growth)
+                if peak > ceiling:
+                    failures.append(
+                        f"{label} 최대 메모리 {peak / 2 ** 20:.1f}MB > 기준 {reference['peak_bytes'] / 2 ** 20:.1f}MB의 "
+                        f"{(1 + max_memory_growth) * 100:.0f}%"
+                    )
+    return key, results, failures
+
+
+def print_results(key, results):
+    print(f"\n📊 유니버스 {key} (종목수:시드:일수)")
+    print(f"   {'규칙':<6}" + "".join(f"{phase:>11}" for phase in PHASES) + f"{'종목/초':>11}{'최대메모리':>10}{'선택':>7}")
+    for rule_name, result in results.items():
+        peak = f"{result['peak_bytes'] / 2 ** 20:.1f}MB" if result["peak_bytes"] is not None else "-"
+        print(
+            f"   {rule_name:<6}" + "".join(f"{result['phases'][phase] * 1000:>9.0f}ms" for phase in PHASES)
+            + f"{result['throughput']:>11,.0f}{peak:>13}{result['output']['count']:>8}"
+        )
+    if "batch" in results and "ui" in results:
+        # 두 구현은 규칙이 다르다 (ui: 교차 후 계속 위 + 20이평 3일 연속 상승 + 2000원 미만 제외)
+        batch, ui = results["batch"]["selected"], results["ui"]["selected"]
+        print(f"   ↔ 규칙 차이: batch에만 {len(batch - ui)}개, ui에만 {len(ui - batch)}개, 공통 {len(batch & ui)}개")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="후보군 필터 벤치마크 (합성 유니버스, 단계별 시간/메모리, 회귀 검사)")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[UNIVERSE_SIZES[0]],
+                        help=f"종목 수 (예: {' '.join(map(str, UNIVERSE_SIZES))})")
+    parser.add_argument("--days", type=int, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--rules", nargs="+", choices=sorted(RULES), default=sorted(RULES))
+    parser.add_argument("--repeat", type=int, default=1, help="시간 측정 반복 횟수 (가장 빠른 값 사용)")
+    parser.add_argument("--no-memory", action="store_true", help="tracemalloc 메모리 측정 생략")
+    parser.add_argument("--max-regression", type=float, default=0.2, help="허용 처리량 하락 비율")
+    parser.add_argument("--max-memory-growth", type=float, default=0.2, help="허용 최대 메모리 증가 비율")
+    parser.add_argument("--save-golden", action="store_true", help="이번 결과를 golden으로 저장")
+    parser.add_argument("--save-baseline", action="store_true", help="이번 처리량/메모리를 기준으로 저장")
+    args = parser.parse_args()
+
+    golden = load_json(GOLDEN_PATH)
+    baseline = load_json(BASELINE_PATH)
+    failures = []
+    for n_symbols in args.sizes:
+        key, results, size_failures = benchmark(
+            n_symbols, args.days, args.seed, args.rules, args.repeat, not args.no_memory,
+            None if args.save_golden else golden, None if args.save_baseline else baseline,
+            args.max_regression, args.max_memory_growth,
+        )
+        print_results(key, results)
+        failures.extend(size_failures)
+        # ✅ 비교 대상이 없으면 통과가 아니라 실패 (깨끗한 체크아웃에서 회귀 검사가 조용히 빠지지 않게)
+        missing_golden = [r for r in args.rules if r not in golden.get(key, {})]
+        if missing_golden and not args.save_golden:
+            failures.append(f"[{key}] {GOLDEN_PATH}에 {', '.join(missing_golden)} 결과가 없음 (--save-golden으로 생성 후 커밋)")
+        missing_baseline = [r for r in args.rules if r not in baseline.get(key, {})]
+        if missing_baseline and not args.save_baseline:
+            failures.append(
+                f"[{key}] {BASELINE_PATH}에 {', '.join(missing_baseline)} 기준이 없음 "
+                f"(이 환경에서 --save-baseline으로 먼저 기준 저장)"
+            )
+        if args.save_golden:
+            golden.setdefault(key, {}).update({r: res["output"] for r, res in results.items()})
+        if args.save_baseline:
+            baseline.setdefault(key, {}).update(
+                {r: {"throughput": res["throughput"], "peak_bytes": res["peak_bytes"]} for r, res in results.items()}
+            )
+
+    if args.save_golden:
+        save_json(GOLDEN_PATH, golden)
+        print(f"💾 golden 저장: {GOLDEN_PATH}")
+    if args.save_baseline:
+        save_json(BASELINE_PATH, baseline)
+        print(f"💾 기준 저장: {BASELINE_PATH}")
+
+    if failures:
+        print("\n❌ 벤치마크 실패")
+        for failure in failures:
+            print(f"   - {failure}")
+        sys.exit(1)
+    print("\n✅ 벤치마크 통과")
@@ -0,0 +1,231 @@
+import json
+import time
+import argparse
+
+from kiwoom_filter_stock import Kiwoom, check_candidate, save_candidates
+from kiwoom_master import InstrumentMaster
+
+
+class ConditionSearch:
+    """키움 서버 조건검색 (영웅문에서 저장한 조건식)
+
+    GetConditionLoad로 조건식 목록을 받고, SendCondition으로 검색해 편입
+    종목을 받는다. 실시간 검색(search=1)으로 보낸 조건은 이후
+    OnReceiveRealCondition으로 편입(I)/이탈(D) 이벤트가 들어온다.
+    조건검색은 같은 조건을 1분에 1번, 전체 초당 1번 정도로 제한되므로
+    SendCondition 사이에 min_interval초 간격을 둔다.
+    """
+    SCREEN_NO = "9100"
+
+    def __init__(self, kiwoom, process_events, screen_no=SCREEN_NO, min_interval=1.0):
+        self.kiwoom = kiwoom  # 키움 컨트롤 (QAxWidget / 시뮬레이터)
+        self.process_events = process_events  # 이벤트 대기 중 호출할 함수
+        self.screen_no = screen_no
+        self.min_interval = min_interval
+        self.conditions = {}  # 조건명 → 조건 인덱스
+        self.matches = {}  # 조건명 → 편입 종목 set
+        self.realtime = set()  # 실시간 검색 중인 조건명
+        self.listeners = []  # 실시간 편입/이탈 콜백 (stock_code, included, condition_name)
+        self._loaded = None
+        self._results = {}  # 조건명 → 검색 결과 (응답 대기 중이면 None)
+        self._last_sent = 0.0
+
+        self.kiwoom.OnReceiveConditionVer.connect(self.on_receive_condition_ver)
+        self.kiwoom.OnReceiveTrCondition.connect(self.on_receive_tr_condition)
+        self.kiwoom.OnReceiveRealCondition.connect(self.on_receive_real_condition)
+
+    def _wait(self, done, timeout):
+        deadline = time.monotonic() + timeout
+        while not done():
+            if time.monotonic() > deadline:
+                return False
+            self.process_events()
+        return True
+
+    def load(self, timeout=10.0):
+        """서버에 저장된 조건식 목록 로드 → {조건명: 인덱스}"""
+        self._loaded = None
+        self.kiwoom.dynamicCall("GetConditionLoad()")
+        if not self._wait(lambda: self._loaded is not None, timeout) or not self._loaded:
+            print("❌ 조건검색식 로드 실패")
+            return {}
+
+        raw = self.kiwoom.dynamicCall("GetConditionNameList()")
+        self.conditions = {}
+        for item in raw.split(";"):
+            if "^" in item:
+                index, name = item.split("^", 1)
+                self.conditions[name] = int(index)
+        print(f"✅ 조건검색식 {len(self.conditions)}개 로드: {', '.join(self.conditions)}")
+        return self.conditions
+
+    def search(self, condition_name, realtime=False, timeout=10.0):
+        """조건검색 실행 → 편입 종목코드 리스트 (realtime=True면 이후 편입/이탈 이벤트 수신)"""
+        if condition_name not in self.conditions:
+            print(f"❌ 조건식 없음: {condition_name}")
+            return []
+
+        wait = self.min_interval - (time.monotonic() - self._last_sent)
+        if wait > 0:
+            time.sleep(wait)
+
+        self._results[condition_name] = None
+        ret = self.kiwoom.dynamicCall(
+            "SendCondition(QString, QString, int, int)",
+            self.screen_no, condition_name, self.conditions[condition_name], 1 if realtime else 0,
+        )
+        self._last_sent = time.monotonic()
+        if ret != 1:
+            print(f"❌ 조건검색 요청 실패: {condition_name} (반환값: {ret})")
+            return []
+
+        if not self._wait(lambda: self._results[condition_name] is not None, timeout):
+            print(f"❌ 조건검색 응답 없음: {condition_name}")
+            return []
+        if realtime:
+            self.realtime.add(condition_name)
+        return self._results.pop(condition_name)
+
+    def stop(self, condition_name=None):
+        """실시간 조건검색 중지 (None이면 전체)"""
+        for name in [condition_name] if condition_name else sorted(self.realtime):
+            self.kiwoom.dynamicCall(
+                "SendConditionStop(QString, QString, int)", self.screen_no, name, self.conditions[name]
+            )
+            self.realtime.discard(name)
+
+    def matched_codes(self):
+        """모든 조건의 편입 종목 합집합"""
+        codes = set()
+        for matched in self.matches.values():
+            codes |= matched
+        return codes
+
+    def on_receive_condition_ver(self, ret, msg):
+        self._loaded = ret == 1
+
+    def on_receive_tr_condition(self, screen_no, code_list, condition_name, index, prev_next):
+        codes = [code for code in code_list.split(";") if code]
+        self.matches[condition_name] = set(codes)
+        self._results[condition_name] = codes
+        print(f"📥 조건검색 결과: {condition_name} {len(codes)}개 종목")
+
+    def on_receive_real_condition(self, stock_code, event_type, condition_name, index):
+        """실시간 편입(I)/이탈(D)"""
+        matched = self.matches.setdefault(condition_name, set())
+        included = event_type == "I"
+        if included:
+            matched.add(stock_code)
+        else:
+            matched.discard(stock_code)
+        for listener in self.listeners:
+            listener(stock_code, included, condition_name)
+
+
+class ConditionCandidates:
+    """서버 조건검색 결과에 로컬 골든크로스 규칙을 합쳐 후보군 생성
+
+    서버가 편입시킨 종목만 일봉(OPT10081)을 받으므로 전종목을 받을 필요가 없다.
+    실시간 편입 종목은 대기열에 넣었다가 process_pending()에서 일봉을 받아 규칙을
+    적용하고(이벤트 핸들러 안에서 TR을 기다리지 않도록), 서버에서 이탈한 종목은
+    바로 후보군에서 뺀다.
+    """
+    def __init__(self, kiwoom, search, master=None, request_interval=0.3):
+        self.kiwoom = kiwoom  # kiwoom_filter_stock.Kiwoom 세션
+        self.search = search
+        self.master = master
+        self.request_interval = request_interval
+        self.candidates = {}  # 종목코드 → 후보 dict
+        self.pending = []  # 실시간 편입되어 판정을 기다리는 종목코드
+        self.tr_count = 0
+
+    def _evaluate(self, stock_codes):
+        if self.master is not None:
+            stock_codes = self.master.prefilter(stock_codes)
+        for stock_code in stock_codes:
+            if self.kiwoom.get_stock_data(stock_code) is not None:
+                candidate = check_candidate(stock_code)
+                if candidate is not None:
+                    self.candidates[stock_code] = candidate
+            self.tr_count += 1
+            time.sleep(self.request_interval)
+
+    def build(self, condition_names, realtime=False):
+        """조건들을 검색해 합집합 종목만 로컬 규칙으로 걸러 filtered_candidates.json 저장"""
+        server_codes = set()
+        for name in condition_names:
+            server_codes |= set(self.search.search(name, realtime=realtime))
+        print(f"🔎 서버 조건검색 편입 {len(server_codes)}개 종목 → 로컬 규칙 적용")
+
+        self.candidates = {}
+        self._evaluate(sorted(server_codes))
+        self.save()
+        if realtime:
+            self.search.listeners.append(self.on_condition_changed)
+        return list(self.candidates.values())
+
+    def save(self):
+        save_candidates(list(self.candidates.values()))
+        print(f"✅ {len(self.candidates)}개 종목이 조건을 만족했습니다. (filtered_candidates.json 저장 완료)")
+
+    def on_condition_changed(self, stock_code, included, condition_name):
+        if included:
+            if stock_code not in self.candidates and stock_code not in self.pending:
+                print(f"📈 {condition_name} 편입: {stock_code}")
+                self.pending.append(stock_code)
+            return
+
+        if stock_code in self.search.matched_codes():
+            return  # 다른 조건에는 아직 편입되어 있음
+        if stock_code in self.pending:
+            self.pending.remove(stock_code)
+        if self.candidates.pop(stock_code, None) is not None:
+            print(f"📉 {condition_name} 이탈: {stock_code}")
+            self.save()
+
+    def process_pending(self):
+        """실시간 편입 대기 종목 판정 (이벤트 루프 밖에서 호출)"""
+        if not self.pending:
+            return
+        stock_codes, self.pending = self.pending, []
+        before = len(self.candidates)
+        self._evaluate([code for code in stock_codes if code in self.search.matched_codes()])
+        if len(self.candidates) != before:
+            self.save()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="서버 조건검색 + 로컬 규칙으로 후보군 생성")
+    parser.add_argument("--sim", action="store_true", help="키움 API 대신 시뮬레이터 사용")
+    parser.add_argument("--condition", nargs="*", help="사용할 조건식 이름 (기본값: 전체)")
+    parser.add_argument("--watch", action="store_true", help="실시간 편입/이탈을 계속 반영")
+    args = parser.parse_args()
+
+    stock_list = json.load(open("all_stock_codes.json", "r", encoding="utf-8"))
+    if args.sim:
+        from kiwoom_simulator import SimulatedKiwoomControl
+        kiwoom = Kiwoom(control=SimulatedKiwoomControl(stock_list))
+    else:
+        kiwoom = Kiwoom()
+    kiwoom.login()
+
+    search = ConditionSearch(kiwoom.kiwoom, kiwoom.process_events)
+    conditions = search.load()
+    master = InstrumentMaster().load_or_refresh(kiwoom.kiwoom)
+
+    started = time.time()
+    builder = ConditionCandidates(kiwoom, search, master=master)
+    builder.build(args.condition or list(conditions), realtime=args.watch)
+    print(f"⏱ 후보군 생성 {time.time() - started:.1f}초, 일봉 조회 {builder.tr_count}개 종목 (전종목 {len(stock_list)}개)")
+
+    if args.watch:
+        try:
+            while True:
+                if args.sim:
+                    kiwoom.kiwoom.emit_condition_events(1)
+                kiwoom.process_events()
+                builder.process_pending()
+                time.sleep(1.0)
+        except KeyboardInterrupt:
+            search.stop()
+            print("🛑 실시간 조건검색 종료")
@@ -0,0 +1,297 @@
+import sys
+import json
+import time
+import queue
+import argparse
+import multiprocessing as mp
+
+from kiwoom_master import InstrumentMaster
+from kiwoom_price_store import PriceStore
+
+
+def _create_session(mode, worker_id):
+    """워커 프로세스 안에서 자신만의 API 세션 생성 (화면번호도 워커마다 다르게)"""
+    from kiwoom_filter_stock import Kiwoom
+
+    screen_no = f"{101 + worker_id:04d}"
+    if mode == "sim":
+        from kiwoom_simulator import SimulatedKiwoomControl
+        return Kiwoom(control=SimulatedKiwoomControl(), screen_no=screen_no)
+    return Kiwoom(screen_no=screen_no)
+
+
+def _worker_main(worker_id, mode, task_queue, result_queue, stop_event, days, request_interval):
+    """작업 큐에서 종목 묶음(shard)을 꺼내 일봉을 받아 결과 큐로 전달"""
+    kiwoom = _create_session(mode, worker_id)
+    kiwoom.login()
+    result_queue.put(("ready", worker_id, None, None))
+
+    while not stop_event.is_set():  # 코디네이터의 협조적 종료 신호
+        try:
+            task = task_queue.get(timeout=1.0)
+        except queue.Empty:
+            result_queue.put(("idle", worker_id, None, None))  # 대기 중에도 살아 있음을 알림
+            continue
+
+        shard_id, stock_codes = task
+        result_queue.put(("lease", worker_id, shard_id, None))
+        for stock_code in stock_codes:
+            if stop_event.is_set():
+                return  # 남은 종목은 코디네이터가 다시 분배
+            rows = kiwoom.get_stock_data(stock_code, days=days, save=False)
+            result_queue.put(("bars", worker_id, shard_id, (stock_code, rows)))
+            time.sleep(request_interval)  # 세션별 TR 조회 제한 준수
+        result_queue.put(("done", worker_id, shard_id, None))
+
+
+class DownloadCoordinator:
+    """여러 API 세션(워커 프로세스)에 종목을 나눠 일봉 데이터를 내려받는 코디네이터
+
+    - 종목 리스트를 shard_size 단위로 나눠 공유 작업 큐에 넣고, 놀고 있는 워커가 꺼내 간다.
+    - 워커는 데이터를 직접 쓰지 않고 결과 큐로 보내며, 저장은 코디네이터 한 곳에서만 한다.
+    - stall_timeout 동안 진행이 없는 워커는 먼저 협조적으로 멈추게 하고, 남은 종목을 다시 잘게
+      나눠 큐에 넣은 뒤 새 워커를 띄운다. 응답하지 않아 강제 종료한 경우에는 공유 큐가 깨졌을 수
+      있으므로 큐를 새로 만들고 모든 워커를 다시 띄운다.
+    """
+    def __init__(self, stock_codes, num_workers=2, mode="real", shard_size=20, days=60,
+                 stall_timeout=60.0, request_interval=0.3, store=None, max_restarts=None,
+                 stop_grace=5.0):
+        self.stock_codes = list(stock_codes)
+        self.num_workers = num_workers
+        self.mode = mode  # "real": 키움 OCX, "sim": 시뮬레이터
+        self.shard_size = shard_size
+        self.days = days
+        self.stall_timeout = stall_timeout
+        self.request_interval = request_interval
+        self.store = store or PriceStore()
+        self.max_restarts = num_workers * 3 if max_restarts is None else max_restarts
+        self.stop_grace = stop_grace  # 협조적 종료를 기다리는 시간(초), 넘기면 강제 종료
+
+        self.ctx = mp.get_context("spawn")  # Windows(OCX)와 동일한 방식으로 실행
+        self.task_queue = self.ctx.Queue()
+        self.result_queue = self.ctx.Queue()
+
+        self.shards = {}  # shard_id → 종목코드 리스트
+        self.pending_shards = set()
+        self.queued_shards = set()  # 작업 큐에 넣었지만 아직 어떤 워커도 lease하지 않은 shard
+        self.completed_codes = set()
+        self.workers = {}  # worker_id → Process
+        self.stop_events = {}  # worker_id → 협조적 종료 Event
+        self.leases = {}  # worker_id → (shard_id 또는 None, 마지막 진행 시각)
+        self.next_worker_id = 0
+        self.next_shard_id = 0
+
+        self.stats = {"saved": 0, "skipped": 0, "restarts": 0, "requeued": 0, "per_worker": {}}
+
+    def _add_shard(self, stock_codes):
+        shard_id = self.next_shard_id
+        self.next_shard_id += 1
+        self.shards[shard_id] = list(stock_codes)
+        self.pending_shards.add(shard_id)
+        self.queued_shards.add(shard_id)
+        self.task_queue.put((shard_id, self.shards[shard_id]))
+
+    def _requeue_shard(self, shard_id):
+        """shard에서 아직 받지 못한 종목을 워커 수만큼 잘게 나눠 다시 큐에 넣음"""
+        self.pending_shards.discard(shard_id)
+        self.queued_shards.discard(shard_id)
+        remaining = [c for c in self.shards[shard_id] if c not in self.completed_codes]
+        if remaining:
+            # ✅ 남은 종목을 워커 수만큼 잘게 나눠 여러 세션이 나눠 갖도록 함
+            chunk = max(1, -(-len(remaining) // self.num_workers))
+            for i in range(0, len(remaining), chunk):
+                self._add_shard(remaining[i:i + chunk])
+            self.stats["requeued"] += len(remaining)
+
+    def _spawn_worker(self):
+        worker_id = self.next_worker_id
+        self.next_worker_id += 1
+        stop_event = self.ctx.Event()
+        process = self.ctx.Process(
+            target=_worker_main,
+            args=(worker_id, self.mode, self.task_queue, self.result_queue, stop_event,
+                  self.days, self.request_interval),
+            daemon=True,
+        )
+        process.start()
+        self.workers[worker_id] = process
+        self.stop_events[worker_id] = stop_event
+        # ✅ 로그인과 첫 작업 수신까지도 stall_timeout 감시 대상에 포함
+        self.leases[worker_id] = (None, time.monotonic())
+        self.stats["per_worker"][worker_id] = 0
+        print(f"🚀 워커 {worker_id} 시작 (pid={process.pid})")
+
+    def _handle_message(self, message):
+        kind, worker_id, shard_id, payload = message
+        if worker_id not in self.workers:  # 이미 교체된 워커의 늦은 메시지
+            return
+
+        if kind in ("ready", "idle"):
+            self.leases[worker_id] = (None, time.monotonic())
+        elif kind == "lease":
+            self.queued_shards.discard(shard_id)
+            self.leases[worker_id] = (shard_id, time.monotonic())
+        elif kind == "bars":
+            self.leases[worker_id] = (shard_id, time.monotonic())
+            stock_code, rows = payload
+            if stock_code in self.completed_codes:
+                return
+            self.completed_codes.add(stock_code)
+            if rows:
+                self.store.save(stock_code, rows)
+                self.stats["saved"] += 1
+                self.stats["per_worker"][worker_id] += 1
+            else:
+                self.stats["skipped"] += 1
+        elif kind == "done":
+            self.leases[worker_id] = (None, time.monotonic())
+            self.pending_shards.discard(shard_id)
+
+    def _drain_results(self):
+        """결과 큐에 이미 도착한 메시지를 모두 처리"""
+        while True:
+            try:
+                self._handle_message(self.result_queue.get_nowait())
+            except queue.Empty:
+                return
+
+    def _stop_worker(self, worker_id):
+        """협조적 종료를 먼저 요청하고, 응답이 없을 때만 강제 종료. 정상 종료 여부 반환"""
+        process = self.workers[worker_id]
+        self.stop_events[worker_id].set()
+        process.join(timeout=self.stop_grace)
+        if process.is_alive():
+            process.terminate()
+            process.join(timeout=5)
+            return False
+        # 시그널로 죽은 프로세스(exitcode < 0)는 큐 잠금을 쥔 채 죽었을 수 있음
+        return process.exitcode is not None and process.exitcode >= 0
+
+    def _retire_worker(self, worker_id):
+        self.workers.pop(worker_id)
+        self.stop_events.pop(worker_id)
+        return self.leases.pop(worker_id, None)
+
+    def _rebalance(self, worker_id, reason):
+        """멈춘/죽은 워커를 종료하고, 맡았던 shard의 남은 종목을 다시 분배"""
+        clean = self._stop_worker(worker_id)
+        print(f"⚠️ 워커 {worker_id} 교체 ({reason})")
+        if not clean:
+            self._retire_worker(worker_id)
+            self._reset_queues()
+            return
+
+        self._drain_results()  # 종료 전에 보낸 결과까지 반영한 뒤 남은 종목 계산
+        lease = self._retire_worker(worker_id)
+        if lease is not None and lease[0] is not None:
+            self._requeue_shard(lease[0])
+
+        # ✅ 큐에서 꺼낸 직후 lease를 알리기 전에 죽은 경우 등, 아무 워커도 쥐고 있지 않은 shard 회수
+        held = {shard_id for shard_id, _ in self.leases.values()}
+        for shard_id in list(self.pending_shards - self.queued_shards - held):
+            self._requeue_shard(shard_id)
+
+        if self.stats["restarts"] < self.max_restarts:
+            self.stats["restarts"] += 1
+            self._spawn_worker()
+
+    def _reset_queues(self):
+        """강제 종료로 공유 큐가 깨졌을 수 있으므로 큐를 새로 만들고 모든 워커를 다시 띄움"""
+        print("⚠️ 공유 큐를 새로 만들고 모든 워커를 다시 시작합니다.")
+        respawn = len(self.workers) + 1
+        for worker_id in list(self.workers):
+            self._stop_worker(worker_id)
+            self._retire_worker(worker_id)
+
+        for old_queue in (self.task_queue, self.result_queue):
+            old_queue.cancel_join_thread()
+            old_queue.close()
+        self.task_queue = self.ctx.Queue()
+        self.result_queue = self.ctx.Queue()
+
+        self.queued_shards.clear()
+        for shard_id in list(self.pending_shards):
+            self._requeue_shard(shard_id)
+
+        for _ in range(respawn):
+            if self.stats["restarts"] >= self.max_restarts:
+                break
+            self.stats["restarts"] += 1
+            self._spawn_worker()
+
+    def _check_workers(self):
+        now = time.monotonic()
+        for worker_id, process in list(self.workers.items()):
+            if worker_id not in self.workers:  # 큐 재생성으로 이미 교체됨
+                continue
+            if not process.is_alive():
+                self._rebalance(worker_id, f"프로세스 종료, exitcode={process.exitcode}")
+                continue
+            lease = self.leases.get(worker_id)
+            if lease is not None and now - lease[1] > self.stall_timeout:
+                self._rebalance(worker_id, f"{self.stall_timeout:.0f}초 동안 응답 없음")
+
+    def run(self):
+        """전체 종목 다운로드 실행 후 통계 반환"""
+        started = time.monotonic()
+        for i in range(0, len(self.stock_codes), self.shard_size):
+            self._add_shard(self.stock_codes[i:i + self.shard_size])
+        for _ in range(self.num_workers):
+            self._spawn_worker()
+
+        total = len(self.stock_codes)
+        last_report = 0
+        while self.pending_shards:
+            if not self.workers:
+                print("❌ 사용 가능한 워커가 없어 다운로드를 중단합니다.")
+                break
+            try:
+                self._handle_message(self.result_queue.get(timeout=1.0))
+            except queue.Empty:
+                pass
+            self._check_workers()
+
+            done = len(self.completed_codes)
+            if done - last_report >= 50 or (done == total and last_report != total):
+                print(f"{total} 중 {done} 개 만큼 완료. {int(done / max(total, 1) * 100)}%")
+                last_report = done
+
+        for stop_event in self.stop_events.values():
+            stop_event.set()
+        for process in self.workers.values():
+            process.join(timeout=10)
+            if process.is_alive():
+                process.terminate()
+
+        self.stats["elapsed"] = time.monotonic() - started
+        print(f"✅ 다운로드 완료: 저장 {self.stats['saved']}개, 데이터 부족 {self.stats['skipped']}개, "
+              f"워커 교체 {self.stats['restarts']}회, 소요 {self.stats['elapsed']:.1f}초")
+        return self.stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="여러 API 세션으로 전체 종목 일봉 다운로드")
+    parser.add_argument("--workers", type=int, default=2, help="동시에 실행할 API 세션 수")
+    parser.add_argument("--sim", action="store_true", help="키움 OCX 대신 시뮬레이터 사용")
+    parser.add_argument("--shard-size", type=int, default=20)
+    parser.add_argument("--stall-timeout", type=float, default=60.0)
+    args = parser.parse_args()
+
+    stock_list = json.load(open("all_stock_codes.json", "r", encoding="utf-8"))
+    # ✅ 오늘자 종목 마스터가 있으면 조건을 통과할 수 없는 종목은 요청하지 않음
+    master = InstrumentMaster()
+    if master.load() and master.is_fresh():
+        stock_list = master.prefilter(stock_list)
+    else:
+        print("⚠️ 오늘자 종목 마스터(instrument_master.json)가 없어 사전 필터를 건너뜁니다.")
+
+    coordinator = DownloadCoordinator(
+        stock_list, num_workers=args.workers, mode="sim" if args.sim else "real",
+        shard_size=args.shard_size, stall_timeout=args.stall_timeout,
+        request_interval=0.0 if args.sim else 0.3,
+    )
+    coordinator.run()
+
+    from kiwoom_filter_stock import filter_candidates
+    filter_candidates(stock_list)
+    sys.exit(0)
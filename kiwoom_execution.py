@@ -0,0 +1,379 @@
+import time
+import argparse
+import numpy as np
+
+
+SESSION_OPEN = 9 * 60  # 09:00 (분)
+SESSION_CLOSE = 15 * 60 + 30  # 15:30
+# 30분 구간별 하루 거래량 비중 (09:00~15:30, 13구간) — 장 초반/마감에 몰리는 U자형 기본값
+DEFAULT_PROFILE = np.array([0.16, 0.10, 0.08, 0.07, 0.06, 0.055, 0.05, 0.05, 0.055, 0.06, 0.07, 0.08, 0.11])
+
+ACTIVE, PAUSED, DONE, CANCELLED, EXPIRED = "진행", "일시정지", "완료", "취소", "만료"
+
+
+def minute_of_day(t):
+    """epoch 초 → 하루 중 분 (소수 포함, 지역 시각)"""
+    tm = time.localtime(t)
+    return tm.tm_hour * 60 + tm.tm_min + (t % 60) / 60
+
+
+def cumulative_volume_share(minute, profile=DEFAULT_PROFILE):
+    """장 시작부터 minute까지 누적 거래량 비중 (0~1, 구간 안은 선형)"""
+    edges = np.linspace(SESSION_OPEN, SESSION_CLOSE, len(profile) + 1)
+    shares = np.r_[0.0, np.cumsum(profile / profile.sum())]
+    return float(np.interp(minute, edges, shares))
+
+
+class ParentOrder:
+    """나눠서 보낼 원주문 하나 (자식 주문 / 체결 현황)"""
+    def __init__(self, account_number, stock_code, quantity, price, ma20, band, volume_ma5,
+                 style, start, end, participation, child_interval):
+        self.account_number = account_number
+        self.stock_code = stock_code
+        self.quantity = quantity
+        self.decision_price = price
+        self.price = price  # 마지막 체결가
+        self.ma20 = ma20  # 진입 기준 (실시간 20이평)
+        self.band = band  # 20이평 대비 허용 괴리율 (진입 기준과 같음)
+        self.volume_ma5 = volume_ma5
+        self.style = style  # "TWAP" / "VWAP"
+        self.start = start
+        self.end = end
+        self.participation = participation  # 시장 거래량 대비 최대 참여율
+        self.child_interval = child_interval
+        self.status = ACTIVE
+        self.filled = 0
+        self.filled_amount = 0  # 체결 금액 합 (평균 체결가 계산)
+        self.children = []  # [{"key", "order_no", "quantity", "filled", "sent_at"}] 아직 끝나지 않은 자식 주문
+        self.sent_children = 0
+        self.failures = 0
+        self.last_child_at = None
+        self.paused_at = None
+        self.finished_at = None  # 완료/취소/만료된 시각 (남은 자식 주문 정리 대기 시작)
+        self.day_volume = None  # 오늘 누적 거래량 (실시간 틱 합)
+        self.start_day_volume = None
+
+    @property
+    def working(self):
+        """전송 후 아직 체결/취소되지 않은 수량"""
+        return sum(child["quantity"] - child["filled"] for child in self.children)
+
+    @property
+    def average_price(self):
+        return self.filled_amount / self.filled if self.filled else 0.0
+
+    def finished(self):
+        return self.status in (DONE, CANCELLED, EXPIRED)
+
+    def in_band(self):
+        return self.ma20 > 0 and abs(self.price / self.ma20 - 1) <= self.band
+
+    def schedule_share(self, t):
+        """t까지 보냈어야 할 비중 (TWAP: 시간 비례, VWAP: 예상 거래량 비례)"""
+        if t >= self.end:
+            return 1.0
+        if self.style == "TWAP":
+            return max(t - self.start, 0.0) / (self.end - self.start)
+        begin = cumulative_volume_share(minute_of_day(self.start))
+        total = cumulative_volume_share(minute_of_day(self.end)) - begin
+        if total <= 0:
+            return max(t - self.start, 0.0) / (self.end - self.start)
+        return min((cumulative_volume_share(minute_of_day(t)) - begin) / total, 1.0)
+
+    def market_volume(self, t):
+        """참여율 상한 계산용 시장 거래량: 시작 후 실제 체결량 + 다음 자식 주문 동안 예상 거래량"""
+        expected_next = self.volume_ma5 * (
+            cumulative_volume_share(minute_of_day(t + self.child_interval)) - cumulative_volume_share(minute_of_day(t))
+        )
+        if self.day_volume is not None and self.start_day_volume is not None:
+            return self.day_volume - self.start_day_volume + expected_next
+        return self.volume_ma5 * (
+            cumulative_volume_share(minute_of_day(t + self.child_interval)) - cumulative_volume_share(minute_of_day(self.start))
+        )
+
+
+class ExecutionScheduler:
+    """큰 매수 주문을 TWAP/VWAP 자식 주문으로 나눠 시간 창 안에서 실행
+
+    tick()을 주기적으로(1초) 호출한다. child_interval마다
+    - 목표 누적 수량 = 원주문 수량 × 일정 비중(다음 자식 주문 시점 기준)
+    - 상한 = 참여율 × 시장 거래량 (5일 평균 거래량·장중 거래량 비중, 실시간 누적 거래량)
+    에서 이미 체결/전송한 수량을 뺀 만큼 자식 주문을 send_child(parent, 수량, 자식 주문 키)로 보낸다.
+    가격이 진입 기준(20이평 ± band)을 벗어나면 새 자식 주문을 멈추고 미체결 자식 주문을 취소하며,
+    기준 안으로 돌아오면 남은 일정대로 이어서 보낸다 (abandon_after초 넘게 벗어나 있으면 원주문 취소).
+    체결은 on_chejan()으로 받고, 원주문이 끝나면(완료/취소/만료) 남은 자식 주문을 취소한 뒤
+    모든 자식 주문이 전량 체결 또는 취소 확인될 때까지 closing에 두었다가 on_finished(parent)를 부른다
+    (그 사이 체결도 원주문에 반영되어 환불 금액·보유 종목이 맞게 됨).
+    """
+    def __init__(self, send_child, cancel_child, on_finished=None, child_timeout=30.0,
+                 abandon_after=120.0, max_failures=3, clock=time.time):
+        self.send_child = send_child  # (parent, 수량, 자식 주문 키)
+        self.cancel_child = cancel_child  # (parent, 키움 주문번호)
+        self.on_finished = on_finished or (lambda parent: None)
+        self.child_timeout = child_timeout
+        self.abandon_after = abandon_after
+        self.max_failures = max_failures
+        self.clock = clock
+        self.parents = {}  # (계좌번호, 종목코드) → ParentOrder (진행 중인 것만)
+        self.next_key = 1
+        self.closing = {}  # 끝났지만 아직 정리되지 않은 자식 주문이 남은 원주문 (접수되면 바로 취소)
+        # 키움 주문번호 → (원주문, 자식 주문): 취소 확인/전량 체결로 목록에서 뺀 자식 주문 (늦게 온 체결을 찾음)
+        self.released = {}
+
+    def submit(self, account_number, stock_code, quantity, price, ma20, band, volume_ma5,
+               style="VWAP", duration=600.0, participation=0.1, child_interval=30.0):
+        """원주문 등록 (같은 계좌·종목에 진행 중인 원주문이 있으면 None)"""
+        key = (account_number, stock_code)
+        if key in self.parents or key in self.closing:
+            return None
+        now = self.clock()
+        parent = ParentOrder(
+            account_number, stock_code, quantity, price, ma20, band, volume_ma5,
+            style, now, now + duration, participation, child_interval,
+        )
+        self.parents[key] = parent
+        self._send_due(parent, now)
+        return parent
+
+    def active(self, account_number, stock_code):
+        return self.parents.get((account_number, stock_code))
+
+    def on_price(self, stock_code, price, ma20=None, day_volume=None):
+        """실시간 체결가 / 20이평 / 오늘 누적 거래량 반영"""
+        for parent in self.parents.values():
+            if parent.stock_code != stock_code:
+                continue
+            parent.price = price
+            if ma20 is not None:
+                parent.ma20 = ma20
+            if day_volume is not None:
+                if parent.start_day_volume is None:
+                    parent.start_day_volume = day_volume
+                parent.day_volume = day_volume
+
+    def tick(self):
+        now = self.clock()
+        for parent in list(self.parents.values()):
+            self._step(parent, now)
+        for parent in list(self.closing.values()):
+            # 취소 확인이 끝내 오지 않으면 더 기다리지 않고 정리 (보유 종목/잔고는 조회로 맞춰짐)
+            if now - parent.finished_at > self.abandon_after:
+                print(f"⚠️ {parent.stock_code} 자식 주문 {len(parent.children)}개 정리 확인 없이 분할 매수 종료")
+                parent.children = []
+                self._settle(parent)
+
+    def _step(self, parent, now):
+        for child in parent.children:
+            # 오래 체결되지 않은 자식 주문은 취소 후 다시 나눠 보냄
+            if child["order_no"] and not child.get("cancelling") and now - child["sent_at"] > self.child_timeout:
+                self._cancel(parent, child)
+
+        if now >= parent.end + self.child_timeout:
+            self._finish(parent, EXPIRED if parent.filled < parent.quantity else DONE)
+            return
+
+        if not parent.in_band():
+            if parent.status == ACTIVE:
+                parent.status = PAUSED
+                parent.paused_at = now
+                print(f"⏸ {parent.stock_code} 분할 매수 일시정지: 현재가 {parent.price:,} / 20이평 {parent.ma20:,.0f} (기준 ±{parent.band * 100:.1f}%)")
+                for child in parent.children:
+                    if child["order_no"] and not child.get("cancelling"):
+                        self._cancel(parent, child)
+            elif now - parent.paused_at > self.abandon_after or now >= parent.end:
+                self._finish(parent, CANCELLED)
+            return
+
+        if parent.status == PAUSED:
+            parent.status = ACTIVE
+            print(f"▶️ {parent.stock_code} 분할 매수 재개 (남은 수량 {parent.quantity - parent.filled - parent.working}주)")
+        self._send_due(parent, now)
+
+    def _send_due(self, parent, now):
+        if parent.status != ACTIVE or now >= parent.end:
+            return
+        if parent.last_child_at is not None and now - parent.last_child_at < parent.child_interval:
+            return
+        target = parent.quantity * parent.schedule_share(now + parent.child_interval)
+        cap = parent.participation * parent.market_volume(now)
+        quantity = int(min(target, cap, parent.quantity)) - parent.filled - parent.working
+        if quantity < 1:
+            return
+        parent.last_child_at = now
+        parent.sent_children += 1
+        key, self.next_key = self.next_key, self.next_key + 1
+        # 전송 결과 콜백(on_sent)이 바로 올 수 있으므로 먼저 등록
+        parent.children.append({"key": key, "order_no": None, "quantity": quantity, "filled": 0, "sent_at": now})
+        self.send_child(parent, quantity, key)
+
+    def on_sent(self, parent, key, ret):
+        """자식 주문 SendOrder 결과 (실패면 그 수량을 다음 일정에 다시 포함)"""
+        if ret == 0:
+            return
+        parent.children = [child for child in parent.children if child["key"] != key]
+        parent.failures += 1
+        if parent.failures >= self.max_failures:
+            print(f"❌ {parent.stock_code} 자식 주문 {parent.failures}회 실패 → 분할 매수 취소")
+            self._finish(parent, CANCELLED)
+
+    def on_chejan(self, account_number, stock_code, order_no, status, price, cum_quantity, remaining):
+        """매수 Chejan 주문체결 통보 → 해당 원주문 (분할 주문이 아니면 None)
+
+        키움 주문번호는 접수 통보로 처음 알 수 있으므로 접수된 주문번호를 주문번호가 없는 가장 오래된
+        자식 주문에 붙인다. 모르는 주문번호의 체결은 이미 목록에서 뺀 자식 주문에서 찾고, 없으면 무시한다
+        (다른 자식 주문에 붙이면 그 수량이 다시 나가 초과 매수가 됨).
+        """
+        released = self.released.get(order_no)
+        if released is not None:
+            return self._on_released_chejan(*released, status=status, price=price, cum_quantity=cum_quantity)
+        parent = self.parents.get((account_number, stock_code))
+        if parent is None:
+            return self._on_closing_chejan(account_number, stock_code, order_no, status, price, cum_quantity, remaining)
+        child = next((c for c in parent.children if c["order_no"] == order_no), None)
+        if child is None:
+            if status != "접수":
+                return parent
+            child = next((c for c in parent.children if c["order_no"] is None), None)
+            if child is None:
+                return parent
+            child["order_no"] = order_no
+
+        if status == "체결":
+            self._fill(parent, child, price, cum_quantity)
+        if status in ("체결", "확인", "취소", "거부") and remaining <= 0:
+            self._release(parent, child)  # 전량 체결 또는 남은 수량 취소 확인
+
+        if parent.filled >= parent.quantity:
+            self._finish(parent, DONE)
+        return parent
+
+    def _fill(self, parent, child, price, cum_quantity):
+        if cum_quantity > child["filled"]:
+            delta = cum_quantity - child["filled"]
+            child["filled"] = cum_quantity
+            parent.filled += delta
+            parent.filled_amount += delta * price
+
+    def _release(self, parent, child):
+        parent.children.remove(child)
+        self.released[child["order_no"]] = (parent, child)
+
+    def _on_released_chejan(self, parent, child, status, price, cum_quantity):
+        """취소 확인 전에 난 체결이 늦게 도착 → 원주문 체결 수량에만 반영"""
+        if status == "체결":
+            self._fill(parent, child, price, cum_quantity)
+            if not parent.finished() and parent.filled >= parent.quantity:
+                self._finish(parent, DONE)
+        return parent
+
+    def _on_closing_chejan(self, account_number, stock_code, order_no, status, price, cum_quantity, remaining):
+        """끝난 원주문의 남은 자식 주문 통보: 접수되면 바로 취소, 체결은 원주문에 반영"""
+        parent = self.closing.get((account_number, stock_code))
+        if parent is None:
+            return None
+        child = next((c for c in parent.children if c["order_no"] == order_no), None)
+        if child is None:
+            if status == "접수":
+                child = next((c for c in parent.children if c["order_no"] is None), None)
+                if child is not None:
+                    child["order_no"] = order_no
+                    self._cancel(parent, child)
+            return parent
+
+        if status == "체결":
+            self._fill(parent, child, price, cum_quantity)
+        if status in ("체결", "확인", "취소", "거부") and remaining <= 0:
+            self._release(parent, child)
+        if not parent.children:
+            self._settle(parent)
+        return parent
+
+    def on_cancelled(self, account_number, stock_code, order_no, status):
+        """취소 주문 통보 (order_no: 원주문번호) → 취소가 확인되면 그 자식 주문의 남은 수량은 다음 일정에 다시 포함
+
+        취소 접수만으로는 원주문이 아직 체결될 수 있으므로 확인(913 "확인")이 올 때까지 자식 주문을 남겨 둔다.
+        """
+        key = (account_number, stock_code)
+        parent = self.parents.get(key) or self.closing.get(key)
+        if parent is None:
+            return None
+        if status != "확인":
+            return parent
+        child = next((c for c in parent.children if c["order_no"] == order_no), None)
+        if child is not None:
+            self._release(parent, child)
+        if key in self.closing and not parent.children:
+            self._settle(parent)
+        return parent
+
+    def cancel(self, account_number, stock_code):
+        """원주문 수동 취소 (남은 자식 주문 취소)"""
+        parent = self.parents.get((account_number, stock_code))
+        if parent is not None:
+            self._finish(parent, CANCELLED)
+        return parent
+
+    def _cancel(self, parent, child):
+        child["cancelling"] = True
+        self.cancel_child(parent, child["order_no"])
+
+    def _finish(self, parent, status):
+        for child in parent.children:
+            if child["order_no"] and not child.get("cancelling"):
+                self._cancel(parent, child)
+        parent.status = status
+        parent.finished_at = self.clock()
+        key = (parent.account_number, parent.stock_code)
+        self.parents.pop(key, None)
+        print(
+            f"{'✅' if status == DONE else '🛑'} {parent.stock_code} 분할 매수 {status}: {parent.filled}/{parent.quantity}주 "
+            f"(자식 주문 {parent.sent_children}개, 평균 체결가 {parent.average_price:,.0f})"
+        )
+        if parent.children:
+            # 취소가 확인되기 전에 체결될 수 있으므로 모든 자식 주문이 정리될 때까지 기다림
+            self.closing[key] = parent
+        else:
+            self._settle(parent)
+
+    def _settle(self, parent):
+        """모든 자식 주문이 정리된 원주문 → on_finished (환불 / 대기 주문 해제 / 보유 종목 갱신)"""
+        if self.closing.pop((parent.account_number, parent.stock_code), None) is not None:
+            print(f"📦 {parent.stock_code} 분할 매수 정리: 최종 {parent.filled}/{parent.quantity}주")
+        self.on_finished(parent)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="분할 매수 일정 미리보기 (자식 주문 시각/수량)")
+    parser.add_argument("--quantity", type=int, default=3000)
+    parser.add_argument("--price", type=int, default=5000)
+    parser.add_argument("--volume-ma5", type=float, default=500000, help="5일 평균 거래량")
+    parser.add_argument("--style", choices=("TWAP", "VWAP"), default="VWAP")
+    parser.add_argument("--start", default="0930", help="시작 시각 HHMM")
+    parser.add_argument("--duration", type=float, default=600.0, help="실행 창 (초)")
+    parser.add_argument("--participation", type=float, default=0.1)
+    parser.add_argument("--interval", type=float, default=30.0, help="자식 주문 간격 (초)")
+    args = parser.parse_args()
+
+    # 가상 시계로 자식 주문이 모두 바로 체결된다고 보고 일정을 재생
+    tm = time.localtime()
+    now = [time.mktime((tm.tm_year, tm.tm_mon, tm.tm_mday, int(args.start[:2]), int(args.start[2:]), 0, 0, 0, -1))]
+    children = []
+
+    def send(parent, quantity, key):
+        children.append((now[0], quantity))
+
+    scheduler = ExecutionScheduler(send, lambda parent, order_no: None, clock=lambda: now[0])
+    parent = scheduler.submit(
+        "SIM", "000000", args.quantity, args.price, args.price, 0.01, args.volume_ma5,
+        args.style, args.duration, args.participation, args.interval,
+    )
+    while not parent.finished():
+        for child in list(parent.children):
+            scheduler.on_chejan("SIM", "000000", str(child["key"]), "접수", 0, 0, child["quantity"])
+            scheduler.on_chejan("SIM", "000000", str(child["key"]), "체결", args.price, child["quantity"], 0)
+        now[0] += 1
+        scheduler.tick()
+
+    for t, quantity in children:
+        print(f"   {time.strftime('%H:%M:%S', time.localtime(t))}  {quantity:>7,}주")
+    print(f"📦 {args.style} {len(children)}개 자식 주문, {parent.filled:,}/{args.quantity:,}주 ({parent.status})")
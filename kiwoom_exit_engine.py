@@ -0,0 +1,151 @@
+import heapq
+
+
+class _Position:
+    __slots__ = ("quantity", "avg_cost", "high_water", "version")
+
+    def __init__(self, quantity, avg_cost, high_water):
+        self.quantity = quantity
+        self.avg_cost = avg_cost
+        self.high_water = high_water  # 보유 후 최고가 (트레일링 스탑 기준)
+        self.version = 0  # 청산 가격을 다시 잡을 때마다 증가 → 이전 힙 항목 무효
+
+
+class ExitEngine:
+    """손절 / 익절 / 트레일링 스탑 자동 청산 엔진
+
+    종목마다 청산 가격을 두 개의 힙에 넣어 둔다.
+    - 하락 힙(최대 힙): 손절가, 트레일링 스탑가 → 현재가 <= 맨 위 가격이면 발동
+    - 상승 힙(최소 힙): 익절가 → 현재가 >= 맨 위 가격이면 발동
+    틱이 오면 그 종목 힙의 맨 위만 비교하므로 보유 종목 수와 상관없이 O(1)이고,
+    트레일링 스탑가를 올리거나 발동된 항목을 꺼낼 때만 O(log n)이 든다.
+    가격을 다시 잡으면 version을 올려 이전 항목은 꺼낼 때 버린다.
+    """
+    def __init__(self, on_exit, stop_loss=3.0, take_profit=5.0, trailing=3.0):
+        self.on_exit = on_exit  # 청산 발동 콜백 (stock_code, quantity, reason, price)
+        self.stop_loss = stop_loss  # 평균단가 대비 손절 %
+        self.take_profit = take_profit  # 평균단가 대비 익절 %
+        self.trailing = trailing  # 최고가 대비 하락 % (0이면 사용 안 함)
+        self.enabled = False
+        self.positions = {}  # 종목코드 → _Position
+        self.down = {}  # 종목코드 → [(-발동가, version, 사유)]
+        self.up = {}  # 종목코드 → [(발동가, version, 사유)]
+        self.pending = {}  # 매도 주문을 보내고 체결을 기다리는 종목코드 → 사유
+
+    def __len__(self):
+        return len(self.positions)
+
+    def set_levels(self, stop_loss, take_profit, trailing):
+        """청산 기준 변경 후 전 종목 청산 가격 다시 계산"""
+        self.stop_loss, self.take_profit, self.trailing = stop_loss, take_profit, trailing
+        for stock_code in self.positions:
+            self._arm(stock_code)
+
+    def _arm(self, stock_code):
+        """손절/익절/트레일링 가격을 힙에 새로 넣음"""
+        position = self.positions[stock_code]
+        position.version += 1
+        down, up = [], []
+        if self.stop_loss > 0:
+            down.append((-position.avg_cost * (1 - self.stop_loss / 100), position.version, "손절"))
+        if self.trailing > 0 and position.high_water > 0:
+            down.append((-position.high_water * (1 - self.trailing / 100), position.version, "트레일링"))
+        if self.take_profit > 0:
+            up.append((position.avg_cost * (1 + self.take_profit / 100), position.version, "익절"))
+        heapq.heapify(down)
+        heapq.heapify(up)
+        self.down[stock_code] = down
+        self.up[stock_code] = up
+
+    def sync(self, book):
+        """HoldingsBook 보유 종목과 맞춤 (새 종목 추가, 없어진 종목 제거, 수량/단가 갱신)"""
+        codes = set(book.codes)
+        for stock_code in list(self.positions):
+            if stock_code not in codes:
+                self.remove(stock_code)
+
+        for i, stock_code in enumerate(book.codes):
+            quantity, avg_cost = int(book.quantity[i]), float(book.avg_cost[i])
+            if quantity <= 0 or avg_cost <= 0:
+                self.remove(stock_code)
+                continue
+            position = self.positions.get(stock_code)
+            if position is None:
+                self.positions[stock_code] = _Position(quantity, avg_cost, float(book.last_price[i]))
+                self._arm(stock_code)
+            elif position.quantity != quantity or position.avg_cost != avg_cost:
+                position.quantity, position.avg_cost = quantity, avg_cost
+                self._arm(stock_code)
+
+    def high_water_marks(self):
+        """종목코드 → 보유 후 최고가 (스냅샷 저장용)"""
+        return {stock_code: position.high_water for stock_code, position in self.positions.items()}
+
+    def restore_high_water(self, marks):
+        """저장해 둔 최고가가 더 높으면 되살리고 트레일링 가격 다시 계산"""
+        for stock_code, high_water in marks.items():
+            position = self.positions.get(stock_code)
+            if position is not None and high_water > position.high_water:
+                position.high_water = high_water
+                self._arm(stock_code)
+
+    def remove(self, stock_code):
+        self.positions.pop(stock_code, None)
+        self.down.pop(stock_code, None)
+        self.up.pop(stock_code, None)
+
+    def on_tick(self, stock_code, price, volume=0, trade_time=""):
+        """체결 틱마다 호출 → 발동되면 on_exit 호출 후 사유 반환"""
+        position = self.positions.get(stock_code)
+        if position is None or stock_code in self.pending:
+            return None
+
+        if price > position.high_water:
+            position.high_water = price
+            if self.trailing > 0:
+                heapq.heappush(
+                    self.down[stock_code], (-price * (1 - self.trailing / 100), position.version, "트레일링")
+                )
+                self._compact(stock_code)
+
+        reason = self._check(self.down[stock_code], position, lambda trigger: price <= -trigger)
+        if reason is None:
+            reason = self._check(self.up[stock_code], position, lambda trigger: price >= trigger)
+        if reason is None or not self.enabled:
+            return None
+
+        self.pending[stock_code] = reason
+        print(f"🚨 {stock_code} {reason} 발동: 현재가 {price:,} / 평균단가 {position.avg_cost:,.0f} / 최고가 {position.high_water:,.0f}")
+        self.on_exit(stock_code, position.quantity, reason, price)
+        return reason
+
+    def _check(self, heap, position, fired):
+        while heap and heap[0][1] != position.version:
+            heapq.heappop(heap)  # 다시 잡기 전 가격
+        if heap and fired(heap[0][0]):
+            return heap[0][2]
+        return None
+
+    def _compact(self, stock_code):
+        """트레일링 가격을 올릴 때마다 쌓이는 이전 항목 정리 (살아 있는 항목은 많아야 2개)"""
+        heap = self.down[stock_code]
+        if len(heap) > 8:
+            position = self.positions[stock_code]
+            live = [item for item in heap if item[1] == position.version]
+            best_trailing = min((item for item in live if item[2] == "트레일링"), default=None)
+            heap[:] = [item for item in live if item[2] != "트레일링"] + ([best_trailing] if best_trailing else [])
+            heapq.heapify(heap)
+
+    def on_exit_filled(self, stock_code, remaining_quantity):
+        """매도 체결 통보 (미체결 수량이 0이면 청산 완료)"""
+        if stock_code not in self.pending:
+            return False
+        if remaining_quantity > 0:
+            return False
+        print(f"✅ {stock_code} {self.pending.pop(stock_code)} 청산 완료")
+        self.remove(stock_code)
+        return True
+
+    def on_exit_failed(self, stock_code):
+        """매도 주문 실패 → 다음 틱에서 다시 판정"""
+        self.pending.pop(stock_code, None)
@@ -2,28 +2,62 @@ import sys
 import json
 import numpy as np
 import pandas as pd
-from PyQt5.QAxContainer import QAxWidget
-from PyQt5.QtWidgets import QApplication
 from datetime import datetime
 import os
 import time
 
+from kiwoom_master import InstrumentMaster
+from kiwoom_price_store import PriceStore
+from kiwoom_timeframes import MultiTimeframe, trend_confirmed
+from kiwoom_tr_schema import parse_tr
+
+try:
+    from PyQt5.QAxContainer import QAxWidget
+    from PyQt5.QtWidgets import QApplication
+except ImportError:  # OCX가 없는 환경에서는 시뮬레이터 컨트롤만 사용 가능
+    QAxWidget = None
+    QApplication = None
+
 class Kiwoom:
-    def __init__(self):
-        self.app = QApplication(sys.argv)
-        self.kiwoom = QAxWidget("KHOPENAPI.KHOpenAPICtrl.1")
+    STORE_DAYS = 260  # 저장할 최대 일봉 수 (약 1년, 주봉/월봉 이평용 — 첫 페이지 600개 안이라 TR이 늘지 않음)
+
+    def __init__(self, control=None, screen_no="0101", store=None):
+        """control을 넘기면 실제 OCX 대신 해당 컨트롤(시뮬레이터 등)을 사용"""
+        if control is None:
+            self.app = QApplication.instance() or QApplication(sys.argv)
+            self.kiwoom = QAxWidget("KHOPENAPI.KHOpenAPICtrl.1")
+        else:
+            self.app = None
+            self.kiwoom = control
         self.kiwoom.OnEventConnect.connect(self.on_event_connect)
         self.kiwoom.OnReceiveTrData.connect(self.on_receive_tr_data)
+        self.screen_no = screen_no  # 세션마다 다른 화면번호 사용
+        self.store = store or PriceStore()
         self.connected = False
         self.data_received = False
         self.stock_data = []
         self.requesting_stock = None
+        self.requesting_days = 60
+        self.minute_data = []
+        self.minute_since = ""
+        self.minute_has_next = False
+        self.tr_handlers = {
+            "주식일봉차트조회": self.on_daily_chart,
+            "주식분봉차트조회": self.on_minute_chart,
+        }
+
+    def process_events(self):
+        """대기 중인 API 이벤트 처리"""
+        if self.app is not None:
+            self.app.processEvents()
+        else:
+            self.kiwoom.process_events()
 
     def login(self):
         """키움증권 API 로그인"""
         self.kiwoom.dynamicCall("CommConnect()")
         while not self.connected:
-            self.app.processEvents()
+            self.process_events()
         print("✅ 로그인 완료")
 
     def on_event_connect(self, err_code):
@@ -34,108 +68,273 @@ class Kiwoom:
         else:
             print(f"❌ 연결 실패 (에러 코드: {err_code})")
 
-    def get_stock_data(self, stock_code, days=60):
-        """키움 API를 활용해 최근 60일간의 일봉 데이터 조회"""
+    def get_stock_data(self, stock_code, days=60, save=True):
+        """키움 API를 활용해 최근 days일간의 일봉 데이터 조회
+
+        데이터가 days일 이상이면 최근 days일 리스트를, 부족하면 None을 반환한다.
+        save=False이면 저장은 호출한 쪽(다운로드 코디네이터 등)에 맡긴다.
+        """
         today = datetime.today().strftime("%Y%m%d")
 
         self.stock_data = []
         self.requesting_stock = stock_code
+        self.requesting_days = days
         self.data_received = False
 
-        os.makedirs("stock_data", exist_ok=True)
-
         # ✅ 최초 요청
         print(f"📢 {stock_code} 데이터 요청 시작...")
         self.kiwoom.dynamicCall("SetInputValue(QString, QString)", "종목코드", stock_code)
         self.kiwoom.dynamicCall("SetInputValue(QString, QString)", "기준일자", today)
         self.kiwoom.dynamicCall("SetInputValue(QString, QString)", "수정주가구분", "1")
-        self.kiwoom.dynamicCall("CommRqData(QString, QString, int, QString)", "주식일봉차트조회", "OPT10081", 0, "0101")
+        self.kiwoom.dynamicCall("CommRqData(QString, QString, int, QString)", "주식일봉차트조회", "OPT10081", 0, self.screen_no)
 
         while not self.data_received:
-            self.app.processEvents()
+            self.process_events()
         self.data_received = False  # 다음 요청을 위해 초기화
 
+        if len(self.stock_data) < days:
+            return None
+
+        rows = [row.as_dict() for row in self.stock_data[:max(days, self.STORE_DAYS)]]
+
         # ✅ 데이터 저장
-        if len(self.stock_data) >= 60:
-            with open(f"stock_data/{stock_code}.json", "w", encoding="utf-8") as f:
-                json.dump(self.stock_data[:60], f, indent=4, ensure_ascii=False)
-            print(f"✅ {stock_code} 데이터 저장 완료 ({len(self.stock_data[:60])}일)")
+        if save:
+            self.store.save(stock_code, rows)
+            print(f"✅ {stock_code} 데이터 저장 완료 ({len(rows)}일)")
+        return rows
+
+    def get_minute_data(self, stock_code, since_date, tick_range=1, page_interval=0.3):
+        """OPT10080으로 since_date(YYYYMMDD) 이후 분봉을 연속조회
+
+        반환: OPT10080 레코드(timestamp, open, high, low, close, volume) 리스트 (최신순)
+        """
+        self.minute_data = []
+        self.minute_since = since_date
+        self.requesting_stock = stock_code
+
+        prev_next = 0
+        while True:
+            self.data_received = False
+            self.minute_has_next = False
+            self.kiwoom.dynamicCall("SetInputValue(QString, QString)", "종목코드", stock_code)
+            self.kiwoom.dynamicCall("SetInputValue(QString, QString)", "틱범위", str(tick_range))
+            self.kiwoom.dynamicCall("SetInputValue(QString, QString)", "수정주가구분", "1")
+            self.kiwoom.dynamicCall("CommRqData(QString, QString, int, QString)", "주식분봉차트조회", "OPT10080", prev_next, self.screen_no)
+
+            while not self.data_received:
+                self.process_events()
+
+            if not self.minute_has_next:
+                break
+            prev_next = 2
+            time.sleep(page_interval)  # 연속조회도 TR 조회 제한에 포함됨
+
+        self.data_received = False
+        return self.minute_data
 
     def on_receive_tr_data(self, screen_no, rqname, trcode, recordname, prev_next, data_len, err_code, msg1, msg2):
-        """TR 데이터 수신 이벤트"""
-        if rqname == "주식일봉차트조회":
-            count = self.kiwoom.dynamicCall("GetRepeatCnt(QString, QString)", trcode, rqname)
-            print(f"📊 {self.requesting_stock}: {count}개 데이터 수신 중...")
+        """TR 데이터 수신 이벤트 (rqname → 핸들러 테이블 조회, 파싱은 TR 스키마로)"""
+        handler = self.tr_handlers.get(rqname)
+        if handler is None:
+            return
+        handler(parse_tr(self.kiwoom, trcode, rqname, prev_next))
+
+    def on_minute_chart(self, result):
+        """주식분봉차트조회 응답"""
+        print(f"📊 {self.requesting_stock}: 분봉 {len(result.rows)}개 수신 중...")
 
-            for i in range(count):
-                date = self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, i, "일자").strip()
-                close_price = abs(int(self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, i, "현재가").strip()))
-                volume = int(self.kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, i, "거래량").strip())
+        reached_since = False
+        for row in result.rows:
+            if row.timestamp[:8] < self.minute_since:
+                reached_since = True
+                break
+            self.minute_data.append(row)
 
-                self.stock_data.append({"date": date, "close": close_price, "volume": volume})
+        self.minute_has_next = result.prev_next == "2" and not reached_since
+        self.data_received = True
 
-            if len(self.stock_data) >= 60:
-                self.data_received = True
-                return
+    def on_daily_chart(self, result):
+        """주식일봉차트조회 응답"""
+        print(f"📊 {self.requesting_stock}: {len(result.rows)}개 데이터 수신 중...")
+        self.stock_data.extend(result.rows)
 
-            if prev_next == "2":
-                self.kiwoom.dynamicCall("CommRqData(QString, QString, int, QString)", "주식일봉차트조회", "OPT10081", 2, "0101")
-            else:
-                self.data_received = True
+        if len(self.stock_data) >= self.requesting_days:
+            self.data_received = True
+            return
+
+        if result.prev_next == "2":
+            self.kiwoom.dynamicCall("CommRqData(QString, QString, int, QString)", "주식일봉차트조회", "OPT10081", 2, self.screen_no)
+        else:
+            self.data_received = True
 
     def run(self):
         self.app.exec_()
 
 
-def filter_candidates():
-    """매수 후보군 필터링"""
-    filtered_candidates = []
-    
-    stock_list = json.load(open("all_stock_codes.json", "r", encoding="utf-8"))
+DATA_DIR = "stock_data"
+CANDIDATES_PATH = "filtered_candidates.json"
+PHASES = ("load", "indicator", "rule", "write")  # filter_candidates(timings=...) 단계 이름
+
+
+def load_daily(stock_code, data_dir=DATA_DIR):
+    """[load] {data_dir}/{종목코드}.json 일봉 → 날짜순 DataFrame (파일이 없으면 None)"""
+    try:
+        with open(os.path.join(data_dir, f"{stock_code}.json"), "r", encoding="utf-8") as f:
+            stock_data = json.load(f)
+    except FileNotFoundError:
+        return None
+    return pd.DataFrame(stock_data).sort_values("date")
+
+
+def add_indicators(df):
+    """[indicator] 5/20일 이동평균, 5일 평균 거래량"""
+    df["5_MA"] = df["close"].rolling(window=5).mean()
+    df["20_MA"] = df["close"].rolling(window=20).mean()
+    df["Volume_MA5"] = df["volume"].rolling(window=5).mean()
+    return df
+
 
+def batch_rule(stock_code, df):
+    """[rule] 일괄 필터 규칙 (통과하면 후보 dict, 아니면 None)
+
+    - 최근 15일 이내 골든크로스 (이후 데드크로스 여부는 보지 않음)
+    - 20이평이 15일 전보다 높음
+    - 거래량 조건 (2000원 미만 종목도 통과)
+    """
+    # 최근 15일 이내 골든크로스 발생 확인
+    golden_cross = False
+    for i in range(1, min(16, len(df))):
+        if df["5_MA"].iloc[-i - 1] < df["20_MA"].iloc[-i - 1] and df["5_MA"].iloc[-i] > df["20_MA"].iloc[-i]:
+            golden_cross = True
+            break
+
+    if not golden_cross:
+        return None
+
+    # 20일 이동평균선 상승 중인지 확인
+    if df["20_MA"].iloc[-1] <= df["20_MA"].iloc[-15]:
+        return None
+
+    # 종가 기준 필터링
+    last_close = df["close"].iloc[-1]
+    avg_volume_5 = df["Volume_MA5"].iloc[-1]
+
+    if 2000 <= last_close < 10000 and avg_volume_5 < 500000:
+        return None
+    if last_close >= 10000 and avg_volume_5 < 100000:
+        return None
+
+    return {"stock_code": stock_code, "price": df["20_MA"].iloc[-1]}
+
+
+def ui_rule(stock_code, df):
+    """[rule] 자동매매 화면(kiwoom.py) 후보군 규칙 (통과하면 후보 dict, 아니면 None)
+
+    - 최근 15일 내 골든크로스 후 5이평이 계속 20이평 위
+    - 20이평 최근 3일 연속 상승
+    - 2000원 미만 제외 + 거래량 조건
+    """
+    # 최근 15일 내에서 5이평이 20이평보다 계속 작다가 골든크로스 발생 후 항상 위에 있어야 함
+    golden_cross = False
+    cross_index = -1  # 골든크로스 발생 인덱스 저장
+
+    for i in range(15, 0, -1):  # 최근 15일을 역순 탐색
+        if df["5_MA"].iloc[-i] < df["20_MA"].iloc[-i]:
+            continue  # 아직 5이평이 20이평보다 작음
+
+        if df["5_MA"].iloc[-i - 1] < df["20_MA"].iloc[-i - 1] and df["5_MA"].iloc[-i] > df["20_MA"].iloc[-i]:
+            golden_cross = True
+            cross_index = -i  # 골든크로스 발생 인덱스 저장
+            break
+
+    # 골든크로스가 없거나, 이후 5이평이 20이평보다 작아지는 경우 제외
+    if not golden_cross or any(df["5_MA"].iloc[cross_index:] < df["20_MA"].iloc[cross_index:]):
+        return None
+
+    ma20_last_15 = df["20_MA"].iloc[-15:].values  # NumPy 배열로 변환
+    # 최근 3일간 연속 상승하는지 확인
+    is_recent_3days_upward = all(ma20_last_15[i] < ma20_last_15[i + 1] for i in range(len(ma20_last_15) - 3, len(ma20_last_15) - 1))
+
+    if not is_recent_3days_upward:
+        return None
+
+    # 종가 기준 필터링
+    last_close = df["close"].iloc[-1]
+    avg_volume_5 = df["Volume_MA5"].iloc[-1]
+
+    if last_close < 2000:
+        return None
+
+    if 2000 <= last_close < 10000 and avg_volume_5 < 500000:
+        return None
+    if last_close >= 10000 and avg_volume_5 < 100000:
+        return None
+
+    return {"stock_code": stock_code, "price": df["20_MA"].iloc[-1]}
+
+
+RULES = {"batch": batch_rule, "ui": ui_rule}
+
+
+def check_candidate(stock_code, rule=batch_rule, data_dir=DATA_DIR):
+    """일봉으로 매수 후보 조건 판정 (통과하면 후보 dict, 아니면 None)"""
+    df = load_daily(stock_code, data_dir)
+    if df is None:
+        return None
+    return rule(stock_code, add_indicators(df))
+
+
+def save_candidates(candidates, path=CANDIDATES_PATH):
+    """filtered_candidates.json 저장"""
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"stocks": candidates}, f, indent=4, ensure_ascii=False)
+
+
+def filter_candidates(stock_list=None, confirm_trend=False, rule=batch_rule, data_dir=DATA_DIR,
+                      output=CANDIDATES_PATH, timings=None):
+    """매수 후보군 필터링 (stock_list를 넘기지 않으면 all_stock_codes.json 전체)
+
+    rule: 종목별 판정 함수 (batch_rule: 일괄 필터, ui_rule: 자동매매 화면)
+    confirm_trend=True면 일봉 조건을 통과한 종목만 모아 주봉/월봉 추세 확인까지 적용한다.
+    timings에 dict를 넘기면 PHASES 단계별 소요 시간(초)을 더해 준다 (kiwoom_benchmark.py).
+    """
+    if stock_list is None:
+        stock_list = json.load(open("all_stock_codes.json", "r", encoding="utf-8"))
+    if timings is None:
+        timings = {}
+    for phase in PHASES:
+        timings.setdefault(phase, 0.0)
+
+    clock = time.perf_counter
+    filtered_candidates = []
     for stock_code in stock_list:
-        try:
-            with open(f"stock_data/{stock_code}.json", "r", encoding="utf-8") as f:
-                stock_data = json.load(f)
-
-            df = pd.DataFrame(stock_data).sort_values("date")
-            df["5_MA"] = df["close"].rolling(window=5).mean()
-            df["20_MA"] = df["close"].rolling(window=20).mean()
-            df["Volume_MA5"] = df["volume"].rolling(window=5).mean()
-
-            # 최근 15일 이내 골든크로스 발생 확인
-            golden_cross = False
-            for i in range(1, min(16, len(df))):
-                if df["5_MA"].iloc[-i - 1] < df["20_MA"].iloc[-i - 1] and df["5_MA"].iloc[-i] > df["20_MA"].iloc[-i]:
-                    golden_cross = True
-                    break
-            
-            if not golden_cross:
-                continue
-
-            # 20일 이동평균선 상승 중인지 확인
-            if df["20_MA"].iloc[-1] <= df["20_MA"].iloc[-15]:
-                continue
-
-            # 종가 기준 필터링
-            last_close = df["close"].iloc[-1]
-            avg_volume_5 = df["Volume_MA5"].iloc[-1]
-
-            if 2000 <= last_close < 10000 and avg_volume_5 < 500000:
-                continue
-            if last_close >= 10000 and avg_volume_5 < 100000:
-                continue
-
-            filtered_candidates.append({"stock_code": stock_code, "price": df["20_MA"].iloc[-1]})
-
-        except FileNotFoundError:
+        started = clock()
+        df = load_daily(stock_code, data_dir)
+        loaded = clock()
+        timings["load"] += loaded - started
+        if df is None:
             continue
+        df = add_indicators(df)
+        computed = clock()
+        timings["indicator"] += computed - loaded
+        candidate = rule(stock_code, df)
+        timings["rule"] += clock() - computed
+        if candidate is not None:
+            filtered_candidates.append(candidate)
+
+    if confirm_trend and filtered_candidates:
+        frames = MultiTimeframe.from_store([c["stock_code"] for c in filtered_candidates], PriceStore(data_dir))
+        confirmed = {code for code, ok in zip(frames.codes, trend_confirmed(frames)) if ok}
+        print(f"📈 주봉/월봉 추세 확인: {len(filtered_candidates)}개 중 {len(confirmed)}개 통과")
+        filtered_candidates = [c for c in filtered_candidates if c["stock_code"] in confirmed]
 
     # ✅ JSON 파일로 저장
-    with open("filtered_candidates.json", "w", encoding="utf-8") as f:
-        json.dump({"stocks": filtered_candidates}, f, indent=4, ensure_ascii=False)
+    started = clock()
+    save_candidates(filtered_candidates, output)
+    timings["write"] += clock() - started
 
-    print(f"✅ {len(filtered_candidates)}개 종목이 조건을 만족했습니다. (filtered_candidates.json 저장 완료)")
+    print(f"✅ {len(filtered_candidates)}개 종목이 조건을 만족했습니다. ({output} 저장 완료)")
+    return filtered_candidates
 
 
 if __name__ == "__main__":
@@ -143,6 +342,9 @@ if __name__ == "__main__":
     kiwoom.login()
 
     stock_list = json.load(open("all_stock_codes.json", "r", encoding="utf-8"))
+    # ✅ 일봉 요청 전에 가격/상태 조건을 통과할 수 없는 종목 제외
+    master = InstrumentMaster().load_or_refresh(kiwoom.kiwoom)
+    stock_list = master.prefilter(stock_list)
     idx = 1
     for stock_code in stock_list: 
         kiwoom.get_stock_data(stock_code)
@@ -150,4 +352,4 @@ if __name__ == "__main__":
         idx = idx+1
         time.sleep(0.3)
 
-    filter_candidates()
\ No newline at end of file
+    filter_candidates(stock_list)
\ No newline at end of file
@@ -0,0 +1,254 @@
+import time
+import argparse
+import numpy as np
+
+from kiwoom_price_store import PriceStore
+from kiwoom_timeframes import rolling_mean
+
+
+HISTORY_DAYS = 34  # 오늘 포함 최근 16일의 20이평을 만들려면 전일까지 종가 34일 필요
+CROSS_WINDOW = 15  # ui_rule: 최근 15일 안의 골든크로스
+
+# 전일까지 데이터로 정해지는 종목 상태 (오늘 가격으로 바뀌는 건 오늘 5/20이평 관계뿐)
+MODE_FAIL = 0  # 오늘 가격과 무관하게 탈락 (교차 후 이탈, 이미 위에서 교차 없음, 데이터 부족)
+MODE_STAY_ABOVE = 1  # 이전 교차 후 계속 위 → 오늘 5이평 >= 20이평이면 통과
+MODE_CROSS_TODAY = 2  # 전일 5이평 < 20이평 → 오늘 5이평 > 20이평(오늘 교차)이면 통과
+
+
+def last_valid(values, count):
+    """행마다 nan이 아닌 값 중 마지막 count개 (오래된 순, 모자라면 앞쪽이 nan)
+
+    공통 날짜축 패널에서 종목별 DataFrame(자기 거래일만 있음)과 같은 순서를 만든다.
+    """
+    valid = ~np.isnan(values)
+    order = np.argsort(valid, axis=1, kind="stable")[:, -count:]
+    picked = np.take_along_axis(values, order, axis=1)
+    picked[~np.take_along_axis(valid, order, axis=1)] = np.nan
+    return picked
+
+
+class IntradayScreener:
+    """실시간 체결 틱 → 당일 잠정 일봉 / 1분봉, 종목별 5·20이평 O(1) 갱신, 장중 후보군 재판정
+
+    판정은 kiwoom_filter_stock.ui_rule(자동매매 화면 규칙)을 오늘 잠정 종가로 적용한 것과 같다.
+    ui_rule 중 골든크로스 이력 / 20이평 전일 상승 여부는 전일까지 데이터로 이미 정해지므로
+    시작할 때 한 번 전 종목을 벡터로 계산해 두고, 틱마다는 오늘 5/20이평
+    ((직전 4일 종가 합 + 현재가) / 5, (직전 19일 종가 합 + 현재가) / 20)만 다시 구해 비교한다.
+
+    거래량 조건은 기본으로 전일까지 5일 평균 거래량을 쓴다 (장중 누적 거래량은 하루치가 아니라
+    오전에 거래량 조건으로 후보가 빠지는 것을 막기 위해). include_today_volume=True면 ui_rule처럼
+    오늘 누적 거래량을 포함한다 (장 마감 시점에는 일괄 필터 결과와 같아짐).
+    """
+    def __init__(self, codes, closes, volumes, include_today_volume=False):
+        """closes/volumes: 종목 × 날짜(오래된 순, 전일까지) 2차원 배열, 거래 없는 날은 nan"""
+        self.codes = list(codes)
+        self.index = {code: i for i, code in enumerate(self.codes)}
+        self.include_today_volume = include_today_volume
+        n = len(self.codes)
+
+        closes = last_valid(np.asarray(closes, dtype=np.float64).reshape(n, -1), HISTORY_DAYS)
+        volumes = last_valid(np.asarray(volumes, dtype=np.float64).reshape(n, -1), 5)
+        self.prev_close = closes[:, -1]
+        self.sum4 = closes[:, -4:].sum(axis=1)  # 오늘 5이평 = (sum4 + 현재가) / 5
+        self.sum19 = closes[:, -19:].sum(axis=1)  # 오늘 20이평 = (sum19 + 현재가) / 20
+        self.drop_out = closes[:, -20]  # 오늘 20이평에서 빠지는 종가 (현재가가 이보다 높아야 20이평 상승)
+        self.volume_sum4 = volumes[:, -4:].sum(axis=1)
+        self.volume_ma5 = volumes.mean(axis=1)  # 전일까지 5일 평균 거래량
+
+        ma5 = rolling_mean(closes, 5)[:, -CROSS_WINDOW:]  # 전일까지 최근 15일 (오래된 순)
+        ma20 = rolling_mean(closes, 20)[:, -CROSS_WINDOW:]
+        with np.errstate(invalid="ignore"):
+            below = ma5 < ma20
+            crosses = below[:, :-1] & (ma5[:, 1:] > ma20[:, 1:])  # 전일까지 교차 (가장 오래된 것이 기준)
+            has_cross = crosses.any(axis=1)
+            first = np.argmax(crosses, axis=1) + 1
+            after = np.arange(CROSS_WINDOW)[None, :] >= first[:, None]
+            stayed_above = ~(below & after).any(axis=1)
+            self.ma20_rising = ma20[:, -2] < ma20[:, -1]  # 20이평 3일 연속 상승 중 전일까지 부분
+        self.prev_ma20 = ma20[:, -1]
+
+        self.mode = np.full(n, MODE_FAIL, dtype=np.int8)
+        self.mode[has_cross & stayed_above] = MODE_STAY_ABOVE
+        self.mode[~has_cross & below[:, -1]] = MODE_CROSS_TODAY
+        self.mode[np.isnan(closes).any(axis=1) | np.isnan(volumes).any(axis=1)] = MODE_FAIL
+
+        # 당일 잠정 일봉 (첫 틱 전에는 nan)
+        self.open = np.full(n, np.nan)
+        self.high = np.full(n, np.nan)
+        self.low = np.full(n, np.nan)
+        self.close = np.full(n, np.nan)
+        self.volume = np.zeros(n)
+        self.minutes = {}  # 종목코드 → [[HHMM, 시가, 고가, 저가, 종가, 거래량], ...]
+
+        self.passing = np.zeros(n, dtype=bool)  # 마지막으로 알린 후보 여부
+        self.dirty = set()  # 마지막 changes() 이후 틱이 온 종목 인덱스
+
+    @classmethod
+    def from_store(cls, stock_codes=None, store=None, before=None, include_today_volume=False):
+        """저장된 일봉으로 생성 (before(YYYYMMDD)가 있으면 그 날짜 이전 데이터만 사용)"""
+        store = store or PriceStore()
+        codes, dates, panel = store.load_panel(stock_codes or store.codes(), ("close", "volume"))
+        end = len(dates) if before is None else int(np.searchsorted(dates, int(before)))
+        return cls(codes, panel["close"][:, :end], panel["volume"][:, :end], include_today_volume)
+
+    def set_candidates(self, stock_codes):
+        """현재 화면 후보군 (장중 추가/제외는 이 목록 기준으로 알림)"""
+        self.passing[:] = False
+        for stock_code in stock_codes:
+            i = self.index.get(stock_code)
+            if i is not None:
+                self.passing[i] = True
+
+    def on_tick(self, stock_code, price, volume, trade_time):
+        """체결 틱 반영 (RealtimeDataManager 틱 리스너)"""
+        i = self.index.get(stock_code)
+        if i is None:
+            return
+        if np.isnan(self.open[i]):
+            self.open[i] = self.high[i] = self.low[i] = price
+        elif price > self.high[i]:
+            self.high[i] = price
+        elif price < self.low[i]:
+            self.low[i] = price
+        self.close[i] = price
+        self.volume[i] += volume
+        self.dirty.add(i)
+
+        minute = int(trade_time[:4]) if trade_time else 0
+        bars = self.minutes.setdefault(stock_code, [])
+        if bars and bars[-1][0] == minute:
+            bar = bars[-1]
+            bar[2] = max(bar[2], price)
+            bar[3] = min(bar[3], price)
+            bar[4] = price
+            bar[5] += volume
+        else:
+            bars.append([minute, price, price, price, price, volume])
+
+    def live_ma(self, stock_code):
+        """(오늘 5이평, 오늘 20이평) — 틱이 없으면 전일 종가 기준"""
+        i = self.index[stock_code]
+        price = self.close[i] if not np.isnan(self.close[i]) else self.prev_close[i]
+        return (self.sum4[i] + price) / 5, (self.sum19[i] + price) / 20
+
+    def evaluate(self, i, price):
+        """오늘 가격 price일 때 ui_rule 통과 여부와 오늘 20이평"""
+        ma5 = (self.sum4[i] + price) / 5
+        ma20 = (self.sum19[i] + price) / 20
+        mode = self.mode[i]
+        if mode == MODE_STAY_ABOVE:
+            crossed = not ma5 < ma20
+        elif mode == MODE_CROSS_TODAY:
+            crossed = ma5 > ma20
+        else:
+            crossed = False
+        if not crossed or not (self.ma20_rising[i] and self.prev_ma20[i] < ma20):
+            return False, ma20
+
+        if self.include_today_volume:
+            volume_ma5 = (self.volume_sum4[i] + self.volume[i]) / 5
+        else:
+            volume_ma5 = self.volume_ma5[i]
+        if price < 2000:
+            return False, ma20
+        if 2000 <= price < 10000 and volume_ma5 < 500000:
+            return False, ma20
+        if price >= 10000 and volume_ma5 < 100000:
+            return False, ma20
+        return True, ma20
+
+    def changes(self):
+        """마지막 호출 이후 틱이 온 종목 재판정
+
+        반환: (추가 [(종목코드, 20이평, 현재가)], 제외 [종목코드], 후보 유지 [(종목코드, 20이평, 현재가)])
+        """
+        added, dropped, updated = [], [], []
+        dirty, self.dirty = self.dirty, set()
+        for i in dirty:
+            price = self.close[i]
+            ok, ma20 = self.evaluate(i, price)
+            stock_code = self.codes[i]
+            if ok and not self.passing[i]:
+                added.append((stock_code, ma20, int(price)))
+            elif not ok and self.passing[i]:
+                dropped.append(stock_code)
+            elif ok:
+                updated.append((stock_code, ma20, int(price)))
+            self.passing[i] = ok
+        return added, dropped, updated
+
+    def entry_floor(self):
+        """종목별로 오늘 통과하려면 넘어야 하는 가격 (통과 불가 종목은 inf)
+
+        오늘 5이평 >= 20이평 ⇔ 가격 >= (sum19 - 4·sum4) / 3, 20이평 상승 ⇔ 가격 > drop_out, 2000원 이상.
+        """
+        floor = np.maximum(np.maximum((self.sum19 - 4 * self.sum4) / 3, self.drop_out), 2000)
+        return np.where((self.mode != MODE_FAIL) & self.ma20_rising, floor, np.inf)
+
+    def watch_list(self, band=0.05, limit=200):
+        """실시간 등록할 종목 (현재 후보 + 전일 종가 대비 band 안의 가격으로 새로 통과할 수 있는 종목)
+
+        새 종목은 통과 가격이 전일 종가에 가까운 순으로 limit개까지.
+        """
+        with np.errstate(invalid="ignore", divide="ignore"):
+            distance = np.abs(self.entry_floor() / self.prev_close - 1)
+        near = np.flatnonzero((distance <= band) & ~self.passing)
+        near = near[np.argsort(distance[near], kind="stable")][:max(limit - int(self.passing.sum()), 0)]
+        return [self.codes[i] for i in np.flatnonzero(self.passing)] + [self.codes[i] for i in near]
+
+    def day_bar(self, stock_code):
+        """당일 잠정 일봉 dict (stock_data/*.json 행과 같은 키, 틱이 없었으면 None)"""
+        i = self.index[stock_code]
+        if np.isnan(self.close[i]):
+            return None
+        return {
+            "date": time.strftime("%Y%m%d"), "open": int(self.open[i]), "high": int(self.high[i]),
+            "low": int(self.low[i]), "close": int(self.close[i]), "volume": int(self.volume[i]),
+        }
+
+    def minute_bars(self, stock_code):
+        """당일 1분봉 (MinuteBarStore.write_days()에 넘길 수 있는 컬럼 dict, 체결시간은 HHMM00)"""
+        bars = np.array(self.minutes.get(stock_code, []), dtype=np.int64).reshape(-1, 6)
+        columns = {name: bars[:, k] for k, name in enumerate(("time", "open", "high", "low", "close", "volume"))}
+        columns["time"] = columns["time"] * 100
+        return columns
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="장중 재판정 리플레이 (마지막 일봉을 틱으로 재생해 ui_rule 결과와 비교)")
+    parser.add_argument("--data-dir", default="stock_data")
+    parser.add_argument("--ticks", type=int, default=200, help="종목당 재생할 틱 수")
+    args = parser.parse_args()
+
+    from kiwoom_filter_stock import filter_candidates, ui_rule
+
+    store = PriceStore(args.data_dir)
+    codes, dates, panel = store.load_panel(store.codes(), ("close", "volume"))
+    today = int(dates[-1])
+    screener = IntradayScreener.from_store(codes, store, before=today, include_today_volume=True)
+
+    # 마지막 날 종가로 끝나는 틱 경로 (시가 → 종가 사이 랜덤워크, 거래량 합 = 그날 거래량)
+    rng = np.random.default_rng(0)
+    ticks = []
+    for i, stock_code in enumerate(codes):
+        close, volume = panel["close"][i, -1], panel["volume"][i, -1]
+        if np.isnan(close):
+            continue
+        path = np.r_[screener.prev_close[i] * (1 + rng.normal(0, 0.01, args.ticks - 1).cumsum() / 10), close]
+        path = np.maximum(np.round(path), 1).astype(int)
+        sizes = np.diff(np.r_[0, np.sort(rng.integers(0, int(volume) + 1, args.ticks - 1)), int(volume)])
+        ticks.extend((t, stock_code, int(p), int(v)) for t, (p, v) in enumerate(zip(path, sizes)))
+    ticks.sort(key=lambda tick: tick[0])
+
+    started = time.perf_counter()
+    for t, stock_code, price, volume in ticks:
+        screener.on_tick(stock_code, price, volume, f"{9 + t * 390 // args.ticks // 60:02d}{t * 390 // args.ticks % 60:02d}00")
+    tick_seconds = time.perf_counter() - started
+    added, dropped, updated = screener.changes()
+    intraday = {code for code, _, _ in added + updated}
+
+    daily = {c["stock_code"] for c in filter_candidates(codes, rule=ui_rule, data_dir=args.data_dir, output=f"{args.data_dir}/.intraday_check.json")}
+    print(f"⏱ 틱 {len(ticks):,}개 처리 {tick_seconds * 1000:.0f}ms ({tick_seconds / max(len(ticks), 1) * 1e6:.2f}µs/틱)")
+    print(f"📡 감시 종목 {len(screener.watch_list())}개 / 전체 {len(codes)}개")
+    print(f"{'✅' if intraday == daily else '❌'} 장 마감 시점 장중 판정 {len(intraday)}개 vs ui_rule 일괄 필터 {len(daily)}개"
+          f" (불일치 {len(intraday ^ daily)}개)")
@@ -0,0 +1,149 @@
+import os
+import json
+import tempfile
+from datetime import datetime
+
+
+MARKETS = {"0": "KOSPI", "10": "KOSDAQ"}
+PRICE_LIMIT = 0.30  # 일일 가격제한폭 (±30%)
+
+
+def _parse_flags(construction, state):
+    """감리구분/종목상태 문자열을 플래그 목록으로 변환"""
+    flags = []
+    text = f"{construction}|{state}"
+    if "거래정지" in text:
+        flags.append("suspended")
+    if "관리종목" in text:
+        flags.append("managed")
+    if "정리매매" in text:
+        flags.append("delisting")
+    if "투자경고" in text or "투자위험" in text:
+        flags.append("warning")
+    return flags
+
+
+class InstrumentMaster:
+    """종목 마스터 테이블 (코드, 종목명, 시장, 전일가, 상장주식수, 상태 플래그)
+
+    GetMaster* 함수는 TR 조회 제한에 걸리지 않으므로 하루 한 번 전체를 갱신해
+    instrument_master.json에 컬럼 단위로 저장해 두고, 일봉(OPT10081) 요청 전에
+    조건을 통과할 수 없는 종목을 미리 걸러내는 데 사용한다.
+    """
+    def __init__(self, path="instrument_master.json"):
+        self.path = path
+        self.date = None
+        self.codes = []
+        self.names = []
+        self.markets = []
+        self.last_prices = []
+        self.listed_shares = []
+        self.flags = []
+        self.index = {}  # 종목코드 → 행 번호
+
+    def _rebuild_index(self):
+        self.index = {code: i for i, code in enumerate(self.codes)}
+
+    def is_fresh(self, today=None):
+        """오늘 갱신된 테이블인지 확인"""
+        today = today or datetime.today().strftime("%Y%m%d")
+        return self.date == today
+
+    def refresh(self, kiwoom):
+        """키움 API 컨트롤에서 마스터 정보를 새로 읽어 저장"""
+        codes, names, markets, last_prices, listed_shares, flags = [], [], [], [], [], []
+
+        for market_code, market_name in MARKETS.items():
+            code_list = kiwoom.dynamicCall("GetCodeListByMarket(QString)", market_code)
+            for code in code_list.split(";"):
+                code = code.strip()
+                if not code:
+                    continue
+                last_price = kiwoom.dynamicCall("GetMasterLastPrice(QString)", code).strip()
+                construction = kiwoom.dynamicCall("GetMasterConstruction(QString)", code).strip()
+                state = kiwoom.dynamicCall("GetMasterStockState(QString)", code).strip()
+
+                codes.append(code)
+                names.append(kiwoom.dynamicCall("GetMasterCodeName(QString)", code).strip())
+                markets.append(market_name)
+                last_prices.append(abs(int(last_price.replace(",", ""))) if last_price else 0)
+                listed_shares.append(int(kiwoom.dynamicCall("GetMasterListedStockCnt(QString)", code) or 0))
+                flags.append(_parse_flags(construction, state))
+
+        self.date = datetime.today().strftime("%Y%m%d")
+        self.codes, self.names, self.markets = codes, names, markets
+        self.last_prices, self.listed_shares, self.flags = last_prices, listed_shares, flags
+        self._rebuild_index()
+        self.save()
+        print(f"✅ 종목 마스터 갱신 완료 ({len(self.codes)}개 종목, {self.path})")
+
+    def save(self):
+        """컬럼 단위 JSON으로 원자적 저장"""
+        data = {
+            "date": self.date, "codes": self.codes, "names": self.names, "markets": self.markets,
+            "last_prices": self.last_prices, "listed_shares": self.listed_shares, "flags": self.flags,
+        }
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=directory)
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(tmp_path, self.path)
+
+    def load(self):
+        """저장된 테이블 로드 (없으면 False)"""
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return False
+
+        self.date = data["date"]
+        self.codes, self.names, self.markets = data["codes"], data["names"], data["markets"]
+        self.last_prices, self.listed_shares, self.flags = data["last_prices"], data["listed_shares"], data["flags"]
+        self._rebuild_index()
+        return True
+
+    def load_or_refresh(self, kiwoom):
+        """오늘자 캐시가 있으면 사용하고, 없으면 API에서 갱신"""
+        if not self.load() or not self.is_fresh():
+            self.refresh(kiwoom)
+        return self
+
+    def get(self, stock_code):
+        """종목 한 개의 마스터 정보 (없으면 None)"""
+        i = self.index.get(stock_code)
+        if i is None:
+            return None
+        return {
+            "stock_code": stock_code, "name": self.names[i], "market": self.markets[i],
+            "last_price": self.last_prices[i], "listed_shares": self.listed_shares[i], "flags": self.flags[i],
+        }
+
+    def prefilter(self, stock_codes, min_price=2000, exclude_flags=("suspended", "managed", "delisting")):
+        """일봉 요청 전에 가격 조건을 통과할 수 없는 종목과 거래 부적격 종목 제거
+
+        전일가는 하루 동안 가격제한폭(±30%) 이상 움직일 수 없으므로,
+        전일가 * 1.3 이 최소 가격에 못 미치면 오늘 종가로도 조건을 통과할 수 없다.
+        마스터에 없는 종목(신규 상장 등)은 판단할 수 없으므로 그대로 둔다.
+        """
+        price_floor = min_price / (1 + PRICE_LIMIT)
+        exclude_flags = set(exclude_flags)
+        kept = []
+        dropped = {"price": 0, "flags": 0}
+
+        for stock_code in stock_codes:
+            i = self.index.get(stock_code)
+            if i is None:
+                kept.append(stock_code)
+                continue
+            if self.last_prices[i] and self.last_prices[i] < price_floor:
+                dropped["price"] += 1
+                continue
+            if exclude_flags.intersection(self.flags[i]):
+                dropped["flags"] += 1
+                continue
+            kept.append(stock_code)
+
+        print(f"🧹 사전 필터: {len(stock_codes)}개 중 {len(kept)}개 유지 "
+              f"(가격 미달 {dropped['price']}개, 거래정지/관리 {dropped['flags']}개 제외)")
+        return kept
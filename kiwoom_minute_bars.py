@@ -0,0 +1,276 @@
+import os
+import json
+import time
+import struct
+import tempfile
+import numpy as np
+from datetime import datetime, timedelta
+
+
+MAGIC = b"KMB1"
+HEADER = struct.Struct("<4sH")  # magic, 일수
+INDEX_ENTRY = struct.Struct("<IIIH")  # 일자(YYYYMMDD), 블록 오프셋, 블록 길이, 봉 개수
+COLUMNS = ("time", "open", "high", "low", "close", "volume")
+
+
+# ----------------------------------------------------------------------
+# zigzag + varint 인코딩 (numpy 벡터화)
+# ----------------------------------------------------------------------
+def zigzag_encode(values):
+    values = np.asarray(values, dtype=np.int64)
+    return ((values << 1) ^ (values >> 63)).astype(np.uint64)
+
+
+def zigzag_decode(values):
+    values = np.asarray(values, dtype=np.uint64)
+    return (values >> np.uint64(1)).astype(np.int64) ^ -(values & np.uint64(1)).astype(np.int64)
+
+
+def varint_encode(values):
+    """부호 없는 정수 배열을 LEB128 varint 바이트열로 인코딩"""
+    values = np.asarray(values, dtype=np.uint64)
+    if values.size == 0:
+        return b""
+
+    nbytes = np.ones(values.size, dtype=np.int64)
+    for k in range(1, 10):
+        nbytes += values >= np.uint64(1 << (7 * k))
+    starts = np.cumsum(nbytes) - nbytes
+    out = np.empty(int(nbytes.sum()), dtype=np.uint8)
+
+    for k in range(int(nbytes.max())):
+        mask = nbytes > k
+        chunk = (values[mask] >> np.uint64(7 * k)) & np.uint64(0x7F)
+        more = (nbytes[mask] > k + 1).astype(np.uint64) << np.uint64(7)
+        out[starts[mask] + k] = (chunk | more).astype(np.uint8)
+    return out.tobytes()
+
+
+def varint_decode(data):
+    """varint 바이트열을 부호 없는 정수 배열로 디코딩"""
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if raw.size == 0:
+        return np.empty(0, dtype=np.uint64)
+
+    ends = np.flatnonzero(raw < 0x80)
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    lengths = ends - starts + 1
+
+    values = (raw[starts] & 0x7F).astype(np.uint64)
+    for k in range(1, int(lengths.max())):  # 대부분 1~3바이트라 반복 횟수가 적음
+        mask = lengths > k
+        values[mask] |= (raw[starts[mask] + k] & 0x7F).astype(np.uint64) << np.uint64(7 * k)
+    return values
+
+
+# ----------------------------------------------------------------------
+# 하루치 블록 인코딩
+# ----------------------------------------------------------------------
+def encode_day(bars):
+    """하루치 분봉(시간 오름차순)을 블록 바이트열로 인코딩
+
+    컬럼 순서대로 값을 이어 붙인 하나의 varint 스트림이다.
+    - 체결시간: 분 단위(시*60+분)로 바꾼 뒤 차분 → 대부분 1바이트
+    - 시가/고가/저가: 같은 봉 종가 대비 차이
+    - 종가: 직전 봉 대비 차분
+    - 거래량: 원값
+    부호가 있는 값은 zigzag로 바꿔 작은 절댓값이 작은 바이트 수가 되게 한다.
+    """
+    time = np.asarray(bars["time"], dtype=np.int64)
+    minutes = (time // 10000) * 60 + (time // 100) % 100
+    close = np.asarray(bars["close"], dtype=np.int64)
+
+    signed = np.concatenate([
+        np.diff(minutes, prepend=0),
+        np.asarray(bars["open"], dtype=np.int64) - close,
+        np.asarray(bars["high"], dtype=np.int64) - close,
+        np.asarray(bars["low"], dtype=np.int64) - close,
+        np.diff(close, prepend=0),
+    ])
+    values = np.concatenate([zigzag_encode(signed), np.asarray(bars["volume"], dtype=np.uint64)])
+    return varint_encode(values)
+
+
+def decode_day(block, count):
+    """블록 바이트열을 컬럼별 int64 배열 dict로 디코딩 (한 번의 varint 디코딩)"""
+    values = varint_decode(block).reshape(len(COLUMNS), count)
+    signed = zigzag_decode(values[:5])
+    minutes = np.cumsum(signed[0])
+    close = np.cumsum(signed[4])
+    return {
+        "time": (minutes // 60) * 10000 + (minutes % 60) * 100,
+        "open": signed[1] + close,
+        "high": signed[2] + close,
+        "low": signed[3] + close,
+        "close": close,
+        "volume": values[5].astype(np.int64),
+    }
+
+
+class MinuteBarStore:
+    """분봉 저장소 (minute_data/{종목코드}/{YYYYMM}.bin)
+
+    월 파일 하나에 일자별 블록과 인덱스를 함께 저장하므로, 종목·일자로
+    파일 하나를 열고 해당 블록만 읽어 디코딩하면 된다.
+    """
+    def __init__(self, data_dir="minute_data"):
+        self.data_dir = data_dir
+        self._index_cache = {}  # 파일 경로 → (수정 시각, 인덱스)
+
+    def path(self, stock_code, month):
+        return os.path.join(self.data_dir, stock_code, f"{month}.bin")
+
+    def _read_index(self, f):
+        magic, n_days = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError("분봉 파일 형식이 올바르지 않습니다.")
+        raw = f.read(INDEX_ENTRY.size * n_days)
+        return {entry[0]: entry[1:] for entry in INDEX_ENTRY.iter_unpack(raw)}
+
+    def _read_blocks(self, stock_code, month):
+        """월 파일의 일자별 블록과 봉 개수 (없으면 빈 dict)"""
+        try:
+            with open(self.path(stock_code, month), "rb") as f:
+                index = self._read_index(f)
+                blocks, counts = {}, {}
+                for date, (offset, length, count) in index.items():
+                    f.seek(offset)
+                    blocks[date] = f.read(length)
+                    counts[date] = count
+                return blocks, counts
+        except FileNotFoundError:
+            return {}, {}
+
+    def write_days(self, stock_code, days):
+        """{일자(YYYYMMDD 문자열): 분봉 dict} 를 월 파일에 병합 저장"""
+        by_month = {}
+        for date, bars in days.items():
+            by_month.setdefault(date[:6], {})[int(date)] = bars
+
+        for month, new_days in by_month.items():
+            blocks, counts = self._read_blocks(stock_code, month)
+            for date, bars in new_days.items():
+                blocks[date] = encode_day(bars)
+                counts[date] = len(bars["time"])
+            self._write_month(stock_code, month, blocks, counts)
+
+    def _write_month(self, stock_code, month, blocks, counts):
+        dates = sorted(blocks)
+        offset = HEADER.size + INDEX_ENTRY.size * len(dates)
+        index = []
+        for date in dates:
+            index.append(INDEX_ENTRY.pack(date, offset, len(blocks[date]), counts[date]))
+            offset += len(blocks[date])
+
+        path = self.path(stock_code, month)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(path))
+        with os.fdopen(fd, "wb") as f:
+            f.write(HEADER.pack(MAGIC, len(dates)))
+            f.write(b"".join(index))
+            for date in dates:
+                f.write(blocks[date])
+        os.replace(tmp_path, path)
+
+    def _cached_index(self, path):
+        """파일이 바뀌지 않았으면 메모리에 있는 인덱스를 재사용"""
+        mtime = os.stat(path).st_mtime_ns
+        cached = self._index_cache.get(path)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        with open(path, "rb") as f:
+            index = self._read_index(f)
+        self._index_cache[path] = (mtime, index)
+        return index
+
+    def read_day(self, stock_code, date):
+        """한 종목 하루치 분봉 (없으면 None)"""
+        path = self.path(stock_code, date[:6])
+        try:
+            entry = self._cached_index(path).get(int(date))
+            if entry is None:
+                return None
+            offset, length, count = entry
+            with open(path, "rb") as f:
+                f.seek(offset)
+                return decode_day(f.read(length), count)
+        except FileNotFoundError:
+            return None
+
+    def read_range(self, stock_code, start_date, end_date):
+        """start_date ~ end_date(포함) 분봉을 이어 붙여 반환 ("date" 컬럼 포함)"""
+        stock_dir = os.path.join(self.data_dir, stock_code)
+        if not os.path.isdir(stock_dir):
+            return None
+
+        months = sorted(
+            name[:6] for name in os.listdir(stock_dir)
+            if name.endswith(".bin") and start_date[:6] <= name[:6] <= end_date[:6]
+        )
+        frames = []
+        for month in months:
+            path = self.path(stock_code, month)
+            index = self._cached_index(path)
+            with open(path, "rb") as f:
+                for date in sorted(index):
+                    if not int(start_date) <= date <= int(end_date):
+                        continue
+                    offset, length, count = index[date]
+                    f.seek(offset)
+                    bars = decode_day(f.read(length), count)
+                    bars["date"] = np.full(count, date, dtype=np.int64)
+                    frames.append(bars)
+
+        if not frames:
+            return None
+        return {col: np.concatenate([bars[col] for bars in frames]) for col in ("date",) + COLUMNS}
+
+
+class MinuteBarCollector:
+    """OPT10080(주식분봉차트조회)으로 분봉을 받아 MinuteBarStore에 저장"""
+    def __init__(self, kiwoom, store=None):
+        self.kiwoom = kiwoom  # kiwoom_filter_stock.Kiwoom 세션
+        self.store = store or MinuteBarStore()
+
+    def collect(self, stock_code, since_date, tick_range=1):
+        """since_date(YYYYMMDD) 이후 분봉을 받아 일자별로 저장하고 저장한 일수를 반환"""
+        rows = self.kiwoom.get_minute_data(stock_code, since_date=since_date, tick_range=tick_range)
+        if not rows:
+            return 0
+
+        rows = sorted((r for r in rows if r.timestamp[:8] >= since_date), key=lambda r: r.timestamp)
+        days = {}
+        for row in rows:
+            bars = days.setdefault(row.timestamp[:8], {col: [] for col in COLUMNS})
+            bars["time"].append(int(row.timestamp[8:]))
+            bars["open"].append(row.open)
+            bars["high"].append(row.high)
+            bars["low"].append(row.low)
+            bars["close"].append(row.close)
+            bars["volume"].append(row.volume)
+
+        self.store.write_days(stock_code, days)
+        print(f"✅ {stock_code} 분봉 저장 완료 ({len(days)}일, {len(rows)}개)")
+        return len(days)
+
+    def collect_all(self, stock_codes, since_date, request_interval=0.3):
+        """여러 종목 분봉 수집"""
+        for idx, stock_code in enumerate(stock_codes, start=1):
+            self.collect(stock_code, since_date)
+            print(f"{len(stock_codes)} 중 {idx} 개 만큼 완료. {int(idx / len(stock_codes) * 100)}%")
+            time.sleep(request_interval)
+
+
+if __name__ == "__main__":
+    from kiwoom_filter_stock import Kiwoom
+
+    kiwoom = Kiwoom()
+    kiwoom.login()
+
+    # ✅ 기본값: 후보군 종목의 최근 한 달 분봉
+    with open("filtered_candidates.json", "r", encoding="utf-8") as f:
+        stock_list = [s["stock_code"] for s in json.load(f).get("stocks", [])]
+    since = (datetime.today() - timedelta(days=31)).strftime("%Y%m%d")
+    MinuteBarCollector(kiwoom).collect_all(stock_list, since)
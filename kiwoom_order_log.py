@@ -0,0 +1,318 @@
+import os
+import time
+import argparse
+import numpy as np
+
+
+ORDER_LOG_PATH = "order_lifecycle.bin"
+RECORD_DTYPE = np.dtype([
+    ("order_id", "<u4"),  # 프로그램 안에서 매긴 주문 번호 (같은 주문의 레코드를 묶음)
+    ("kind", "u1"),  # 레코드 종류 (KIND_*)
+    ("side", "u1"),  # 1: 매수, 2: 매도 (SendOrder 주문유형)
+    ("pad", "<u2"),
+    ("code", "S8"),  # 종목코드
+    ("t", "<f8"),  # 기록 시각 (time.time)
+    ("price", "<i4"),  # 판단가 / 체결가
+    ("quantity", "<i4"),  # 주문수량 / 누적 체결수량
+    ("remaining", "<i4"),  # 미체결 수량
+    ("ret", "<i4"),  # SendOrder 반환값
+    ("quote_t", "<f8"),  # 판단가를 받은 시각 (판단 레코드만, 모르면 0)
+])
+
+KIND_DECISION = 0  # 주문하기로 결정 (판단가 = 그때 알고 있던 현재가)
+KIND_SENT = 1  # SendOrder 호출 (주문 제한 대기 후)
+KIND_ACCEPTED = 2  # Chejan 접수
+KIND_FILL = 3  # Chejan 체결 (부분 체결마다)
+KIND_DONE = 4  # 미체결 0 → 완료
+KIND_REJECTED = 5  # SendOrder 실패 / 취소
+
+SIDE_BUY = 1
+SIDE_SELL = 2
+
+PRICE_TIERS = (1000, 5000, 10000, 50000, 100000, 500000)  # 호가단위가 바뀌는 가격대 경계
+LATENCY_PERCENTILES = (50, 90, 99)
+
+
+class OrderLog:
+    """주문 생애주기 기록 (결정 → SendOrder → 접수 → 부분 체결 → 완료)
+
+    레코드는 RECORD_DTYPE 고정 길이 바이너리로 파일 끝에 이어 쓰므로
+    load()에서 np.fromfile 한 번으로 전부 읽어 배열 연산으로 집계할 수 있다.
+    Chejan에는 이 프로그램의 주문 번호가 없으므로 (계좌, 종목, 매수/매도)별로
+    열려 있는 주문 중 아직 접수되지 않은 가장 먼저 낸 주문에 접수 통보의 키움 주문번호를 붙이고,
+    이후 통보는 그 주문번호로 찾는다.
+    """
+    def __init__(self, path=ORDER_LOG_PATH, clock=time.time):
+        self.path = path
+        self.clock = clock
+        self._drop_partial_record()
+        self.file = open(path, "ab")
+        self.next_id = self._last_id() + 1
+        self.open_orders = {}  # (계좌번호, 종목코드, 매수/매도) → [주문 번호]
+        self.filled = {}  # 주문 번호 → 지금까지 기록한 누적 체결수량
+        self.order_nos = {}  # 키움 주문번호 → 주문 번호 (접수 통보로 알게 됨)
+
+    def _drop_partial_record(self):
+        """이전 실행이 쓰다 만 마지막 레코드를 잘라냄 (그대로 이어 쓰면 이후 레코드가 모두 어긋남)"""
+        if not os.path.exists(self.path):
+            return
+        size = os.path.getsize(self.path)
+        if size % RECORD_DTYPE.itemsize:
+            os.truncate(self.path, size - size % RECORD_DTYPE.itemsize)
+
+    def _last_id(self):
+        size = os.path.getsize(self.path)
+        if size < RECORD_DTYPE.itemsize:
+            return 0
+        last = np.fromfile(self.path, dtype=RECORD_DTYPE, count=1, offset=size - RECORD_DTYPE.itemsize)
+        return int(last["order_id"][0])
+
+    def _write(self, order_id, kind, side, stock_code, price=0, quantity=0, remaining=0, ret=0, quote_t=0.0):
+        record = np.zeros(1, dtype=RECORD_DTYPE)
+        record[0] = (order_id, kind, side, 0, stock_code.encode(), self.clock(), price, quantity, remaining, ret, quote_t)
+        record.tofile(self.file)
+        self.file.flush()
+
+    def decide(self, account_number, side, stock_code, price, quantity, quote_t=0.0):
+        """주문 결정 기록 → 주문 번호 (send_order에 넘겨 이후 레코드를 묶음)"""
+        order_id = self.next_id
+        self.next_id += 1
+        self._write(order_id, KIND_DECISION, side, stock_code, price, quantity, quantity, quote_t=quote_t)
+        self.open_orders.setdefault((account_number, stock_code, side), []).append(order_id)
+        return order_id
+
+    def sent(self, order_id, account_number, side, stock_code, ret):
+        """SendOrder 호출 결과 (0이 아니면 거부로 닫음)"""
+        self._write(order_id, KIND_SENT, side, stock_code, ret=ret)
+        if ret != 0:
+            self._write(order_id, KIND_REJECTED, side, stock_code, ret=ret)
+            self._close(order_id, account_number, side, stock_code)
+
+    def _close(self, order_id, account_number, side, stock_code):
+        key = (account_number, stock_code, side)
+        orders = self.open_orders.get(key, [])
+        if order_id in orders:
+            orders.remove(order_id)
+        if not orders:
+            self.open_orders.pop(key, None)
+        self.filled.pop(order_id, None)
+        for order_no in [no for no, oid in self.order_nos.items() if oid == order_id]:
+            del self.order_nos[order_no]
+
+    def on_chejan(self, account_number, side, stock_code, status, price, filled_quantity, remaining, order_no=""):
+        """Chejan 주문체결 통보 (status: 913 주문상태, price: 910 체결가, filled_quantity: 911 누적 체결량, remaining: 902,
+        order_no: 9203 주문번호)
+
+        취소 주문 자체의 통보는 넘기지 않는다 (원주문은 on_cancel_confirmed로 닫음).
+        """
+        order_id = self.order_nos.get(order_no) if order_no else None
+        if order_id is None:
+            orders = self.open_orders.get((account_number, stock_code, side))
+            if not orders:
+                return None
+            accepted = set(self.order_nos.values())
+            order_id = next((oid for oid in orders if oid not in accepted), orders[0])
+            if status == "접수" and order_no:
+                self.order_nos[order_no] = order_id
+
+        if status == "접수":
+            self._write(order_id, KIND_ACCEPTED, side, stock_code, remaining=remaining)
+        elif status == "체결":
+            if filled_quantity > self.filled.get(order_id, 0):
+                self.filled[order_id] = filled_quantity
+                self._write(order_id, KIND_FILL, side, stock_code, price, filled_quantity, remaining)
+            if remaining <= 0:
+                self._write(order_id, KIND_DONE, side, stock_code, quantity=filled_quantity)
+                self._close(order_id, account_number, side, stock_code)
+        elif status in ("취소", "거부"):
+            self._write(order_id, KIND_REJECTED, side, stock_code, quantity=filled_quantity, remaining=remaining)
+            self._close(order_id, account_number, side, stock_code)
+        return order_id
+
+    def on_cancel_confirmed(self, account_number, side, stock_code, original_order_no):
+        """취소 주문 확인 (913 "확인", original_order_no: 904 원주문번호) → 원주문을 취소로 닫음"""
+        order_id = self.order_nos.get(original_order_no)
+        if order_id is None:
+            return None
+        self._write(order_id, KIND_REJECTED, side, stock_code, quantity=self.filled.get(order_id, 0))
+        self._close(order_id, account_number, side, stock_code)
+        return order_id
+
+    def close(self):
+        self.file.close()
+
+
+def load(path=ORDER_LOG_PATH):
+    """기록 전체를 RECORD_DTYPE 배열로 (마지막에 쓰다 만 레코드는 버림)"""
+    if not os.path.exists(path):
+        return np.zeros(0, dtype=RECORD_DTYPE)
+    count = os.path.getsize(path) // RECORD_DTYPE.itemsize
+    return np.fromfile(path, dtype=RECORD_DTYPE, count=count)
+
+
+def lifecycles(records):
+    """주문 번호별 한 행으로 요약 (시각은 없으면 nan)
+
+    반환 dict의 값은 모두 주문 수 길이의 배열:
+    order_id, side, code, decision_t, quote_t, decision_price, quantity,
+    sent_t, accepted_t, first_fill_t, done_t, filled, fill_price(가중평균 체결가), rejected
+    """
+    order_ids, index = np.unique(records["order_id"], return_inverse=True)
+    n = len(order_ids)
+    kind = records["kind"]
+
+    def first_time(k):
+        times = np.full(n, np.nan)
+        mask = kind == k
+        np.fmin.at(times, index[mask], records["t"][mask])
+        return times
+
+    decision = kind == KIND_DECISION
+    side = np.zeros(n, dtype=np.uint8)
+    code = np.zeros(n, dtype=RECORD_DTYPE["code"])
+    decision_price = np.zeros(n, dtype=np.float64)
+    quantity = np.zeros(n, dtype=np.int64)
+    quote_t = np.full(n, np.nan)
+    side[index[decision]] = records["side"][decision]
+    code[index[decision]] = records["code"][decision]
+    decision_price[index[decision]] = records["price"][decision]
+    quantity[index[decision]] = records["quantity"][decision]
+    quote_t[index[decision]] = np.where(records["quote_t"][decision] > 0, records["quote_t"][decision], np.nan)
+
+    # 부분 체결: 누적 체결량 차이가 그 체결의 수량
+    fills = np.flatnonzero(kind == KIND_FILL)
+    fills = fills[np.lexsort((records["t"][fills], index[fills]))]
+    fill_order = index[fills]
+    cumulative = records["quantity"][fills].astype(np.int64)
+    same_order = np.r_[False, fill_order[1:] == fill_order[:-1]]
+    previous = np.where(same_order, np.r_[0, cumulative[:-1]], 0)
+    step = np.maximum(cumulative - previous, 0)
+    filled = np.bincount(fill_order, weights=step, minlength=n)
+    notional = np.bincount(fill_order, weights=step * records["price"][fills], minlength=n)
+
+    rejected = np.zeros(n, dtype=bool)
+    rejected[index[kind == KIND_REJECTED]] = True
+
+    return {
+        "order_id": order_ids,
+        "side": side,
+        "code": code,
+        "decision_t": first_time(KIND_DECISION),
+        "quote_t": quote_t,
+        "decision_price": decision_price,
+        "quantity": quantity,
+        "sent_t": first_time(KIND_SENT),
+        "accepted_t": first_time(KIND_ACCEPTED),
+        "first_fill_t": first_time(KIND_FILL),
+        "done_t": first_time(KIND_DONE),
+        "filled": filled.astype(np.int64),
+        "fill_price": np.divide(notional, filled, out=np.full(n, np.nan), where=filled > 0),
+        "rejected": rejected,
+    }
+
+
+def slippage_bps(orders):
+    """판단가 대비 가중평균 체결가 차이 (bp, 불리한 쪽이 +: 매수는 비싸게, 매도는 싸게 체결)"""
+    sign = np.where(orders["side"] == SIDE_SELL, -1.0, 1.0)
+    return sign * (orders["fill_price"] - orders["decision_price"]) / orders["decision_price"] * 1e4
+
+
+def _percentiles(values):
+    values = values[~np.isnan(values)]
+    if not len(values):
+        return None
+    return np.percentile(values, LATENCY_PERCENTILES)
+
+
+def _grouped(labels, values):
+    """라벨별 (건수, 평균, p90) → {라벨: (...)}"""
+    ok = ~np.isnan(values)
+    labels, values = labels[ok], values[ok]
+    groups, inverse = np.unique(labels, return_inverse=True)
+    counts = np.bincount(inverse, minlength=len(groups))
+    means = np.bincount(inverse, weights=values, minlength=len(groups)) / np.maximum(counts, 1)
+    result = {}
+    for g, group in enumerate(groups):
+        result[group] = (int(counts[g]), float(means[g]), float(np.percentile(values[inverse == g], 90)))
+    return result
+
+
+def report(records):
+    """지연 시간 분위수와 가격대 / 시간대 / 체결 지연별 슬리피지 → dict"""
+    orders = lifecycles(records)
+    slippage = slippage_bps(orders)
+    filled = orders["filled"] > 0
+
+    latencies = {
+        "시세 경과 (판단 시점)": orders["decision_t"] - orders["quote_t"],
+        "판단 → 전송 (주문 제한 대기)": orders["sent_t"] - orders["decision_t"],
+        "전송 → 접수": orders["accepted_t"] - orders["sent_t"],
+        "전송 → 첫 체결": orders["first_fill_t"] - orders["sent_t"],
+        "전송 → 완료": orders["done_t"] - orders["sent_t"],
+    }
+
+    tier = np.searchsorted(PRICE_TIERS, orders["decision_price"], side="right")
+    tier_names = np.array(
+        [f"~{PRICE_TIERS[0]:,}"]
+        + [f"{lo:,}~{hi:,}" for lo, hi in zip(PRICE_TIERS[:-1], PRICE_TIERS[1:])]
+        + [f"{PRICE_TIERS[-1]:,}~"]
+    )
+    local = np.nan_to_num(orders["decision_t"]) + time.localtime().tm_gmtoff
+    half_hour = (local % 86400 // 1800).astype(np.int64)
+    time_names = np.array([f"{h // 2:02d}:{h % 2 * 30:02d}" for h in range(48)])
+
+    # 체결 지연이 슬리피지를 키우는지: 전송 → 첫 체결 지연 4분위별 슬리피지
+    fill_latency = orders["first_fill_t"] - orders["sent_t"]
+    by_latency = {}
+    ok = filled & ~np.isnan(fill_latency)
+    if ok.sum() >= 4:
+        edges = np.percentile(fill_latency[ok], (25, 50, 75))
+        quartile = np.searchsorted(edges, fill_latency[ok], side="right")
+        by_latency = _grouped(quartile, slippage[ok])
+        by_latency = {f"Q{q + 1}": value for q, value in by_latency.items()}
+
+    return {
+        "orders": len(orders["order_id"]),
+        "filled": int(filled.sum()),
+        "rejected": int(orders["rejected"].sum()),
+        "latency": {name: _percentiles(values) for name, values in latencies.items()},
+        "slippage": _percentiles(slippage[filled]),
+        "by_tier": {tier_names[t]: v for t, v in _grouped(tier[filled], slippage[filled]).items()},
+        "by_time": {time_names[h]: v for h, v in _grouped(half_hour[filled], slippage[filled]).items()},
+        "by_fill_latency": by_latency,
+    }
+
+
+def print_report(result):
+    labels = " / ".join(f"p{p}" for p in LATENCY_PERCENTILES)
+    print(f"📊 주문 {result['orders']}건 (체결 {result['filled']}건, 거부/취소 {result['rejected']}건)")
+    print(f"⏱ 지연 시간 ({labels}, ms)")
+    for name, values in result["latency"].items():
+        text = "-" if values is None else " / ".join(f"{v * 1000:,.0f}" for v in values)
+        print(f"   {name}: {text}")
+
+    values = result["slippage"]
+    text = "-" if values is None else " / ".join(f"{v:+.1f}" for v in values)
+    print(f"💸 슬리피지 ({labels}, bp, +가 불리): {text}")
+    for title, groups in (
+        ("가격대별", result["by_tier"]),
+        ("시간대별", result["by_time"]),
+        ("첫 체결 지연 4분위별 (Q1 가장 빠름)", result["by_fill_latency"]),
+    ):
+        if not groups:
+            continue
+        print(f"   [{title}] 건수 / 평균 / p90")
+        for name, (count, mean, p90) in groups.items():
+            print(f"   {name}: {count}건 / {mean:+.1f} / {p90:+.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="주문 → 체결 지연 / 슬리피지 리포트")
+    parser.add_argument("path", nargs="?", default=ORDER_LOG_PATH, help="주문 기록 파일")
+    args = parser.parse_args()
+
+    records = load(args.path)
+    if not len(records):
+        print(f"❌ 주문 기록이 없습니다: {args.path}")
+    else:
+        print_report(report(records))
@@ -0,0 +1,96 @@
+import numpy as np
+
+
+class HoldingsBook:
+    """보유 종목 손익 계산 엔진
+
+    보유수량·평균단가·현재가를 종목 순서대로 정렬된 배열에 보관하고,
+    가격 묶음이 들어올 때마다 평가금액·손익·수익률·비중을 한 번에 다시 계산한다.
+    화면에는 표시 값이 실제로 바뀐 행만 다시 그리도록 행 번호를 돌려준다.
+    """
+    def __init__(self):
+        self.codes = []
+        self.names = []
+        self.index = {}  # 종목코드 → 행 번호
+        self.quantity = np.zeros(0, dtype=np.int64)
+        self.avg_cost = np.zeros(0, dtype=np.float64)
+        self.last_price = np.zeros(0, dtype=np.float64)
+        self._recompute()
+        self._shown_price = self.last_price.copy()  # 화면에 마지막으로 그린 현재가
+        self._shown_quantity = self.quantity.copy()
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __contains__(self, stock_code):
+        return stock_code in self.index
+
+    def set_positions(self, positions):
+        """보유 종목 전체 교체 (OPW00018/OPW00004 응답 레코드)
+
+        positions: stock_code, stock_name, quantity, buy_price, current_price 속성을 가진 레코드 리스트.
+        응답의 현재가가 0이면 기존에 받아 둔 현재가를 그대로 유지한다.
+        """
+        previous = {code: self.last_price[i] for code, i in self.index.items()}
+
+        self.codes = [p.stock_code for p in positions]
+        self.names = [p.stock_name for p in positions]
+        self.index = {code: i for i, code in enumerate(self.codes)}
+        self.quantity = np.array([p.quantity for p in positions], dtype=np.int64)
+        self.avg_cost = np.array([p.buy_price for p in positions], dtype=np.float64)
+        self.last_price = np.array(
+            [p.current_price or previous.get(p.stock_code, 0.0) for p in positions], dtype=np.float64
+        )
+
+        self._recompute()
+        self._shown_price = np.full(len(self.codes), -1.0)  # 전체 행을 다시 그리도록 표시
+        self._shown_quantity = self.quantity.copy()
+
+    def invalidate_display(self):
+        """다음 changed_rows()가 전체 행을 돌려주도록 표시 상태 초기화 (다른 계좌 화면에서 돌아올 때)"""
+        self._shown_price = np.full(len(self.codes), -1.0)
+
+    def update_prices(self, prices):
+        """{종목코드: 현재가} 묶음 반영 후 표시가 바뀐 행 번호 배열 반환"""
+        rows = [self.index[code] for code in prices if code in self.index]
+        if rows:
+            self.last_price[rows] = [prices[self.codes[i]] for i in rows]
+            self._recompute()
+        return self.changed_rows()
+
+    def _recompute(self):
+        """평가금액/손익/수익률/비중 일괄 계산"""
+        self.cost = self.quantity * self.avg_cost
+        self.evaluation = self.quantity * self.last_price
+        self.profit = self.evaluation - self.cost
+        self.profit_rate = np.divide(
+            self.profit * 100, self.cost, out=np.zeros_like(self.profit), where=self.cost > 0
+        )
+        total = self.evaluation.sum()
+        self.exposure = self.evaluation / total if total > 0 else np.zeros_like(self.evaluation)
+
+    def changed_rows(self):
+        """마지막으로 화면에 그린 뒤 현재가/수량이 바뀐 행 번호 (호출 시 표시 상태 갱신)"""
+        changed = np.flatnonzero((self.last_price != self._shown_price) | (self.quantity != self._shown_quantity))
+        self._shown_price[changed] = self.last_price[changed]
+        self._shown_quantity[changed] = self.quantity[changed]
+        return changed
+
+    def row(self, i):
+        """holdings_table 한 행 값 (종목코드, 종목명, 보유수량, 평균단가, 현재가, 평가금액, 손익금액, 손익률)"""
+        return (
+            self.codes[i], self.names[i], int(self.quantity[i]), float(self.avg_cost[i]),
+            int(self.last_price[i]), int(self.evaluation[i]), int(self.profit[i]), float(self.profit_rate[i]),
+        )
+
+    def totals(self):
+        """포트폴리오 합계"""
+        total_cost = float(self.cost.sum())
+        total_evaluation = float(self.evaluation.sum())
+        total_profit = total_evaluation - total_cost
+        return {
+            "cost": total_cost,
+            "evaluation": total_evaluation,
+            "profit": total_profit,
+            "profit_rate": total_profit / total_cost * 100 if total_cost > 0 else 0.0,
+        }
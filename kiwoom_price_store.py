@@ -0,0 +1,85 @@
+import os
+import json
+import tempfile
+import numpy as np
+
+
+PANEL_COLUMNS = ("open", "high", "low", "close", "volume")
+
+
+class PriceStore:
+    """종목별 일봉 데이터 저장소 (stock_data/{종목코드}.json)"""
+    def __init__(self, data_dir="stock_data"):
+        self.data_dir = data_dir
+        os.makedirs(self.data_dir, exist_ok=True)
+
+    def path(self, stock_code):
+        """종목 데이터 파일 경로"""
+        return os.path.join(self.data_dir, f"{stock_code}.json")
+
+    def save(self, stock_code, rows):
+        """일봉 데이터를 원자적으로 저장 (임시 파일에 쓴 뒤 교체)
+
+        여러 프로세스가 같은 종목을 동시에 저장해도 읽는 쪽은 항상
+        완성된 파일만 보게 된다.
+        """
+        fd, tmp_path = tempfile.mkstemp(prefix=f".{stock_code}.", suffix=".tmp", dir=self.data_dir)
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(rows, f, indent=4, ensure_ascii=False)
+            os.replace(tmp_path, self.path(stock_code))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def load(self, stock_code):
+        """저장된 일봉 데이터 로드 (없으면 None)"""
+        try:
+            with open(self.path(stock_code), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def exists(self, stock_code):
+        return os.path.exists(self.path(stock_code))
+
+    def codes(self):
+        """저장된 종목코드 목록"""
+        return sorted(
+            name[:-5] for name in os.listdir(self.data_dir)
+            if name.endswith(".json") and not name.startswith(".")
+        )
+
+    def load_panel(self, stock_codes, columns=PANEL_COLUMNS):
+        """여러 종목 일봉을 공통 날짜축 2차원 배열로 (종목 × 날짜, 오래된 순, 없는 날은 nan)
+
+        반환: (종목코드 리스트, 날짜 배열(YYYYMMDD 정수), {컬럼: 2차원 float64 배열})
+        데이터가 없는 종목은 빠진다. 시가/고가/저가가 없는 예전 파일은 종가로 채운다.
+        """
+        codes, date_arrays = [], []
+        values = {column: [] for column in columns}
+        for stock_code in stock_codes:
+            rows = self.load(stock_code)
+            if not rows:
+                continue
+            codes.append(stock_code)
+            date_arrays.append(np.array([int(row["date"]) for row in rows], dtype=np.int64))
+            for column in columns:
+                fallback = "close" if column != "volume" else column
+                values[column].append(
+                    np.array([row.get(column, row[fallback]) for row in rows], dtype=np.float64)
+                )
+
+        if not codes:
+            return [], np.zeros(0, dtype=np.int64), {column: np.zeros((0, 0)) for column in columns}
+
+        all_dates = np.concatenate(date_arrays)
+        dates = np.unique(all_dates)
+        row_index = np.repeat(np.arange(len(codes)), [len(d) for d in date_arrays])
+        col_index = np.searchsorted(dates, all_dates)
+        panel = {}
+        for column in columns:
+            panel[column] = np.full((len(codes), len(dates)), np.nan)
+            panel[column][row_index, col_index] = np.concatenate(values[column])
+        return codes, dates, panel
@@ -0,0 +1,323 @@
+import os
+import json
+import struct
+import argparse
+import threading
+import urllib.request
+from collections import OrderedDict
+from urllib.parse import urlparse, parse_qs, urlencode
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import numpy as np
+
+from kiwoom_price_store import PriceStore
+
+
+DEFAULT_PORT = 8765
+CANDIDATES_PATH = "filtered_candidates.json"
+CONTENT_TYPE = "application/x-kiwoom-bars"
+
+# 응답 바이너리: MAGIC + 항목 수(u4), 항목마다 종목코드(8바이트) + 레코드 수(u4) + 레코드 배열
+MAGIC = b"KQB1"
+COUNT = struct.Struct("<I")
+ITEM = struct.Struct("<8sI")
+BAR_DTYPE = np.dtype([
+    ("date", "<u4"), ("open", "<i4"), ("high", "<i4"), ("low", "<i4"), ("close", "<i4"), ("volume", "<i8"),
+])
+INDICATOR_DTYPE = np.dtype([
+    ("date", "<u4"), ("close", "<f8"), ("ma5", "<f8"), ("ma20", "<f8"), ("volume_ma5", "<f8"),
+])
+CANDIDATE_DTYPE = np.dtype([("code", "S8"), ("price", "<f8")])
+
+
+def rows_to_bars(rows):
+    """PriceStore 일봉(최신순 dict 리스트) → BAR_DTYPE 배열 (오래된 순)"""
+    bars = np.empty(len(rows), dtype=BAR_DTYPE)
+    for i, row in enumerate(reversed(rows)):
+        close = row["close"]
+        bars[i] = (int(row["date"]), row.get("open", close), row.get("high", close), row.get("low", close), close, row["volume"])
+    return bars[np.argsort(bars["date"], kind="stable")]
+
+
+def encode_items(items):
+    """{종목코드: 구조화 배열} → 바이너리 (같은 dtype끼리만)"""
+    parts = [MAGIC, COUNT.pack(len(items))]
+    for stock_code, records in items.items():
+        parts.append(ITEM.pack(stock_code.encode("ascii"), len(records)))
+        parts.append(np.ascontiguousarray(records).tobytes())
+    return b"".join(parts)
+
+
+def decode_items(data, dtype=BAR_DTYPE):
+    """encode_items() 역변환 → {종목코드: 구조화 배열} (복사 없이 data를 참조)"""
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("query service 응답 형식 오류")
+    offset = len(MAGIC)
+    (count,) = COUNT.unpack_from(data, offset)
+    offset += COUNT.size
+    items = {}
+    for _ in range(count):
+        code, length = ITEM.unpack_from(data, offset)
+        offset += ITEM.size
+        items[code.rstrip(b"\0").decode("ascii")] = np.frombuffer(data, dtype=dtype, count=length, offset=offset)
+        offset += length * dtype.itemsize
+    return items
+
+
+def moving_average(values, window):
+    """단순 이동평균 (앞쪽 window-1개는 nan, pandas rolling().mean()과 같음)"""
+    values = np.asarray(values, dtype=np.float64)
+    result = np.full(len(values), np.nan)
+    if len(values) >= window:
+        cumsum = np.cumsum(np.r_[0.0, values])
+        result[window - 1:] = (cumsum[window:] - cumsum[:-window]) / window
+    return result
+
+
+class BarCache:
+    """자주 조회되는 종목 일봉을 메모리에 두는 LRU 캐시 (최대 capacity 종목)
+
+    파일 수정 시각(mtime)을 같이 기억해 다운로더가 새로 저장한 종목은 다시 읽는다.
+    여러 요청 스레드에서 같이 쓰므로 lock으로 보호한다.
+    """
+    def __init__(self, store, capacity=512):
+        self.store = store
+        self.capacity = capacity
+        self.entries = OrderedDict()  # 종목코드 → (mtime, BAR_DTYPE 배열)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, stock_code):
+        """종목 일봉 (오래된 순), 데이터가 없으면 None"""
+        try:
+            mtime = os.stat(self.store.path(stock_code)).st_mtime_ns
+        except FileNotFoundError:
+            with self.lock:
+                self.entries.pop(stock_code, None)
+            return None
+
+        with self.lock:
+            entry = self.entries.get(stock_code)
+            if entry is not None and entry[0] == mtime:
+                self.entries.move_to_end(stock_code)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+
+        rows = self.store.load(stock_code)
+        if not rows:
+            return None
+        bars = rows_to_bars(rows)
+        bars.flags.writeable = False  # 여러 요청이 같은 배열을 공유
+        with self.lock:
+            self.entries[stock_code] = (mtime, bars)
+            self.entries.move_to_end(stock_code)
+            while len(self.entries) > self.capacity:
+                self.entries.popitem(last=False)
+        return bars
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            "size": len(self.entries), "capacity": self.capacity, "hits": self.hits, "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+        }
+
+
+class QueryService:
+    """가격 저장소 조회 (HTTP 핸들러와 분리된 순수 조회 로직)"""
+    def __init__(self, store=None, capacity=512, candidates_path=CANDIDATES_PATH):
+        self.cache = BarCache(store or PriceStore(), capacity)
+        self.candidates_path = candidates_path
+        self._candidates = (None, [])  # (mtime, 후보 리스트)
+
+    def bars(self, stock_codes, start=None, end=None):
+        """{종목코드: 기간 일봉} (start/end: YYYYMMDD 포함 범위, 데이터 없는 종목은 빠짐)"""
+        items = {}
+        for stock_code in stock_codes:
+            bars = self.cache.get(stock_code)
+            if bars is None:
+                continue
+            lo = 0 if start is None else int(np.searchsorted(bars["date"], int(start), side="left"))
+            hi = len(bars) if end is None else int(np.searchsorted(bars["date"], int(end), side="right"))
+            items[stock_code] = bars[lo:hi]
+        return items
+
+    def indicators(self, stock_codes, last=1):
+        """{종목코드: 최근 last일 지표} (종가, 5/20이평, 5일 평균 거래량 — 필터 규칙과 같은 정의)"""
+        items = {}
+        for stock_code in stock_codes:
+            bars = self.cache.get(stock_code)
+            if bars is None:
+                continue
+            close = bars["close"].astype(np.float64)
+            values = np.empty(len(bars), dtype=INDICATOR_DTYPE)
+            values["date"] = bars["date"]
+            values["close"] = close
+            values["ma5"] = moving_average(close, 5)
+            values["ma20"] = moving_average(close, 20)
+            values["volume_ma5"] = moving_average(bars["volume"], 5)
+            items[stock_code] = values[-last:] if last > 0 else values
+        return items
+
+    def candidates(self):
+        """최근 필터 결과 (filtered_candidates.json이 바뀌었을 때만 다시 읽음)"""
+        try:
+            mtime = os.stat(self.candidates_path).st_mtime_ns
+        except FileNotFoundError:
+            return []
+        if self._candidates[0] != mtime:
+            with open(self.candidates_path, "r", encoding="utf-8") as f:
+                self._candidates = (mtime, json.load(f).get("stocks", []))
+        return self._candidates[1]
+
+
+def _codes(query, body):
+    codes = list(body.get("codes", [])) if body else []
+    for value in query.get("code", []) + query.get("codes", []):
+        codes.extend(code for code in value.split(",") if code)
+    return codes
+
+
+def _records_json(items):
+    return {code: [dict(zip(r.dtype.names, r.tolist())) for r in records] for code, records in items.items()}
+
+
+class QueryHandler(BaseHTTPRequestHandler):
+    """GET/POST /bars, /indicators, GET /candidates, /stats
+
+    종목은 ?code=005930&codes=000660,035420 또는 POST 본문 {"codes": [...]}로 여러 개 요청할 수 있다.
+    기본 응답은 바이너리(decode_items), format=json이면 JSON.
+    """
+    service = None  # serve()에서 지정
+
+    def do_GET(self):
+        self._handle(None)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send(400, b"invalid json", "text/plain")
+            return
+        if not isinstance(body, dict):  # [1, 2] 같은 배열/값은 요청 파라미터로 쓸 수 없음
+            self._send(400, b"json body must be an object", "text/plain")
+            return
+        self._handle(body)
+
+    def _handle(self, body):
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        params = dict(body or {})
+        for key in ("start", "end", "last", "format"):
+            if key in query:
+                params[key] = query[key][0]
+        as_json = params.get("format") == "json"
+
+        try:
+            if url.path == "/bars":
+                items = self.service.bars(_codes(query, body), params.get("start"), params.get("end"))
+            elif url.path == "/indicators":
+                items = self.service.indicators(_codes(query, body), int(params.get("last", 1)))
+            elif url.path == "/candidates":
+                candidates = self.service.candidates()
+                if as_json:
+                    self._send_json({"stocks": candidates})
+                else:
+                    records = np.array([(c["stock_code"].encode("ascii"), c["price"]) for c in candidates], dtype=CANDIDATE_DTYPE)
+                    self._send(200, COUNT.pack(len(records)) + records.tobytes(), CONTENT_TYPE)
+                return
+            elif url.path == "/stats":
+                self._send_json(self.service.cache.stats())
+                return
+            else:
+                self._send(404, b"not found", "text/plain")
+                return
+        except ValueError as e:
+            self._send(400, str(e).encode("utf-8"), "text/plain")
+            return
+
+        if as_json:
+            self._send_json(_records_json(items))
+        else:
+            self._send(200, encode_items(items), CONTENT_TYPE)
+
+    def _send_json(self, data):
+        self._send(200, json.dumps(data, ensure_ascii=False).encode("utf-8"), "application/json")
+
+    def _send(self, status, payload, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format, *args):
+        pass  # 요청마다 출력하지 않음
+
+
+def serve(service, host="127.0.0.1", port=DEFAULT_PORT):
+    """조회 서버 생성 (serve_forever()는 호출하는 쪽에서, 기본은 로컬에서만 접속)"""
+    handler = type("BoundQueryHandler", (QueryHandler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+
+class QueryClient:
+    """노트북/리스크 대시보드용 클라이언트 (바이너리 응답을 numpy 배열로)"""
+    def __init__(self, host="127.0.0.1", port=DEFAULT_PORT, timeout=10.0):
+        self.base = f"http://{host}:{port}"
+        self.timeout = timeout
+
+    def _get(self, path, params=None, body=None):
+        url = f"{self.base}{path}"
+        if params:
+            url += "?" + urlencode({k: v for k, v in params.items() if v is not None})
+        data = json.dumps(body).encode("utf-8") if body is not None else None
+        request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"} if data else {})
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return response.read()
+
+    def bars(self, stock_codes, start=None, end=None):
+        """{종목코드: BAR_DTYPE 배열} (종목코드 하나만 넘겨도 됨)"""
+        if isinstance(stock_codes, str):
+            stock_codes = [stock_codes]
+        return decode_items(self._get("/bars", {"start": start, "end": end}, {"codes": list(stock_codes)}))
+
+    def indicators(self, stock_codes, last=1):
+        if isinstance(stock_codes, str):
+            stock_codes = [stock_codes]
+        return decode_items(self._get("/indicators", {"last": last}, {"codes": list(stock_codes)}), INDICATOR_DTYPE)
+
+    def candidates(self):
+        """최근 후보군 CANDIDATE_DTYPE 배열 (code, price=20이평)"""
+        data = self._get("/candidates")
+        (count,) = COUNT.unpack_from(data)
+        return np.frombuffer(data, dtype=CANDIDATE_DTYPE, count=count, offset=COUNT.size)
+
+    def stats(self):
+        return json.loads(self._get("/stats"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="가격 저장소 조회 서버 (LRU 캐시 + 바이너리 응답)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--data-dir", default="stock_data")
+    parser.add_argument("--cache", type=int, default=512, help="메모리에 둘 최대 종목 수")
+    parser.add_argument("--candidates", default=CANDIDATES_PATH)
+    args = parser.parse_args()
+
+    service = QueryService(PriceStore(args.data_dir), args.cache, args.candidates)
+    server = serve(service, args.host, args.port)
+    print(f"🛰 조회 서버 시작: http://{args.host}:{args.port} (캐시 {args.cache}종목, {args.data_dir})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        stats = service.cache.stats()
+        print(f"🛑 조회 서버 종료 (캐시 적중 {stats['hits']:,}회 / 미적중 {stats['misses']:,}회)")
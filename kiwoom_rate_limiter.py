@@ -0,0 +1,50 @@
+import time
+from collections import deque
+
+
+class RateLimiter:
+    """최근 period초 동안 max_calls회까지만 허용하는 요청 제한기 (슬라이딩 윈도)
+
+    키움 OpenAPI는 주문(SendOrder)과 조회(CommRqData)를 각각 초당 5회로 제한하며,
+    넘기면 요청이 거부된다. 주문/조회 경로가 이 객체 하나를 공유해 제한을 지킨다.
+    """
+    def __init__(self, max_calls=5, period=1.0, clock=time.monotonic):
+        self.max_calls = max_calls
+        self.period = period
+        self.clock = clock
+        self.calls = deque()  # 최근 허용한 요청 시각
+
+    def _trim(self, now):
+        while self.calls and now - self.calls[0] >= self.period:
+            self.calls.popleft()
+
+    def try_acquire(self):
+        """지금 보낼 수 있으면 자리를 차지하고 True"""
+        now = self.clock()
+        self._trim(now)
+        if len(self.calls) < self.max_calls:
+            self.calls.append(now)
+            return True
+        return False
+
+    def record(self):
+        """제한과 상관없이 보낸 요청 기록 (사용자 조작처럼 미룰 수 없는 요청)"""
+        self.calls.append(self.clock())
+
+    def available(self):
+        """지금 남은 요청 수"""
+        self._trim(self.clock())
+        return max(0, self.max_calls - len(self.calls))
+
+    def wait_time(self):
+        """다음 요청을 보낼 수 있을 때까지 남은 초 (지금 가능하면 0)"""
+        now = self.clock()
+        self._trim(now)
+        if len(self.calls) < self.max_calls:
+            return 0.0
+        return self.period - (now - self.calls[0])
+
+    def acquire(self):
+        """자리가 날 때까지 기다렸다가 차지 (이벤트 루프가 없는 스크립트용)"""
+        while not self.try_acquire():
+            time.sleep(self.wait_time())
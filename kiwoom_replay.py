@@ -0,0 +1,536 @@
+import os
+import sys
+import json
+import time
+import struct
+import argparse
+import shutil
+import tempfile
+import numpy as np
+
+from kiwoom_simulator import SimulatedKiwoomControl, _Signal
+from kiwoom_tr_schema import TR_SCHEMAS
+
+
+MAGIC = b"KEV1"
+RECORD = struct.Struct("<BdI")  # 레코드 종류, 시각(기록 시작 후 초), 본문 길이
+KIND_STRING = 0  # 문자열 테이블 항목 (이후 레코드는 번호로 참조)
+KIND_EVENT = 1  # 이벤트 콜백 (시그널, 인자, 콜백 중 API 호출 결과, 핸들러 처리 시간)
+KIND_CALL = 2  # 이벤트 밖에서 한 API 호출 (GetLoginInfo, CommRqData 등)
+
+SIGNALS = SimulatedKiwoomControl.SIGNALS
+RECORDED_SIGNALS = ("OnEventConnect", "OnReceiveTrData", "OnReceiveRealData", "OnReceiveChejanData")
+
+SIG_GET_COMM_DATA = "GetCommData(QString, QString, int, QString)"
+SIG_GET_REPEAT_CNT = "GetRepeatCnt(QString, QString)"
+SIG_GET_REAL_DATA = "GetCommRealData(QString, int)"
+SIG_GET_CHEJAN_DATA = "GetChejanData(int)"
+
+REAL_FIDS = (10, 15, 20)  # 현재가, 거래량, 체결시간
+CHEJAN_FIDS = (9201, 9203, 9001, 302, 900, 901, 902, 907, 910, 911, 913)  # 계좌, 주문번호, 종목코드, 종목명, 주문수량/가격, 미체결, 매도수구분, 체결가/량, 주문상태
+
+# 재생 시 기록에 없는 호출의 기본 반환값 (주문/요청은 성공한 것으로 처리)
+DEFAULT_RESULTS = {"SendOrder": 0, "CommRqData": 0, "SetRealReg": 0, "GetRepeatCnt": 0, "GetConnectState": 1}
+
+
+def _freeze(value):
+    """리스트 인자(SendOrder 등)를 dict 키로 쓸 수 있게 튜플로"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+# ----------------------------------------------------------------------
+# 값 인코딩 (태그 1바이트 + 고정 길이 값, 문자열은 문자열 테이블 번호)
+# ----------------------------------------------------------------------
+_INT32 = struct.Struct("<i")
+_INT64 = struct.Struct("<q")
+_FLOAT = struct.Struct("<d")
+_UINT32 = struct.Struct("<I")
+_UINT16 = struct.Struct("<H")
+
+
+class EventLogWriter:
+    """이벤트 로그 바이너리 파일 작성기"""
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "wb")
+        self.file.write(MAGIC)
+        self.strings = {}  # 문자열 → 번호
+        self.counts = {KIND_EVENT: 0, KIND_CALL: 0}
+
+    def _encode(self, value, out):
+        if value is None:
+            out.append(b"N")
+        elif isinstance(value, str):
+            string_id = self.strings.get(value)
+            if string_id is None:
+                string_id = self.strings[value] = len(self.strings)
+                data = value.encode("utf-8")
+                self.file.write(RECORD.pack(KIND_STRING, 0.0, len(data)) + data)
+            out.append(b"S" + _UINT32.pack(string_id))
+        elif isinstance(value, float):
+            out.append(b"F" + _FLOAT.pack(value))
+        elif isinstance(value, (int, np.integer)):
+            value = int(value)
+            if -2 ** 31 <= value < 2 ** 31:
+                out.append(b"i" + _INT32.pack(value))
+            else:
+                out.append(b"I" + _INT64.pack(value))
+        elif isinstance(value, (list, tuple)):
+            out.append(b"L" + _UINT16.pack(len(value)))
+            for item in value:
+                self._encode(item, out)
+        else:
+            self._encode(str(value), out)
+
+    def _write(self, kind, t, values):
+        out = []
+        self._encode(values, out)  # 새 문자열 레코드가 본문보다 먼저 기록됨
+        payload = b"".join(out)
+        self.file.write(RECORD.pack(kind, t, len(payload)) + payload)
+        self.counts[kind] += 1
+
+    def write_event(self, t, signal_name, args, calls, handler_time):
+        """calls: {(시그니처, 인자 튜플): 결과}"""
+        flat = [(signature, list(call_args), result) for (signature, call_args), result in calls.items()]
+        self._write(KIND_EVENT, t, (signal_name, list(args), flat, handler_time))
+
+    def write_call(self, t, signature, args, result):
+        self._write(KIND_CALL, t, (signature, list(args), result))
+
+    def close(self):
+        self.file.close()
+
+
+class ReplayEvent:
+    __slots__ = ("t", "signal", "args", "calls", "handler_time")
+
+    def __init__(self, t, signal, args, calls, handler_time):
+        self.t = t
+        self.signal = signal
+        self.args = args
+        self.calls = calls  # (시그니처, 인자 튜플) → 결과
+        self.handler_time = handler_time  # 기록 당시 핸들러 처리 시간(초)
+
+
+class StaticCall:
+    __slots__ = ("t", "key", "result")
+
+    def __init__(self, t, key, result):
+        self.t = t
+        self.key = key
+        self.result = result
+
+
+def _decode(data, pos, strings):
+    tag = data[pos:pos + 1]
+    pos += 1
+    if tag == b"S":
+        return strings[_UINT32.unpack_from(data, pos)[0]], pos + 4
+    if tag == b"i":
+        return _INT32.unpack_from(data, pos)[0], pos + 4
+    if tag == b"I":
+        return _INT64.unpack_from(data, pos)[0], pos + 8
+    if tag == b"F":
+        return _FLOAT.unpack_from(data, pos)[0], pos + 8
+    if tag == b"N":
+        return None, pos
+    if tag == b"L":
+        count = _UINT16.unpack_from(data, pos)[0]
+        pos += 2
+        items = []
+        for _ in range(count):
+            item, pos = _decode(data, pos, strings)
+            items.append(item)
+        return items, pos
+    raise ValueError(f"알 수 없는 값 태그: {tag!r}")
+
+
+def read_event_log(path):
+    """이벤트 로그를 시각순 ReplayEvent / StaticCall 리스트로 읽음"""
+    with open(path, "rb") as f:
+        data = f.read()
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("이벤트 로그 형식이 올바르지 않습니다.")
+
+    strings, records = [], []
+    pos = len(MAGIC)
+    while pos < len(data):
+        kind, t, length = RECORD.unpack_from(data, pos)
+        pos += RECORD.size
+        body = data[pos:pos + length]
+        pos += length
+        if kind == KIND_STRING:
+            strings.append(body.decode("utf-8"))
+            continue
+        values, _ = _decode(body, 0, strings)
+        if kind == KIND_EVENT:
+            signal_name, args, flat, handler_time = values
+            calls = {(signature, _freeze(call_args)): result for signature, call_args, result in flat}
+            records.append(ReplayEvent(t, signal_name, args, calls, handler_time))
+        elif kind == KIND_CALL:
+            signature, args, result = values
+            records.append(StaticCall(t, (signature, _freeze(args)), result))
+
+    records.sort(key=lambda r: r.t)  # 중첩 이벤트는 바깥 이벤트보다 먼저 기록되므로 시각순 정렬
+    return records
+
+
+# ----------------------------------------------------------------------
+# 기록
+# ----------------------------------------------------------------------
+class RecordingControl:
+    """실제 컨트롤(QAxWidget/시뮬레이터)을 감싸 이벤트와 API 호출 결과를 기록
+
+    UI/트레이더는 이 객체를 키움 컨트롤처럼 사용한다. 이벤트가 오면 재생에
+    필요한 데이터(TR 스키마 필드, 실시간 FID, 체결 FID)를 먼저 읽어 두고,
+    핸들러가 콜백 안에서 추가로 읽은 값도 함께 한 레코드로 저장한다.
+    """
+    def __init__(self, control, writer, real_fids=REAL_FIDS, chejan_fids=CHEJAN_FIDS, clock=time.monotonic):
+        self.control = control
+        self.writer = writer
+        self.real_fids = real_fids
+        self.chejan_fids = chejan_fids
+        self.clock = clock
+        self.started_at = clock()
+        self._frames = []  # 처리 중인 이벤트의 호출 결과 (핸들러 안에서 다른 이벤트가 올 수 있어 스택)
+
+        for name in SIGNALS:
+            setattr(self, name, _Signal())
+            source = getattr(control, name, None)
+            if source is not None:
+                source.connect(lambda *args, name=name: self._on_event(name, args))
+
+    def __getattr__(self, name):
+        return getattr(self.control, name)  # process_events 등은 감싼 컨트롤로 전달
+
+    def dynamicCall(self, signature, *args):
+        result = self.control.dynamicCall(signature, *args)
+        key = (signature, _freeze(args))
+        if self._frames:
+            self._frames[-1].setdefault(key, result)
+        else:
+            self.writer.write_call(self.clock() - self.started_at, signature, args, result)
+        return result
+
+    def _capture(self, signal_name, args, frame):
+        """핸들러가 읽을 수 있는 이벤트 데이터를 미리 읽어 둠"""
+        def call(signature, *call_args):
+            frame.setdefault((signature, _freeze(call_args)), self.control.dynamicCall(signature, *call_args))
+
+        if signal_name == "OnReceiveTrData":
+            rqname, trcode = args[1], args[2]
+            schema = TR_SCHEMAS.get(trcode.upper())
+            if schema is None:
+                return
+            for field, _, _ in schema.single_fields:
+                call(SIG_GET_COMM_DATA, trcode, rqname, 0, field)
+            if schema.multi_fields:
+                count = self.control.dynamicCall(SIG_GET_REPEAT_CNT, trcode, rqname)
+                frame[(SIG_GET_REPEAT_CNT, (trcode, rqname))] = count
+                for i in range(count):
+                    for field, _, _ in schema.multi_fields:
+                        call(SIG_GET_COMM_DATA, trcode, rqname, i, field)
+        elif signal_name == "OnReceiveRealData":
+            for fid in self.real_fids:
+                call(SIG_GET_REAL_DATA, args[0], fid)
+        elif signal_name == "OnReceiveChejanData":
+            for fid in self.chejan_fids:
+                call(SIG_GET_CHEJAN_DATA, fid)
+
+    def _on_event(self, signal_name, args):
+        if signal_name not in RECORDED_SIGNALS:
+            getattr(self, signal_name).emit(*args)
+            return
+
+        t = self.clock() - self.started_at
+        frame = {}
+        self._capture(signal_name, args, frame)
+        self._frames.append(frame)
+        start = time.perf_counter()
+        try:
+            getattr(self, signal_name).emit(*args)
+        finally:
+            handler_time = time.perf_counter() - start
+            self._frames.pop()
+            self.writer.write_event(t, signal_name, args, frame, handler_time)
+
+
+# ----------------------------------------------------------------------
+# 재생
+# ----------------------------------------------------------------------
+class ReplayControl:
+    """기록된 로그로 키움 컨트롤을 대신하는 재생용 컨트롤 (연결 없이 동작)
+
+    이벤트를 전달하는 동안에는 그 이벤트에 기록된 호출 결과로 dynamicCall에
+    답하고, 기록에 없는 호출(주문, TR 요청 등)은 성공 값으로 답하면서 횟수를 센다.
+    """
+    def __init__(self):
+        for name in SIGNALS:
+            setattr(self, name, _Signal())
+        self.static_results = {}  # 이벤트 밖 호출 결과 (시각순으로 갱신)
+        self._frame = None
+        self.outgoing = {}  # 재생 중 앱이 보낸 요청/주문 등 API 이름 → 횟수
+        self.unmatched = 0  # 기록에 없는 조회 호출 횟수
+
+    def process_events(self):
+        pass
+
+    def apply_call(self, call):
+        self.static_results[call.key] = call.result
+
+    def deliver(self, event):
+        self._frame = event.calls
+        try:
+            getattr(self, event.signal).emit(*event.args)
+        finally:
+            self._frame = None
+
+    def dynamicCall(self, signature, *args):
+        key = (signature, _freeze(args))
+        if self._frame is not None and key in self._frame:
+            return self._frame[key]
+        if key in self.static_results:
+            return self.static_results[key]
+
+        name = signature.split("(", 1)[0]
+        if name.startswith("Get"):
+            self.unmatched += 1
+        else:
+            self.outgoing[name] = self.outgoing.get(name, 0) + 1
+        return DEFAULT_RESULTS.get(name, "")
+
+
+class Replayer:
+    """이벤트 로그를 1배속 / N배속 / 최대 속도로 재생하고 핸들러 지연을 측정
+
+    speed가 None이면 기록 시각을 무시하고 최대한 빨리 전달한다.
+    pump는 이벤트 사이에 호출되는 함수로, Qt 앱이면 QApplication.processEvents를
+    넘겨 타이머(보유 종목 일괄 갱신, 자동매수 등)가 재생 중에도 돌게 한다.
+    """
+    def __init__(self, control, records, pump=None, clock=time.perf_counter):
+        self.control = control
+        self.records = records
+        self.pump = pump or (lambda: None)
+        self.clock = clock
+
+    def _next_same_code(self):
+        """실시간 이벤트마다 같은 종목의 다음 실시간 이벤트 기록 시각 (없으면 inf)"""
+        next_t = np.full(len(self.records), np.inf)
+        last_seen = {}
+        for i in range(len(self.records) - 1, -1, -1):
+            record = self.records[i]
+            if isinstance(record, ReplayEvent) and record.signal == "OnReceiveRealData":
+                code = record.args[0]
+                if code in last_seen:
+                    next_t[i] = last_seen[code]
+                last_seen[code] = record.t
+        return next_t
+
+    def run(self, speed=1.0):
+        """재생 후 리포트 dict 반환"""
+        next_same_code = self._next_same_code() if speed else None
+        t0 = self.records[0].t if self.records else 0.0
+        latency, service, lag = {}, {}, []
+        recorded = {}
+        dropped = 0
+
+        start = self.clock()
+        for i, record in enumerate(self.records):
+            if isinstance(record, StaticCall):
+                self.control.apply_call(record)
+                continue
+
+            if speed:
+                due = start + (record.t - t0) / speed
+                while True:
+                    self.pump()
+                    remaining = due - self.clock()
+                    if remaining <= 0:
+                        break
+                    time.sleep(min(remaining, 0.001))
+            else:
+                self.pump()
+                due = self.clock()
+
+            begin = self.clock()
+            self.control.deliver(record)
+            end = self.clock()
+
+            latency.setdefault(record.signal, []).append(end - due)
+            service.setdefault(record.signal, []).append(end - begin)
+            recorded.setdefault(record.signal, []).append(record.handler_time)
+            lag.append(begin - due)
+            # 같은 종목의 다음 체결이 이미 도착했어야 할 시각에 전달됐으면 쓸모없어진 갱신
+            if speed and record.signal == "OnReceiveRealData" and begin > start + (next_same_code[i] - t0) / speed:
+                dropped += 1
+        self.pump()
+        elapsed = self.clock() - start
+
+        def summary(values):
+            values = np.asarray(values) * 1000
+            return {
+                "count": int(values.size),
+                "p50_ms": float(np.percentile(values, 50)),
+                "p99_ms": float(np.percentile(values, 99)),
+                "max_ms": float(values.max()),
+            }
+
+        real_count = len(latency.get("OnReceiveRealData", []))
+        return {
+            "speed": speed or "max",
+            "events": sum(len(v) for v in latency.values()),
+            "elapsed_s": elapsed,
+            "events_per_s": sum(len(v) for v in latency.values()) / elapsed if elapsed > 0 else 0.0,
+            "max_lag_ms": max(lag) * 1000 if lag else 0.0,
+            "latency": {name: summary(values) for name, values in latency.items()},
+            "service": {name: summary(values) for name, values in service.items()},
+            "recorded_service": {name: summary(values) for name, values in recorded.items()},
+            "dropped_updates": dropped if speed else None,
+            "dropped_ratio": dropped / real_count if speed and real_count else 0.0,
+            "outgoing": dict(self.control.outgoing),
+            "unmatched_calls": self.control.unmatched,
+        }
+
+
+def print_report(report):
+    speed = "최대" if report["speed"] == "max" else f"{report['speed']:g}배속"
+    print(f"📊 재생 결과 (속도: {speed})")
+    print(f"   이벤트 {report['events']:,}개 / {report['elapsed_s']:.2f}초 ({report['events_per_s']:,.0f}개/초), 최대 지연 {report['max_lag_ms']:.1f}ms")
+    for name, stats in report["latency"].items():
+        service = report["service"][name]
+        print(
+            f"   {name}: {stats['count']:,}개 | 지연 p50 {stats['p50_ms']:.3f}ms p99 {stats['p99_ms']:.3f}ms max {stats['max_ms']:.3f}ms"
+            f" | 처리 p99 {service['p99_ms']:.3f}ms (기록 당시 {report['recorded_service'][name]['p99_ms']:.3f}ms)"
+        )
+    if report["dropped_updates"] is None:
+        print("   누락 갱신: 최대 속도 재생에서는 측정하지 않음")
+    else:
+        print(f"   누락 갱신: {report['dropped_updates']:,}개 ({report['dropped_ratio'] * 100:.2f}%)")
+    print(f"   앱이 보낸 호출: {report['outgoing']} / 기록에 없는 조회: {report['unmatched_calls']:,}회")
+
+
+# ----------------------------------------------------------------------
+# 실행
+# ----------------------------------------------------------------------
+def record_simulated(path, stock_codes, ticks_per_second=2000, duration=5.0, chart_codes=5):
+    """시뮬레이터로 장 시작 체결 폭주 세션을 만들어 기록 (리눅스에서도 동작)"""
+    from kiwoom_filter_stock import Kiwoom
+
+    writer = EventLogWriter(path)
+    control = RecordingControl(SimulatedKiwoomControl(stock_codes), writer)
+    kiwoom = Kiwoom(control=control)
+    kiwoom.login()
+    for stock_code in stock_codes[:chart_codes]:
+        kiwoom.get_stock_data(stock_code, save=False)
+
+    # 100종목씩 화면번호를 나눠 실시간 등록
+    for i in range(0, len(stock_codes), 100):
+        control.dynamicCall(
+            "SetRealReg(QString, QString, QString, QString)", f"{7100 + i // 100}", ";".join(stock_codes[i:i + 100]), "10;15;20", "0"
+        )
+
+    sim = control.control
+    batch = max(1, int(ticks_per_second / 100))
+    end = time.monotonic() + duration
+    while time.monotonic() < end:
+        sim.emit_ticks(batch)
+        sim.process_events()
+        time.sleep(0.01)
+
+    writer.close()
+    print(f"✅ 기록 완료: {path} (이벤트 {writer.counts[KIND_EVENT]:,}개, {os.path.getsize(path):,} bytes)")
+
+
+REPLAY_INPUTS = ("all_stock_codes.json", "filtered_candidates.json", "instrument_master.json")
+
+
+def prepare_replay_dir(source_dir="."):
+    """재생용 작업 디렉터리 (입력 파일은 복사, 일봉 데이터는 읽기만 하므로 링크)
+
+    재생 중 후보군 갱신/체결 처리가 쓰는 filtered_candidates.json, instrument_master.json 등이
+    실제 작업 디렉터리의 파일을 바꾸지 않도록 한다.
+    """
+    from kiwoom_filter_stock import DATA_DIR
+
+    work_dir = tempfile.mkdtemp(prefix="kiwoom_replay_")
+    for name in REPLAY_INPUTS:
+        source = os.path.join(source_dir, name)
+        if os.path.exists(source):
+            shutil.copy(source, work_dir)
+    data_dir = os.path.abspath(os.path.join(source_dir, DATA_DIR))
+    if os.path.isdir(data_dir):
+        try:
+            os.symlink(data_dir, os.path.join(work_dir, DATA_DIR), target_is_directory=True)
+        except OSError:  # 심볼릭 링크 권한이 없는 Windows 등
+            shutil.copytree(data_dir, os.path.join(work_dir, DATA_DIR))
+    return work_dir
+
+
+def replay_into_ui(path, speed):
+    """기록된 로그를 KiwoomUI(+AutoTrader)에 재생 (화면 없이 offscreen으로 실행)
+
+    재생은 임시 작업 디렉터리에서 실행하므로 스냅샷, 주문 기록, 후보군 파일 등 실거래 상태는 바뀌지 않는다.
+    """
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtWidgets import QApplication
+    from kiwoom import KiwoomUI
+
+    path = os.path.abspath(path)
+    app = QApplication.instance() or QApplication(sys.argv)
+    control = ReplayControl()
+    work_dir = prepare_replay_dir()
+    previous_dir = os.getcwd()
+    os.chdir(work_dir)
+    try:
+        ui = KiwoomUI(
+            kiwoom=control,
+            snapshot_path=os.path.join(work_dir, "trading_state.snap"),
+            order_log_path=os.path.join(work_dir, "order_lifecycle.bin"),
+        )
+        report = Replayer(control, read_event_log(path), pump=app.processEvents).run(speed)
+        print_report(report)
+        ui.close()
+    finally:
+        os.chdir(previous_dir)
+    print(f"📁 재생 중 생성된 파일: {work_dir}")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="키움 API 이벤트 기록/재생")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    record_parser = sub.add_parser("record", help="실제 OpenAPI로 KiwoomUI를 실행하며 이벤트 기록")
+    record_parser.add_argument("path")
+
+    sim_parser = sub.add_parser("record-sim", help="시뮬레이터로 체결 폭주 세션 기록")
+    sim_parser.add_argument("path")
+    sim_parser.add_argument("--codes", type=int, default=300, help="실시간 등록 종목 수")
+    sim_parser.add_argument("--tps", type=int, default=2000, help="초당 체결 수")
+    sim_parser.add_argument("--duration", type=float, default=5.0, help="기록 시간(초)")
+
+    replay_parser = sub.add_parser("replay", help="기록된 이벤트를 KiwoomUI에 재생")
+    replay_parser.add_argument("path")
+    replay_parser.add_argument("--speed", default="1", help="재생 배속 (숫자 또는 max)")
+    args = parser.parse_args()
+
+    if args.command == "record":
+        from PyQt5.QtWidgets import QApplication
+        from PyQt5.QAxContainer import QAxWidget
+        from kiwoom import KiwoomUI
+
+        app = QApplication(sys.argv)
+        writer = EventLogWriter(args.path)
+        window = KiwoomUI(kiwoom=RecordingControl(QAxWidget("KHOPENAPI.KHOpenAPICtrl.1"), writer))
+        window.show()
+        code = app.exec_()
+        writer.close()
+        sys.exit(code)
+    elif args.command == "record-sim":
+        with open("all_stock_codes.json", "r", encoding="utf-8") as f:
+            codes = json.load(f)[:args.codes]
+        record_simulated(args.path, codes, ticks_per_second=args.tps, duration=args.duration)
+    else:
+        replay_into_ui(args.path, None if args.speed == "max" else float(args.speed))
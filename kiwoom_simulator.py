@@ -0,0 +1,403 @@
+import time
+import zlib
+import random
+from collections import deque
+from datetime import datetime, timedelta
+
+
+class _Signal:
+    """QAxWidget 이벤트 시그널 흉내 (connect / emit)"""
+    def __init__(self):
+        self._slots = []
+
+    def connect(self, slot):
+        self._slots.append(slot)
+
+    def disconnect(self, slot=None):
+        if slot is None:
+            self._slots.clear()
+        else:
+            self._slots.remove(slot)
+
+    def emit(self, *args):
+        for slot in list(self._slots):
+            slot(*args)
+
+
+def _business_days(end, count):
+    """end 이전(포함) 영업일(주말 제외) count개를 최신순으로 반환"""
+    days = []
+    day = end
+    while len(days) < count:
+        if day.weekday() < 5:
+            days.append(day)
+        day -= timedelta(days=1)
+    return days
+
+
+class SimulatedKiwoomControl:
+    """키움 OpenAPI 컨트롤(QAxWidget)을 흉내 내는 시뮬레이터
+
+    dynamicCall() 시그니처와 OnEventConnect / OnReceiveTrData 등의 이벤트를
+    실제 컨트롤과 같은 모양으로 제공한다. 이벤트는 큐에 쌓였다가
+    process_events()가 호출될 때 전달되므로, 실제 API처럼 요청과 응답이
+    비동기로 동작한다. 시세는 종목코드로 시드를 정한 랜덤워크라 항상 같은 값이 나온다.
+    """
+    SIGNALS = (
+        "OnEventConnect", "OnReceiveTrData", "OnReceiveRealData", "OnReceiveChejanData",
+        "OnReceiveMsg", "OnReceiveConditionVer", "OnReceiveTrCondition", "OnReceiveRealCondition",
+    )
+    DAILY_PAGE_SIZE = 600  # OPT10081 한 번에 내려오는 최대 일봉 수
+    MINUTE_PAGE_SIZE = 900  # OPT10080 한 번에 내려오는 최대 분봉 수
+
+    def __init__(self, stock_codes=None, accounts=("8000000011",), latency=0.0, seed=0):
+        for name in self.SIGNALS:
+            setattr(self, name, _Signal())
+
+        self.stock_codes = list(stock_codes or [])
+        self.accounts = list(accounts)
+        self.latency = latency  # 요청 → 응답 지연(초)
+        self.seed = seed
+        self.rng = random.Random(seed)  # 실시간 이벤트용 (호출마다 새로 만들면 매번 같은 종목/변동이 반복됨)
+        self.connected = False
+        self.dropped = False  # drop_connection() 후 CommConnect 전까지 True
+        self.request_count = 0  # CommRqData 호출 횟수
+
+        self._inputs = {}
+        self._responses = {}  # (trcode, rqname) → {"single": {...}, "multi": [{...}, ...]}
+        self._events = deque()  # (due_time, signal_name, args, response)
+        self._continuations = {}  # (trcode, rqname) → 다음 페이지 시작 인덱스
+        self._daily_cache = {}
+        self._real_screens = {}  # 화면번호 → 실시간 등록 종목 set
+        self._real_data = {}  # 종목코드 → 마지막으로 전달한 실시간 FID 값
+        self._real_prices = {}  # 종목코드 → 실시간 랜덤워크 현재가
+        self._real_volumes = {}  # 종목코드 → 누적거래량
+        self._real_conditions = {}  # 조건명 → (화면번호, 인덱스, 편입 종목 set)
+
+    # ------------------------------------------------------------------
+    # QAxWidget 인터페이스
+    # ------------------------------------------------------------------
+    def dynamicCall(self, signature, *args):
+        """QAxWidget.dynamicCall 흉내 (SendOrder처럼 리스트로 넘긴 인자도 지원)"""
+        if len(args) == 1 and isinstance(args[0], (list, tuple)):
+            args = tuple(args[0])
+        name = signature.split("(", 1)[0]
+        handler = getattr(self, f"_api_{name}", None)
+        if handler is None:
+            return ""
+        return handler(*args)
+
+    def process_events(self):
+        """도착 시간이 지난 이벤트를 모두 전달 (QApplication.processEvents 대응)"""
+        now = time.monotonic()
+        while self._events and self._events[0][0] <= now:
+            _, signal_name, args, response = self._events.popleft()
+            if response is not None:
+                if signal_name == "OnReceiveRealData":
+                    self._real_data[args[0]] = response
+                else:
+                    trcode, rqname = args[2], args[1]
+                    self._responses[(trcode.upper(), rqname)] = response
+            getattr(self, signal_name).emit(*args)
+
+    def _post(self, signal_name, args, response=None):
+        self._events.append((time.monotonic() + self.latency, signal_name, args, response))
+
+    # ------------------------------------------------------------------
+    # 로그인
+    # ------------------------------------------------------------------
+    def _api_CommConnect(self):
+        self.connected = True
+        self.dropped = False
+        self._post("OnEventConnect", (0,))
+        return 0
+
+    def _api_GetConnectState(self):
+        return 1 if self.connected else 0
+
+    def drop_connection(self):
+        """세션 끊김 흉내 (전달 전 이벤트와 서버 쪽 실시간 등록이 사라지고, CommConnect 전까지 요청 실패)"""
+        self.connected = False
+        self.dropped = True
+        self._events.clear()
+        self._real_screens.clear()
+
+    def _api_GetLoginInfo(self, tag):
+        if tag == "ACCNO":
+            return "".join(f"{acc};" for acc in self.accounts)
+        if tag == "ACCOUNT_CNT":
+            return str(len(self.accounts))
+        return ""
+
+    # ------------------------------------------------------------------
+    # 종목 마스터
+    # ------------------------------------------------------------------
+    def _market_of(self, stock_code):
+        return "10" if self._rng(stock_code, "market").random() < 0.55 else "0"
+
+    def _api_GetCodeListByMarket(self, market):
+        return "".join(f"{code};" for code in self.stock_codes if self._market_of(code) == market)
+
+    def _api_GetMasterCodeName(self, stock_code):
+        return f"시뮬{stock_code}"
+
+    def _api_GetMasterLastPrice(self, stock_code):
+        return f"{self.daily_bars(stock_code)[0]['close']:08d}"
+
+    def _api_GetMasterListedStockCnt(self, stock_code):
+        return self._rng(stock_code, "shares").randint(1_000_000, 500_000_000)
+
+    def _api_GetMasterConstruction(self, stock_code):
+        return "투자경고" if self._rng(stock_code, "construction").random() < 0.01 else "정상"
+
+    def _api_GetMasterStockState(self, stock_code):
+        roll = self._rng(stock_code, "state").random()
+        if roll < 0.01:
+            return "증거금100%|거래정지"
+        if roll < 0.03:
+            return "증거금100%|관리종목"
+        return "증거금40%"
+
+    # ------------------------------------------------------------------
+    # TR 조회
+    # ------------------------------------------------------------------
+    def _api_SetInputValue(self, key, value):
+        self._inputs[key] = value
+
+    def _api_CommRqData(self, rqname, trcode, prev_next, screen_no):
+        if self.dropped:
+            return -101  # 서버 접속 실패
+        self.request_count += 1
+        builder = getattr(self, f"_tr_{trcode.upper()}", None)
+        inputs, self._inputs = self._inputs, {}
+        if builder is None:
+            return -1
+        response, has_next = builder(rqname, inputs, int(prev_next))
+        self._post(
+            "OnReceiveTrData",
+            (screen_no, rqname, trcode, "", "2" if has_next else "0", 0, "", "", ""),
+            response,
+        )
+        return 0
+
+    def _api_GetRepeatCnt(self, trcode, rqname):
+        response = self._responses.get((trcode.upper(), rqname))
+        return len(response["multi"]) if response else 0
+
+    def _api_GetCommData(self, trcode, rqname, index, field):
+        response = self._responses.get((trcode.upper(), rqname))
+        if not response:
+            return ""
+        if response["multi"] and index < len(response["multi"]) and field in response["multi"][index]:
+            return response["multi"][index][field]
+        return response["single"].get(field, "")
+
+    def _next_page(self, trcode, rqname, prev_next, total, page_size):
+        """연속조회 페이지 범위 계산"""
+        key = (trcode, rqname)
+        start = self._continuations.get(key, 0) if prev_next == 2 else 0
+        end = min(start + page_size, total)
+        has_next = end < total
+        if has_next:
+            self._continuations[key] = end
+        else:
+            self._continuations.pop(key, None)
+        return start, end, has_next
+
+    def _tr_OPT10081(self, rqname, inputs, prev_next):
+        """주식일봉차트조회"""
+        stock_code = inputs.get("종목코드", "")
+        bars = self.daily_bars(stock_code)
+        start, end, has_next = self._next_page("OPT10081", rqname, prev_next, len(bars), self.DAILY_PAGE_SIZE)
+        multi = [
+            {
+                "일자": bar["date"], "시가": str(bar["open"]), "고가": str(bar["high"]),
+                "저가": str(bar["low"]), "현재가": str(bar["close"]), "거래량": str(bar["volume"]),
+            }
+            for bar in bars[start:end]
+        ]
+        return {"single": {"종목코드": stock_code}, "multi": multi}, has_next
+
+    def _tr_OPT10080(self, rqname, inputs, prev_next):
+        """주식분봉차트조회 (최근 days일, 최신순)"""
+        stock_code = inputs.get("종목코드", "")
+        bars = self.minute_bars(stock_code)
+        start, end, has_next = self._next_page("OPT10080", rqname, prev_next, len(bars), self.MINUTE_PAGE_SIZE)
+        multi = [
+            {
+                "체결시간": bar[0], "시가": f"+{bar[1]}", "고가": f"+{bar[2]}", "저가": f"+{bar[3]}",
+                "현재가": f"+{bar[4]}", "거래량": str(bar[5]),
+            }
+            for bar in bars[start:end]
+        ]
+        return {"single": {"종목코드": stock_code}, "multi": multi}, has_next
+
+    # ------------------------------------------------------------------
+    # 실시간 시세
+    # ------------------------------------------------------------------
+    def _api_SetRealReg(self, screen_no, code_list, fid_list, opt_type):
+        codes = {code for code in code_list.split(";") if code}
+        if opt_type == "0" or screen_no not in self._real_screens:
+            self._real_screens[screen_no] = codes
+        else:
+            self._real_screens[screen_no] |= codes
+        return 0
+
+    def _api_SetRealRemove(self, screen_no, stock_code):
+        screens = list(self._real_screens) if screen_no == "ALL" else [screen_no]
+        for screen in screens:
+            if stock_code == "ALL":
+                self._real_screens.pop(screen, None)
+            else:
+                self._real_screens.get(screen, set()).discard(stock_code)
+
+    def _api_GetCommRealData(self, stock_code, fid):
+        return self._real_data.get(stock_code, {}).get(int(fid), "")
+
+    def real_codes(self):
+        """실시간 등록된 종목코드 (모든 화면 합집합)"""
+        codes = set()
+        for screen_codes in self._real_screens.values():
+            codes |= screen_codes
+        return sorted(codes)
+
+    def emit_ticks(self, count, stock_codes=None, rng=None):
+        """등록 종목(또는 stock_codes)에 대해 주식체결 실시간 이벤트 count개를 큐에 넣음
+
+        장 시작 동시호가 직후처럼 짧은 시간에 몰리는 체결을 흉내 낼 때 사용한다.
+        """
+        codes = list(stock_codes or self.real_codes())
+        if not codes:
+            return 0
+        rng = rng or self.rng
+        now = datetime.now().strftime("%H%M%S")
+        for _ in range(count):
+            stock_code = rng.choice(codes)
+            last = self._real_prices.get(stock_code) or float(self.daily_bars(stock_code)[0]["close"])
+            price = max(1.0, last * (1 + rng.gauss(0, 0.002)))
+            volume = rng.randint(1, 500)
+            self._real_prices[stock_code] = price
+            self._real_volumes[stock_code] = self._real_volumes.get(stock_code, 0) + volume
+            sign = "+" if price >= last else "-"
+            self._post("OnReceiveRealData", (stock_code, "주식체결", ""), {
+                10: f"{sign}{int(price)}", 13: str(self._real_volumes[stock_code]), 15: f"{sign}{volume}", 20: now,
+            })
+        return count
+
+    # ------------------------------------------------------------------
+    # 조건검색
+    # ------------------------------------------------------------------
+    CONDITIONS = ("골든크로스", "거래량급증")  # 사용자가 저장해 둔 조건식 흉내
+
+    def _api_GetConditionLoad(self):
+        self._post("OnReceiveConditionVer", (1, "조건검색식 로드 완료"))
+        return 1
+
+    def _api_GetConditionNameList(self):
+        return "".join(f"{i:03d}^{name};" for i, name in enumerate(self.CONDITIONS))
+
+    def _api_SendCondition(self, screen_no, condition_name, index, search):
+        if condition_name not in self.CONDITIONS:
+            return 0
+        self.request_count += 1
+        codes = [code for code in self.stock_codes if self.matches_condition(condition_name, code)]
+        if int(search) == 1:
+            self._real_conditions[condition_name] = (screen_no, int(index), set(codes))
+        self._post("OnReceiveTrCondition", (screen_no, "".join(f"{c};" for c in codes), condition_name, int(index), 0))
+        return 1
+
+    def _api_SendConditionStop(self, screen_no, condition_name, index):
+        self._real_conditions.pop(condition_name, None)
+
+    def matches_condition(self, condition_name, stock_code):
+        """조건식 판정 (일봉 기준)"""
+        bars = self.daily_bars(stock_code)
+        closes = [bar["close"] for bar in reversed(bars[:35])]  # 오래된 순
+        if condition_name == "골든크로스":  # 최근 15일 이내 5일선이 20일선을 상향 돌파
+            def ma(window, end):
+                return sum(closes[end - window:end]) / window
+            n = len(closes)
+            for i in range(1, 16):
+                if ma(5, n - i) < ma(20, n - i) and ma(5, n - i + 1) > ma(20, n - i + 1):
+                    return True
+            return False
+        if condition_name == "거래량급증":  # 당일 거래량이 직전 5일 평균의 2배 이상
+            volumes = [bar["volume"] for bar in bars[:6]]
+            return volumes[0] >= 2 * sum(volumes[1:]) / 5
+        return False
+
+    def emit_condition_events(self, count, rng=None):
+        """실시간 조건검색 편입(I)/이탈(D) 이벤트 count개를 큐에 넣음"""
+        if not self._real_conditions or not self.stock_codes:
+            return 0
+        rng = rng or self.rng
+        for _ in range(count):
+            condition_name = rng.choice(sorted(self._real_conditions))
+            _, index, matched = self._real_conditions[condition_name]
+            stock_code = rng.choice(self.stock_codes)
+            if stock_code in matched:
+                matched.discard(stock_code)
+                event_type = "D"
+            else:
+                matched.add(stock_code)
+                event_type = "I"
+            self._post("OnReceiveRealCondition", (stock_code, event_type, condition_name, f"{index:03d}"))
+        return count
+
+    # ------------------------------------------------------------------
+    # 시세 생성
+    # ------------------------------------------------------------------
+    def _rng(self, stock_code, salt=""):
+        return random.Random(zlib.crc32(f"{self.seed}:{stock_code}:{salt}".encode()))
+
+    def base_price(self, stock_code):
+        """종목별 기준가 (1,000원 ~ 300,000원)"""
+        rng = self._rng(stock_code, "base")
+        return int(10 ** rng.uniform(3, 5.5))
+
+    def daily_bars(self, stock_code, count=240):
+        """최신순 일봉 (date, open, high, low, close, volume)"""
+        if stock_code in self._daily_cache:
+            return self._daily_cache[stock_code]
+
+        rng = self._rng(stock_code, "daily")
+        days = _business_days(datetime.today() - timedelta(days=1), count)
+        price = float(self.base_price(stock_code))
+        base_volume = rng.uniform(5e4, 2e6)
+        bars = []
+        for day in reversed(days):
+            open_price = price
+            price = max(100.0, price * (1 + rng.gauss(0.0005, 0.02)))
+            high = max(open_price, price) * (1 + abs(rng.gauss(0, 0.005)))
+            low = min(open_price, price) * (1 - abs(rng.gauss(0, 0.005)))
+            bars.append({
+                "date": day.strftime("%Y%m%d"),
+                "open": int(open_price), "high": int(high), "low": int(low), "close": int(price),
+                "volume": int(base_volume * rng.uniform(0.3, 2.5)),
+            })
+        bars.reverse()
+        self._daily_cache[stock_code] = bars
+        return bars
+
+    def minute_bars(self, stock_code, days=20):
+        """최신순 1분봉 (체결시간, 시가, 고가, 저가, 종가, 거래량), 하루 09:00~15:30"""
+        daily = self.daily_bars(stock_code)[:days]
+        bars = []
+        for day in reversed(daily):
+            rng = self._rng(stock_code, day["date"])
+            price = float(day["open"])
+            # 장중 가격이 일봉 종가로 수렴하도록 매 분 목표가 쪽으로 당김
+            for minute in range(9 * 60, 15 * 60 + 31):
+                open_price = price
+                remaining = 15 * 60 + 31 - minute
+                price += (day["close"] - price) / remaining + rng.gauss(0, price * 0.001)
+                price = max(price, 1.0)
+                high = max(open_price, price) * (1 + abs(rng.gauss(0, 0.0005)))
+                low = min(open_price, price) * (1 - abs(rng.gauss(0, 0.0005)))
+                bars.append((
+                    f"{day['date']}{minute // 60:02d}{minute % 60:02d}00",
+                    int(open_price), int(high), int(low), int(price),
+                    int(day["volume"] / 381 * rng.uniform(0.2, 2.0)),
+                ))
+        bars.reverse()
+        return bars
@@ -0,0 +1,89 @@
+import os
+import sys
+import json
+import time
+import zlib
+import struct
+import tempfile
+import numpy as np
+
+
+SNAPSHOT_PATH = "trading_state.snap"
+MAGIC = b"KSN1"
+HEADER = struct.Struct("<dI")  # 저장 시각(time.time), 압축된 본문 길이
+
+
+def to_plain(value):
+    """numpy 스칼라/배열과 튜플을 JSON으로 바로 쓸 수 있는 기본 타입으로 (dict/list는 재귀)"""
+    if isinstance(value, dict):
+        return {str(k): to_plain(v) for k, v in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_plain(v) for v in value]
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    return value
+
+
+def save_snapshot(state, path=SNAPSHOT_PATH):
+    """거래 상태 dict를 압축 바이너리로 원자적으로 저장 → 저장한 바이트 수
+
+    임시 파일에 쓴 뒤 교체하므로 저장 도중 프로그램이 죽어도 이전 스냅샷이 남는다.
+    """
+    body = zlib.compress(json.dumps(state, ensure_ascii=False, separators=(",", ":")).encode("utf-8"), 6)
+    data = MAGIC + HEADER.pack(time.time(), len(body)) + body
+
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".snapshot.", suffix=".tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return len(data)
+
+
+def load_snapshot(path=SNAPSHOT_PATH):
+    """저장된 거래 상태 → (dict, 저장 시각), 없거나 깨졌으면 (None, 0.0)"""
+    try:
+        with open(path, "rb") as f:
+            data = f.read()
+    except FileNotFoundError:
+        return None, 0.0
+
+    header_end = len(MAGIC) + HEADER.size
+    if data[:len(MAGIC)] != MAGIC or len(data) < header_end:
+        print(f"⚠️ 스냅샷 형식 오류: {path}")
+        return None, 0.0
+    saved_at, length = HEADER.unpack_from(data, len(MAGIC))
+    try:
+        state = json.loads(zlib.decompress(data[header_end:header_end + length]).decode("utf-8"))
+    except (zlib.error, ValueError):
+        print(f"⚠️ 스냅샷 손상: {path}")
+        return None, 0.0
+    return state, saved_at
+
+
+def is_same_trading_day(saved_at, now=None):
+    """스냅샷이 오늘 저장된 것인지 (후보군의 20이평 기준일이 같은지)"""
+    now = time.time() if now is None else now
+    return time.strftime("%Y%m%d", time.localtime(saved_at)) == time.strftime("%Y%m%d", time.localtime(now))
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else SNAPSHOT_PATH
+    state, saved_at = load_snapshot(path)
+    if state is None:
+        print(f"❌ 스냅샷 없음: {path}")
+        sys.exit(1)
+    print(f"📦 {path} ({os.path.getsize(path):,} bytes, 저장 {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(saved_at))})")
+    print(f"   후보군 {len(state.get('candidates', []))}개 종목")
+    for account_number, account in state.get("accounts", {}).items():
+        print(
+            f"   계좌 {account_number}: 잔액 {account.get('balance')}, 보유 {len(account.get('holdings', []))}개, "
+            f"체결 대기 {len(account.get('pending_orders', {}))}개, 원장 {len(account.get('ledger', []))}건"
+        )
@@ -0,0 +1,292 @@
+import os
+import sys
+import json
+import time
+import argparse
+import numpy as np
+from multiprocessing import shared_memory
+
+
+TAPE_NAME = "kiwoom_tape"
+MAGIC = b"KTP1"
+HEADER_DTYPE = np.dtype([
+    ("magic", "S4"), ("n_slots", "<u4"),
+    ("ticks", "<u8"),  # 지금까지 반영한 체결 수
+    ("updated_at", "<f8"),  # 마지막 반영 시각 (time.time)
+    ("writer_pid", "<u8"),
+])
+CODE_DTYPE = np.dtype("S8")  # 종목코드 (6자리, 8바이트 정렬)
+ROW_DTYPE = np.dtype([
+    ("seq", "<u4"),  # seqlock 번호 (홀수면 쓰는 중)
+    ("price", "<i4"),  # 현재가
+    ("volume", "<i8"),  # 누적거래량
+    ("time", "<i4"),  # 체결시간 HHMMSS
+    ("pad", "<i4"),
+])
+
+SCREEN_BASE = 8000  # 전종목 실시간 화면번호 시작 (UI가 쓰는 2000~7000번대와 겹치지 않게)
+CODES_PER_SCREEN = 100  # SetRealReg 한 번에 등록 가능한 최대 종목 수
+MAX_SCREENS = 150  # 화면번호 최대 200개 중 UI/조회용으로 남겨 둘 만큼 제외
+TAPE_FIDS = "10;13;20"  # 현재가, 누적거래량, 체결시간
+
+
+def _layout(n_slots):
+    """(코드 영역 오프셋, 행 영역 오프셋, 전체 크기)"""
+    code_offset = HEADER_DTYPE.itemsize
+    row_offset = code_offset + CODE_DTYPE.itemsize * n_slots
+    return code_offset, row_offset, row_offset + ROW_DTYPE.itemsize * n_slots
+
+
+def _untracked(shm):
+    """resource_tracker 등록 해제 (읽는 프로세스가 끝날 때 테이프를 지우지 않도록, 삭제는 close()에서 직접)"""
+    if os.name == "posix":  # 윈도우는 마지막 핸들이 닫힐 때 운영체제가 정리
+        from multiprocessing import resource_tracker
+        resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+class UniverseTape:
+    """전종목 실시간 시세를 담는 공유 메모리 배열
+
+    헤더 / 종목코드 배열 / 시세 행(seq, 현재가, 누적거래량, 체결시간)이 고정
+    배치로 들어 있어, 다른 프로세스는 이름만으로 붙어서 복사 없이 읽는다.
+    쓰는 쪽은 하나(피더)뿐이고, 행마다 seqlock 번호를 두어 읽는 쪽은 잠금 없이
+    번호가 짝수이고 읽기 전후가 같을 때만 값을 채택한다.
+    """
+    def __init__(self, shm, owner):
+        self.shm = shm
+        self.owner = owner
+        n_slots = int(np.ndarray((), HEADER_DTYPE, shm.buf)["n_slots"])
+        code_offset, row_offset, _ = _layout(n_slots)
+
+        self.header = np.ndarray((), HEADER_DTYPE, shm.buf)
+        self.codes = np.ndarray((n_slots,), CODE_DTYPE, shm.buf, offset=code_offset)
+        self.rows = np.ndarray((n_slots,), ROW_DTYPE, shm.buf, offset=row_offset)
+        self.slots = {code.decode(): i for i, code in enumerate(self.codes.tolist())}  # 종목코드 → 행 번호
+
+    @classmethod
+    def create(cls, stock_codes, name=TAPE_NAME):
+        """피더 프로세스에서 테이프 생성 (같은 이름이 남아 있으면 지우고 새로 만듦)"""
+        stock_codes = sorted(set(stock_codes))
+        size = _layout(len(stock_codes))[2]
+        try:
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:  # 피더가 비정상 종료해 남은 테이프
+            stale = shared_memory.SharedMemory(name=name)
+            stale.close()
+            stale.unlink()
+            shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        shm = _untracked(shm)
+
+        header = np.ndarray((), HEADER_DTYPE, shm.buf)
+        header["magic"] = MAGIC
+        header["n_slots"] = len(stock_codes)
+        header["ticks"] = 0
+        header["updated_at"] = 0.0
+        header["writer_pid"] = 0
+        code_offset, row_offset, _ = _layout(len(stock_codes))
+        np.ndarray((len(stock_codes),), CODE_DTYPE, shm.buf, offset=code_offset)[:] = [c.encode() for c in stock_codes]
+        np.ndarray((len(stock_codes),), ROW_DTYPE, shm.buf, offset=row_offset)[:] = 0
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name=TAPE_NAME):
+        """스크리너/백테스터/분석 프로세스에서 읽기용으로 붙음"""
+        shm = _untracked(shared_memory.SharedMemory(name=name))
+        if bytes(np.ndarray((), HEADER_DTYPE, shm.buf)["magic"]) != MAGIC:
+            shm.close()
+            raise ValueError(f"{name}: 실시간 테이프 형식이 아닙니다.")
+        return cls(shm, owner=False)
+
+    def __len__(self):
+        return len(self.rows)
+
+    # ------------------------------------------------------------------
+    # 쓰기 (피더 한 곳에서만)
+    # ------------------------------------------------------------------
+    def write(self, slots, prices, volumes, times):
+        """행 묶음을 seqlock으로 갱신 (같은 행이 여러 번 있으면 마지막 값)"""
+        slots = np.asarray(slots, dtype=np.int64)
+        if slots.size == 0:
+            return
+        # 뒤에서부터 처음 나온 행 = 마지막 체결
+        _, last = np.unique(slots[::-1], return_index=True)
+        pick = slots.size - 1 - last
+        slots = slots[pick]
+
+        seq = self.rows["seq"]
+        seq[slots] += 1  # 홀수: 쓰는 중
+        self.rows["price"][slots] = np.asarray(prices)[pick]
+        self.rows["volume"][slots] = np.asarray(volumes)[pick]
+        self.rows["time"][slots] = np.asarray(times)[pick]
+        seq[slots] += 1  # 짝수: 완료
+
+        self.header["ticks"] += len(pick)
+        self.header["updated_at"] = time.time()
+
+    # ------------------------------------------------------------------
+    # 읽기 (잠금 없음)
+    # ------------------------------------------------------------------
+    def read(self, stock_code):
+        """한 종목 (현재가, 누적거래량, 체결시간), 등록되지 않은 종목이면 None"""
+        slot = self.slots.get(stock_code)
+        if slot is None:
+            return None
+        row = self.rows[slot:slot + 1]
+        while True:
+            before = int(row["seq"][0])
+            value = row.copy()[0]
+            if before % 2 == 0 and before == int(row["seq"][0]):
+                return int(value["price"]), int(value["volume"]), int(value["time"])
+            time.sleep(0)
+
+    def snapshot(self, timeout=1.0):
+        """전종목 일관된 복사본 (쓰는 중이던 행만 다시 읽음)"""
+        before = self.rows["seq"].copy()
+        data = self.rows.copy()
+        deadline = time.monotonic() + timeout
+        while True:
+            torn = np.flatnonzero((before % 2 == 1) | (before != self.rows["seq"]))
+            if torn.size == 0:
+                return data
+            if time.monotonic() > deadline:
+                raise RuntimeError("실시간 테이프 스냅샷 실패 (쓰기가 계속 겹침)")
+            time.sleep(0)  # 피더가 쓰기를 마칠 틈을 줌
+            before[torn] = self.rows["seq"][torn]
+            data[torn] = self.rows[torn]
+
+    def prices(self):
+        """현재가 배열 뷰 (복사 없음, 행 단위 일관성은 snapshot()으로)"""
+        return self.rows["price"]
+
+    def close(self):
+        # numpy 뷰가 버퍼를 잡고 있으면 close가 실패하므로 먼저 놓음
+        self.header = self.codes = self.rows = None
+        self.shm.close()
+        if self.owner:
+            if os.name == "posix":  # unlink()가 등록 해제를 한 번 더 하므로 짝을 맞춤
+                from multiprocessing import resource_tracker
+                resource_tracker.register(self.shm._name, "shared_memory")
+            self.shm.unlink()
+
+
+class TapeFeeder:
+    """전종목을 실시간 등록하고 체결을 UniverseTape에 기록
+
+    체결 이벤트는 리스트에 모았다가 batch_size개가 되거나 max_delay초가
+    지나면 한 번에 write()하므로, 장 시작 직후처럼 체결이 몰려도 이벤트당
+    비용은 GetCommRealData 호출 몇 번에 그친다.
+    """
+    def __init__(self, kiwoom, tape, screen_base=SCREEN_BASE, max_screens=MAX_SCREENS,
+                 batch_size=512, max_delay=0.05):
+        self.kiwoom = kiwoom  # 키움 컨트롤 (QAxWidget / 시뮬레이터 / 재생 컨트롤)
+        self.tape = tape
+        self.screen_base = screen_base
+        self.max_screens = max_screens
+        self.batch_size = batch_size
+        self.max_delay = max_delay
+        self.screens = []
+        self._slots, self._prices, self._volumes, self._times = [], [], [], []
+        self._last_flush = time.monotonic()
+        self.kiwoom.OnReceiveRealData.connect(self.on_receive_real_data)
+
+    def subscribe(self):
+        """테이프의 전종목을 화면번호당 100종목씩 실시간 등록"""
+        codes = [code.decode() for code in self.tape.codes.tolist()]
+        capacity = self.max_screens * CODES_PER_SCREEN
+        if len(codes) > capacity:
+            print(f"⚠️ 화면 수 제한으로 {len(codes)}개 중 {capacity}개만 등록합니다.")
+            codes = codes[:capacity]
+
+        for i in range(0, len(codes), CODES_PER_SCREEN):
+            screen_no = f"{self.screen_base + i // CODES_PER_SCREEN:04d}"
+            # "1": 다른 화면의 기존 등록(보유 종목/후보군)을 유지한 채 추가
+            self.kiwoom.dynamicCall(
+                "SetRealReg(QString, QString, QString, QString)",
+                screen_no, ";".join(codes[i:i + CODES_PER_SCREEN]), TAPE_FIDS, "1",
+            )
+            self.screens.append(screen_no)
+        print(f"📡 전종목 실시간 등록: {len(codes)}개 종목, 화면 {len(self.screens)}개")
+
+    def unsubscribe(self):
+        for screen_no in self.screens:
+            self.kiwoom.dynamicCall("SetRealRemove(QString, QString)", screen_no, "ALL")
+        self.screens = []
+
+    def on_receive_real_data(self, stock_code, real_type, real_data):
+        if real_type != "주식체결":
+            return
+        slot = self.tape.slots.get(stock_code)
+        if slot is None:
+            return
+
+        price = self.kiwoom.dynamicCall("GetCommRealData(QString, int)", stock_code, 10).strip()
+        if not price:
+            return
+        self._slots.append(slot)
+        self._prices.append(abs(int(price)))
+        self._volumes.append(abs(int(self.kiwoom.dynamicCall("GetCommRealData(QString, int)", stock_code, 13).strip() or 0)))
+        self._times.append(int(self.kiwoom.dynamicCall("GetCommRealData(QString, int)", stock_code, 20).strip() or 0))
+
+        if len(self._slots) >= self.batch_size:
+            self.flush()
+
+    def flush_if_due(self):
+        if self._slots and time.monotonic() - self._last_flush >= self.max_delay:
+            self.flush()
+
+    def flush(self):
+        """모인 체결을 테이프에 반영"""
+        if self._slots:
+            self.tape.write(self._slots, self._prices, self._volumes, self._times)
+            self._slots, self._prices, self._volumes, self._times = [], [], [], []
+        self._last_flush = time.monotonic()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="전종목 실시간 테이프 (공유 메모리)")
+    parser.add_argument("--sim", action="store_true", help="키움 API 대신 시뮬레이터 사용")
+    parser.add_argument("--name", default=TAPE_NAME, help="공유 메모리 이름")
+    parser.add_argument("--read", nargs="*", metavar="CODE", help="피더 대신 테이프를 읽어 출력")
+    args = parser.parse_args()
+
+    if args.read is not None:
+        tape = UniverseTape.attach(args.name)
+        rows = tape.snapshot()
+        print(f"📊 체결 {int(tape.header['ticks']):,}건 반영, 종목 {len(tape)}개")
+        for code in args.read or [c.decode() for c in tape.codes.tolist()[:10]]:
+            slot = tape.slots.get(code)
+            if slot is not None:
+                print(f"   {code}: 현재가 {rows['price'][slot]:,} / 누적거래량 {rows['volume'][slot]:,} / {rows['time'][slot]:06d}")
+        tape.close()
+        sys.exit(0)
+
+    from kiwoom_filter_stock import Kiwoom
+
+    with open("all_stock_codes.json", "r", encoding="utf-8") as f:
+        stock_list = json.load(f)
+
+    if args.sim:
+        from kiwoom_simulator import SimulatedKiwoomControl
+        kiwoom = Kiwoom(control=SimulatedKiwoomControl(stock_list))
+    else:
+        kiwoom = Kiwoom()
+    kiwoom.login()
+
+    tape = UniverseTape.create(stock_list, name=args.name)
+    tape.header["writer_pid"] = os.getpid()
+    feeder = TapeFeeder(kiwoom.kiwoom, tape)
+    feeder.subscribe()
+
+    try:
+        while True:
+            if args.sim:
+                kiwoom.kiwoom.emit_ticks(200)
+            kiwoom.process_events()
+            feeder.flush_if_due()
+            time.sleep(0.005)
+    except KeyboardInterrupt:
+        feeder.flush()
+        feeder.unsubscribe()
+        tape.close()
+        print("🛑 실시간 테이프 종료")
@@ -0,0 +1,185 @@
+import json
+import time
+import argparse
+import numpy as np
+import pandas as pd
+
+from kiwoom_price_store import PriceStore, PANEL_COLUMNS
+
+
+PERIODS = ("D", "W", "M")  # 일봉, 주봉(월요일 시작), 월봉
+
+
+def period_ids(dates, period):
+    """YYYYMMDD 정수 배열 → 기간 번호 (같은 주/월이면 같은 번호, 시간 순으로 증가)"""
+    dates = np.asarray(dates, dtype=np.int64)
+    if period == "D":
+        return dates
+    if period == "M":
+        return dates // 100  # YYYYMM
+    years = (dates // 10000 - 1970).astype("datetime64[Y]")
+    days = (years.astype("datetime64[M]") + (dates // 100 % 100 - 1)).astype("datetime64[D]") + (dates % 100 - 1)
+    return (days.astype(np.int64) + 3) // 7  # 1970-01-01(목) 기준, 월요일에 바뀜
+
+
+def aggregate(dates, panel, period):
+    """일봉 패널을 기간 단위 OHLCV로 (전 종목 한 번에)
+
+    panel: {컬럼: 종목 × 날짜 2차원 배열, 없는 날은 nan}
+    반환: {"ids", "dates"(기간 마지막 거래일), 컬럼: 종목 × 기간 배열}
+    시가는 기간 첫 거래일, 종가는 마지막 거래일 값이며 거래가 없던 기간은 nan.
+    """
+    ids = period_ids(dates, period)
+    n_codes, n_days = panel["close"].shape
+    if n_days == 0:
+        return {"ids": ids, "dates": np.asarray(dates), **{c: np.zeros((n_codes, 0)) for c in PANEL_COLUMNS}}
+
+    starts = np.flatnonzero(np.r_[True, ids[1:] != ids[:-1]])
+    ends = np.r_[starts[1:], n_days] - 1
+    valid = ~np.isnan(panel["close"])
+    day_index = np.broadcast_to(np.arange(n_days), valid.shape)
+    first = np.minimum.reduceat(np.where(valid, day_index, n_days), starts, axis=1)
+    last = np.maximum.reduceat(np.where(valid, day_index, -1), starts, axis=1)
+    traded = last >= 0
+    rows = np.arange(n_codes)[:, None]
+
+    high = np.maximum.reduceat(np.where(valid, panel["high"], -np.inf), starts, axis=1)
+    low = np.minimum.reduceat(np.where(valid, panel["low"], np.inf), starts, axis=1)
+    volume = np.add.reduceat(np.where(valid, panel["volume"], 0.0), starts, axis=1)
+    return {
+        "ids": ids[starts],
+        "dates": np.asarray(dates)[ends],
+        "open": np.where(traded, panel["open"][rows, np.minimum(first, n_days - 1)], np.nan),
+        "high": np.where(traded, high, np.nan),
+        "low": np.where(traded, low, np.nan),
+        "close": np.where(traded, panel["close"][rows, np.maximum(last, 0)], np.nan),
+        "volume": np.where(traded, volume, np.nan),
+    }
+
+
+def rolling_mean(values, window):
+    """시간 축(마지막 축) 이동평균 (창 안에 nan이 있으면 nan)"""
+    filled = np.nan_to_num(values)
+    cumsum = np.cumsum(filled, axis=-1)
+    counts = np.cumsum(~np.isnan(values), axis=-1)
+    cumsum[..., window:] = cumsum[..., window:] - cumsum[..., :-window]
+    counts[..., window:] = counts[..., window:] - counts[..., :-window]
+    result = cumsum / window
+    result[counts < window] = np.nan
+    return result
+
+
+class MultiTimeframe:
+    """저장된 일봉에서 주봉/월봉 OHLCV를 전 종목 한 번에 만들어 캐시
+
+    OPT10082(주봉)/OPT10083(월봉) TR 없이 일봉 패널만으로 계산한다.
+    append_day()로 새 일봉이 들어오면 전체를 다시 계산하지 않고 캐시된
+    주봉/월봉의 마지막(진행 중) 기간만 다시 계산하거나 새 기간을 붙인다.
+    """
+    def __init__(self, codes, dates, daily):
+        self.codes = list(codes)
+        self.index = {code: i for i, code in enumerate(self.codes)}
+        self.dates = np.asarray(dates, dtype=np.int64)
+        self.daily = daily  # {컬럼: 종목 × 날짜}
+        self._cache = {}  # 기간 → aggregate() 결과
+
+    @classmethod
+    def from_store(cls, stock_codes, store=None):
+        return cls(*(store or PriceStore()).load_panel(stock_codes))
+
+    def series(self, period):
+        """기간별 OHLCV {"ids", "dates", 컬럼: 종목 × 기간} (처음 한 번만 계산)"""
+        if period == "D":
+            return {"ids": self.dates, "dates": self.dates, **self.daily}
+        bars = self._cache.get(period)
+        if bars is None:
+            bars = self._cache[period] = aggregate(self.dates, self.daily, period)
+        return bars
+
+    def append_day(self, date, bars):
+        """새 일봉 반영 (같은 날짜면 교체) → 캐시는 마지막 기간만 갱신
+
+        bars: {종목코드: {"open", "high", "low", "close", "volume"}} (없는 종목은 거래 없음)
+        """
+        column = {c: np.full(len(self.codes), np.nan) for c in PANEL_COLUMNS}
+        for stock_code, bar in bars.items():
+            i = self.index.get(stock_code)
+            if i is not None:
+                for c in PANEL_COLUMNS:
+                    column[c][i] = bar[c]
+
+        if len(self.dates) and self.dates[-1] == date:
+            for c in PANEL_COLUMNS:
+                self.daily[c][:, -1] = column[c]
+        else:
+            self.dates = np.r_[self.dates, date]
+            for c in PANEL_COLUMNS:
+                self.daily[c] = np.concatenate([self.daily[c], column[c][:, None]], axis=1)
+
+        for period, cached in self._cache.items():
+            self._refresh_tail(period, cached)
+
+    def _refresh_tail(self, period, cached):
+        ids = period_ids(self.dates, period)
+        start = int(np.searchsorted(ids, ids[-1]))
+        tail = aggregate(self.dates[start:], {c: self.daily[c][:, start:] for c in PANEL_COLUMNS}, period)
+        if len(cached["ids"]) and cached["ids"][-1] == tail["ids"][0]:
+            for key in ("dates",) + PANEL_COLUMNS:
+                cached[key][..., -1] = tail[key][..., 0]
+        else:
+            for key in ("ids", "dates") + PANEL_COLUMNS:
+                cached[key] = np.concatenate([cached[key], tail[key]], axis=-1)
+
+    def ma(self, period, window, column="close"):
+        """기간별 이동평균 (종목 × 기간)"""
+        return rolling_mean(self.series(period)[column], window)
+
+    def frame(self, stock_code, period="W"):
+        """한 종목의 기간별 OHLCV DataFrame (stock_data/*.json 일봉과 같은 컬럼, 오래된 순)
+
+        filter_candidates()처럼 종목별 DataFrame으로 규칙을 쓰는 코드에서 바로 사용할 수 있다.
+        """
+        bars = self.series(period)
+        i = self.index[stock_code]
+        df = pd.DataFrame({"date": bars["dates"].astype(str), **{c: bars[c][i] for c in PANEL_COLUMNS}})
+        return df.dropna(subset=["close"]).reset_index(drop=True)
+
+
+def trend_confirmed(frames, weekly_window=10, monthly_window=6):
+    """주봉/월봉 추세 확인 (종목 순서대로 bool 배열)
+
+    - 주봉 종가가 주봉 이평 위이고, 주봉 이평이 직전 주보다 올라가는 중
+    - 월봉 종가가 월봉 이평 위
+    진행 중인 이번 주/이번 달 봉까지 포함해 판단한다.
+    """
+    weekly_close = frames.series("W")["close"]
+    weekly_ma = frames.ma("W", weekly_window)
+    monthly_close = frames.series("M")["close"]
+    monthly_ma = frames.ma("M", monthly_window)
+    if weekly_ma.shape[1] < 2 or monthly_ma.shape[1] < 1:
+        return np.zeros(len(frames.codes), dtype=bool)
+
+    with np.errstate(invalid="ignore"):
+        weekly_ok = (weekly_close[:, -1] >= weekly_ma[:, -1]) & (weekly_ma[:, -1] > weekly_ma[:, -2])
+        monthly_ok = monthly_close[:, -1] >= monthly_ma[:, -1]
+    return weekly_ok & monthly_ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="일봉 → 주봉/월봉 집계 (전 종목)")
+    parser.add_argument("codes", nargs="*", help="종목코드 (기본값: all_stock_codes.json)")
+    parser.add_argument("--data-dir", default="stock_data")
+    args = parser.parse_args()
+
+    stock_list = args.codes or json.load(open("all_stock_codes.json", "r", encoding="utf-8"))
+
+    started = time.perf_counter()
+    frames = MultiTimeframe.from_store(stock_list, PriceStore(args.data_dir))
+    loaded = time.perf_counter()
+    weekly, monthly = frames.series("W"), frames.series("M")
+    aggregated = time.perf_counter()
+    confirmed = trend_confirmed(frames)
+
+    print(f"📊 {len(frames.codes)}개 종목 × 일봉 {len(frames.dates)}일 → 주봉 {len(weekly['ids'])}개 / 월봉 {len(monthly['ids'])}개")
+    print(f"⏱ 패널 로드 {(loaded - started) * 1000:.0f}ms, 주봉/월봉 집계 {(aggregated - loaded) * 1000:.1f}ms")
+    print(f"✅ 주봉/월봉 추세 확인 통과: {int(confirmed.sum())}개 종목")
@@ -0,0 +1,132 @@
+import time
+
+
+RQNAME_SEPARATOR = ":"
+
+
+def make_rqname(base, context):
+    """rqname에 계좌번호 등 문맥을 붙임 (응답이 어느 계좌 것인지 구분)"""
+    return f"{base}{RQNAME_SEPARATOR}{context}" if context else base
+
+
+def split_rqname(rqname):
+    """make_rqname의 역: (기본 rqname, 문맥)"""
+    base, _, context = rqname.partition(RQNAME_SEPARATOR)
+    return base, context
+
+
+class _Entry:
+    __slots__ = ("result", "received_at", "waiters", "sent_at", "inflight", "stale")
+
+    def __init__(self):
+        self.result = None
+        self.received_at = 0.0
+        self.waiters = None  # 응답 대기 중인 콜백 리스트 (요청 중이 아니면 None)
+        self.sent_at = 0.0
+        self.inflight = 0  # 보냈지만 아직 응답이 오지 않은 요청 수
+        self.stale = 0  # 그중 무효화 전에 보낸 요청 수 (응답은 순서대로 오므로 먼저 오는 응답부터 해당)
+
+    def mark_stale(self):
+        """지금 나가 있는 요청의 응답은 무효화 전 데이터 → 기다리던 콜백은 다음 요청의 응답을 받음"""
+        if self.waiters is not None:
+            self.stale = self.inflight
+            self.sent_at = float("-inf")
+
+
+class AccountTRCache:
+    """계좌 TR(OPW00001/OPW00018/OPW00004) 요청 합치기 + TTL 캐시
+
+    - 같은 (TR, 계좌) 요청이 이미 나가 있으면 새 요청을 보내지 않고 응답을 같이 기다린다.
+    - 응답은 ttl초 동안 캐시되어, 그 사이 요청은 TR 없이 바로 콜백된다.
+    - 체결(Chejan) 이벤트가 오면 invalidate()로 해당 계좌 캐시를 버린다. 그때 이미 나가 있던 요청의
+      응답은 체결 전 데이터이므로 공유하지 않고, 이후 요청은 새로 보낸다.
+    """
+    def __init__(self, ttl=3.0, inflight_timeout=10.0, clock=time.monotonic):
+        self.ttl = ttl
+        self.inflight_timeout = inflight_timeout  # 응답이 오지 않는 요청을 포기하는 시간
+        self.clock = clock
+        self.entries = {}  # (trcode, 계좌번호) → _Entry
+        self.stats = {"sent": 0, "coalesced": 0, "cache_hits": 0}
+
+    def request(self, trcode, account, send, callback=None, force=False):
+        """캐시/진행 중 요청을 우선 사용하고, 필요할 때만 send()로 TR 전송
+
+        send: TR을 보내고 CommRqData 반환값을 돌려주는 함수
+        callback: 응답(TRResult)을 받을 함수
+        반환: 실제로 TR을 보냈으면 True
+        """
+        key = (trcode, account)
+        entry = self.entries.setdefault(key, _Entry())
+        now = self.clock()
+
+        inflight = entry.waiters is not None and now - entry.sent_at < self.inflight_timeout
+        if inflight and not force:
+            if callback is not None:
+                entry.waiters.append(callback)
+            self.stats["coalesced"] += 1
+            return False
+
+        if not force and entry.result is not None and now - entry.received_at < self.ttl:
+            self.stats["cache_hits"] += 1
+            # 전송 실패 등으로 남아 있던 콜백도 같은 캐시 응답으로 함께 처리
+            waiters, entry.waiters = entry.waiters or [], None
+            for waiter in waiters + ([callback] if callback is not None else []):
+                waiter(entry.result)
+            return False
+
+        if inflight:  # force: 나가 있는 요청의 응답은 이번 요청보다 오래된 데이터
+            entry.mark_stale()
+        elif entry.waiters is not None and entry.sent_at != float("-inf"):
+            entry.inflight = entry.stale = 0  # 응답 없이 inflight_timeout이 지난 요청은 잃어버린 것으로 봄
+
+        # 응답이 오지 않은 이전 요청의 콜백도 이번 응답으로 같이 받음
+        entry.waiters = (entry.waiters or []) + ([callback] if callback is not None else [])
+        entry.sent_at = now
+        ret = send()
+        if ret is not None and ret != 0:  # 요청 실패 → 다음 호출에서 다시 보낼 수 있게
+            print(f"❌ {trcode} 요청 실패 (반환값: {ret})")
+            # 기다리던 콜백은 버리지 않고, 다음 전송의 응답(또는 resolve)으로 받게 함
+            entry.sent_at = float("-inf")
+            return False
+        entry.inflight += 1
+        self.stats["sent"] += 1
+        return True
+
+    def resolve(self, trcode, account, result):
+        """응답 저장 후 기다리던 콜백 모두 호출
+
+        무효화 전에 보낸 요청의 응답은 더 새로운 요청이 나가 있으면 버리고, 없으면 전달만 하고 캐시로는 쓰지 않는다.
+        """
+        entry = self.entries.setdefault((trcode, account), _Entry())
+        entry.inflight = max(entry.inflight - 1, 0)
+        if entry.stale:
+            entry.stale -= 1
+            if entry.inflight:
+                return
+            entry.result = result
+            entry.received_at = float("-inf")
+        else:
+            entry.result = result
+            entry.received_at = self.clock()
+        waiters, entry.waiters = entry.waiters or [], None
+        for callback in waiters:
+            callback(result)
+
+    def get(self, trcode, account):
+        """캐시된 마지막 응답 (만료 여부와 상관없이, 없으면 None)"""
+        entry = self.entries.get((trcode, account))
+        return entry.result if entry else None
+
+    def invalidate(self, account=None, trcodes=None):
+        """캐시 무효화 (account/trcodes가 None이면 전체)"""
+        for (trcode, acc), entry in self.entries.items():
+            if (account is None or acc == account) and (trcodes is None or trcode in trcodes):
+                entry.received_at = float("-inf")
+                entry.mark_stale()
+
+    def expire_inflight(self):
+        """응답을 기다리는 요청을 모두 만료 (재접속 후 다음 요청은 다시 보내고, 기다리던 콜백은 그 응답을 받음)"""
+        for entry in self.entries.values():
+            if entry.waiters is not None:
+                entry.sent_at = float("-inf")
+                entry.inflight = entry.stale = 0
@@ -0,0 +1,212 @@
+import numpy as np
+
+
+# ----------------------------------------------------------------------
+# 값 변환기 (GetCommData 문자열 → 파이썬 값)
+# ----------------------------------------------------------------------
+def to_str(value):
+    return value.strip()
+
+
+def to_int(value):
+    """"+000012,345" / "-00100" / "" → 정수 (빈 값은 0)"""
+    value = value.strip().replace(",", "")
+    return int(value) if value else 0
+
+
+def to_optional_int(value):
+    """빈 값을 0과 구분해야 하는 필드 (빈 값은 None)"""
+    value = value.strip().replace(",", "")
+    return int(value) if value else None
+
+
+def to_price(value):
+    """가격 필드 (등락 부호 제거)"""
+    return abs(to_int(value))
+
+
+def to_float(value):
+    value = value.strip().replace(",", "")
+    return float(value) if value else 0.0
+
+
+def to_code(value):
+    """종목코드 ("A005930" → "005930")"""
+    return value.strip().replace("A", "")
+
+
+# ----------------------------------------------------------------------
+# 레코드
+# ----------------------------------------------------------------------
+class Record:
+    """__slots__ 기반 레코드 기본 클래스 (행마다 dict를 만들지 않음)"""
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for attr, value in zip(self.__slots__, values):
+            setattr(self, attr, value)
+
+    def as_dict(self, attrs=None):
+        return {attr: getattr(self, attr) for attr in (attrs or self.__slots__)}
+
+    def __repr__(self):
+        body = ", ".join(f"{attr}={getattr(self, attr)!r}" for attr in self.__slots__)
+        return f"{type(self).__name__}({body})"
+
+
+def make_record_type(name, attrs):
+    return type(name, (Record,), {"__slots__": tuple(attrs)})
+
+
+class TRResult:
+    """TR 응답 파싱 결과 (single: 단일 데이터 레코드, rows: 멀티 데이터 레코드 리스트)"""
+    __slots__ = ("trcode", "rqname", "prev_next", "single", "rows")
+
+    def __init__(self, trcode, rqname, prev_next, single, rows):
+        self.trcode = trcode
+        self.rqname = rqname
+        self.prev_next = prev_next
+        self.single = single
+        self.rows = rows
+
+    def column(self, attr, dtype=np.int64):
+        """멀티 데이터 한 컬럼을 numpy 배열로"""
+        return np.fromiter((getattr(row, attr) for row in self.rows), dtype=dtype, count=len(self.rows))
+
+    def to_dict(self):
+        """저장용 dict (레코드는 필드 순서대로 값 리스트)"""
+        return {
+            "trcode": self.trcode,
+            "rqname": self.rqname,
+            "single": [getattr(self.single, attr) for attr in self.single.__slots__],
+            "rows": [[getattr(row, attr) for attr in row.__slots__] for row in self.rows],
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        """to_dict()의 역 (레코드 타입은 등록된 스키마에서)"""
+        schema = TR_SCHEMAS[data["trcode"].upper()]
+        rows = [schema.row_type(*values) for values in data["rows"]]
+        return cls(data["trcode"], data["rqname"], "0", schema.single_type(*data["single"]), rows)
+
+
+class TRSchema:
+    """TR 코드 하나의 단일/멀티 필드 정의
+
+    fields: (키움 필드명, 속성명, 변환기) 튜플 목록
+    """
+    def __init__(self, trcode, single=(), multi=()):
+        self.trcode = trcode
+        self.single_fields = tuple(single)
+        self.multi_fields = tuple(multi)
+        self.single_type = make_record_type(f"{trcode}Single", [f[1] for f in self.single_fields])
+        self.row_type = make_record_type(f"{trcode}Row", [f[1] for f in self.multi_fields])
+
+    def parse(self, kiwoom, trcode, rqname, prev_next="0"):
+        """GetCommData로 정의된 필드만 읽어 변환된 레코드로 반환"""
+        def get(i, field):
+            return kiwoom.dynamicCall("GetCommData(QString, QString, int, QString)", trcode, rqname, i, field)
+
+        single = self.single_type(*(convert(get(0, field)) for field, _, convert in self.single_fields))
+
+        rows = []
+        if self.multi_fields:
+            count = kiwoom.dynamicCall("GetRepeatCnt(QString, QString)", trcode, rqname)
+            row_type = self.row_type
+            fields = self.multi_fields
+            for i in range(count):
+                rows.append(row_type(*(convert(get(i, field)) for field, _, convert in fields)))
+
+        return TRResult(trcode, rqname, prev_next, single, rows)
+
+
+# ----------------------------------------------------------------------
+# TR 레지스트리 (새 TR은 여기 스키마만 추가)
+# ----------------------------------------------------------------------
+TR_SCHEMAS = {}
+
+
+def register_schema(schema):
+    TR_SCHEMAS[schema.trcode.upper()] = schema
+    return schema
+
+
+def parse_tr(kiwoom, trcode, rqname, prev_next="0"):
+    """등록된 스키마로 TR 응답 파싱 (스키마가 없으면 None)"""
+    schema = TR_SCHEMAS.get(trcode.upper())
+    if schema is None:
+        return None
+    return schema.parse(kiwoom, trcode, rqname, prev_next)
+
+
+register_schema(TRSchema(
+    "OPT10001",  # 주식기본정보요청
+    single=[
+        ("종목코드", "stock_code", to_code),
+        ("현재가", "current_price", to_price),
+    ],
+))
+
+register_schema(TRSchema(
+    "OPT10080",  # 주식분봉차트조회
+    single=[("종목코드", "stock_code", to_code)],
+    multi=[
+        ("체결시간", "timestamp", to_str),
+        ("시가", "open", to_price),
+        ("고가", "high", to_price),
+        ("저가", "low", to_price),
+        ("현재가", "close", to_price),
+        ("거래량", "volume", to_int),
+    ],
+))
+
+register_schema(TRSchema(
+    "OPT10081",  # 주식일봉차트조회
+    single=[("종목코드", "stock_code", to_code)],
+    multi=[
+        ("일자", "date", to_str),
+        ("시가", "open", to_price),
+        ("고가", "high", to_price),
+        ("저가", "low", to_price),
+        ("현재가", "close", to_price),
+        ("거래량", "volume", to_int),
+    ],
+))
+
+register_schema(TRSchema(
+    "OPW00001",  # 예수금상세현황요청
+    single=[("주문가능금액", "orderable", to_optional_int)],
+))
+
+register_schema(TRSchema(
+    "OPW00018",  # 계좌평가잔고내역요청
+    multi=[
+        ("종목번호", "stock_code", to_code),
+        ("종목명", "stock_name", to_str),
+        ("보유수량", "quantity", to_int),
+        ("매입가", "buy_price", to_int),
+        ("현재가", "current_price", to_price),
+    ],
+))
+
+register_schema(TRSchema(
+    "OPW00004",  # 계좌평가현황요청
+    single=[
+        ("예수금", "cash", to_int),
+        ("D+2추정예수금", "d2_deposit", to_int),
+        ("총매입금액", "total_buy_amount", to_int),
+        ("당일투자손익", "today_profit", to_int),
+        ("당월투자손익", "monthly_profit", to_int),
+        ("누적투자손익", "accumulated_profit", to_int),
+        ("당일손익율", "today_profit_rate", to_float),
+        ("당월손익율", "monthly_profit_rate", to_float),
+        ("누적손익율", "accumulated_profit_rate", to_float),
+    ],
+    multi=[
+        ("종목코드", "stock_code", to_code),
+        ("종목명", "stock_name", to_str),
+        ("보유수량", "quantity", to_int),
+        ("평균단가", "buy_price", to_int),
+        ("현재가", "current_price", to_price),
+    ],
+))
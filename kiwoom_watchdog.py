@@ -0,0 +1,102 @@
+import time
+
+
+class ConnectionWatchdog:
+    """키움 세션 끊김 / 콜백 멈춤 감지 후 자동 재접속
+
+    check()를 주기적으로(1초) 호출한다.
+    - GetConnectState()가 0이면 끊김
+    - expect_events()가 True(실시간 등록 중)인데 stall_timeout초 동안 아무 콜백도 없으면 멈춤
+    감지하면 on_lost(reason)를 부르고 CommConnect를 retry_interval부터 두 배씩
+    (최대 max_retry_interval) 늘려 가며 다시 보낸다. OnEventConnect(0)이 오면
+    on_restored()로 메모리에 남아 있는 상태(실시간 등록, 대기 주문 등)를 되살리고,
+    감지부터 복구 완료까지 걸린 시간을 recoveries에 남긴다.
+    """
+    def __init__(self, kiwoom, on_lost, on_restored, expect_events=None, stall_timeout=30.0,
+                 retry_interval=5.0, max_retry_interval=60.0, clock=time.monotonic):
+        self.kiwoom = kiwoom
+        self.on_lost = on_lost
+        self.on_restored = on_restored
+        self.expect_events = expect_events or (lambda: False)
+        self.stall_timeout = stall_timeout
+        self.retry_interval = retry_interval
+        self.max_retry_interval = max_retry_interval
+        self.clock = clock
+        self.online = True
+        self.reason = None  # 마지막으로 감지한 끊김 사유
+        self.lost_at = None
+        self.attempts = 0  # 이번 끊김에서 CommConnect를 보낸 횟수
+        self.next_retry = 0.0
+        self.last_event = clock()
+        self.recoveries = []  # {"reason", "attempts", "seconds"}
+
+    def touch(self, *args):
+        """키움 콜백이 올 때마다 호출 (시그널에 바로 연결 가능)"""
+        self.last_event = self.clock()
+
+    def check(self):
+        now = self.clock()
+        if self.online:
+            if self.kiwoom.dynamicCall("GetConnectState()") != 1:
+                self.lost("연결 끊김")
+            elif self.expect_events() and now - self.last_event > self.stall_timeout:
+                self.lost(f"콜백 {now - self.last_event:.0f}초 없음")
+            return
+
+        if now < self.next_retry:
+            return
+        if self.attempts and self.kiwoom.dynamicCall("GetConnectState()") == 1:
+            # 콜백만 멈췄던 경우 접속 중인 세션에 CommConnect를 보내도 OnEventConnect가 오지 않을 수 있음
+            self._restored()
+            return
+
+        self.attempts += 1
+        delay = min(self.retry_interval * 2 ** (self.attempts - 1), self.max_retry_interval)
+        self.next_retry = now + delay
+        print(f"🔌 재접속 시도 {self.attempts}회 (CommConnect, 응답 없으면 {delay:.0f}초 후 재시도)")
+        self.kiwoom.dynamicCall("CommConnect()")
+
+    def lost(self, reason):
+        if not self.online:
+            return
+        self.online = False
+        self.reason = reason
+        self.lost_at = self.clock()
+        self.attempts = 0
+        self.next_retry = self.lost_at  # 다음 check()에서 바로 재접속
+        print(f"⚠️ 키움 세션 이상 감지: {reason} → 재접속 시작")
+        self.on_lost(reason)
+
+    def on_event_connect(self, err_code):
+        """OnEventConnect 처리 → 재접속 응답이면 True (처음 로그인이면 False)"""
+        if self.online:
+            self.last_event = self.clock()
+            if self.lost_at is None:
+                return False  # 처음 로그인
+            if err_code != 0:
+                self.lost(f"OnEventConnect {err_code}")
+            return True  # 이미 복구된 뒤 늦게 온 응답 / 접속 중 끊김 통보
+
+        if err_code != 0:
+            print(f"❌ 재접속 실패 (에러코드 {err_code})")
+            return True
+
+        self._restored()
+        return True
+
+    def _restored(self):
+        self.online = True
+        self.last_event = self.clock()
+        self.on_restored()
+        seconds = self.clock() - self.lost_at
+        self.recoveries.append({"reason": self.reason, "attempts": self.attempts, "seconds": seconds})
+        print(f"✅ 재접속 완료: {seconds:.2f}초 (사유: {self.reason}, 시도 {self.attempts}회)")
+
+    def stats(self):
+        """복구 횟수 / 평균 / 최대 복구 시간(초)"""
+        seconds = [r["seconds"] for r in self.recoveries]
+        return {
+            "recoveries": len(seconds),
+            "mean": sum(seconds) / len(seconds) if seconds else 0.0,
+            "max": max(seconds) if seconds else 0.0,
+        }